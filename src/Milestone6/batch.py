@@ -0,0 +1,140 @@
+import os, sys, time, pprint, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import parser
+from parser import buildAndCompile
+from codegen import MIPS
+from context import CompilationContext
+from profiling import passTiming
+
+## Batch compilation
+##
+## Compiles many Go files in one process, or on a pool of processes, so that
+## interpreter startup, the parser tables and the imported packages are paid
+## for once per process instead of once per file.  A process keeps the
+## compiled units of the packages it has imported (see parser.importPackage)
+## and hands them to the next file it compiles.
+
+## Stages a compilation can stop at, and the file next to the source each
+## one's output goes to.  The 3AC is generated while parsing, so the ast and
+## 3ac stages both run the whole front end
+stages = ('tokens', 'ast', '3ac', 'asm')
+stageSuffixes = {'tokens': '.tokens', 'ast': '.output', '3ac': '_3ac.txt', 'asm': '.s'}
+
+## Debug artifacts a compilation writes only when asked to: the LALR
+## automaton (action.txt and goto.txt), the AST (.output), the symbol table
+## of every function (.symTables) and the 3AC (_3ac.txt)
+debugArtifacts = ('automaton', 'ast', 'symtables', '3ac')
+
+# Compiled units of the packages imported by the files compiled in this
+# process so far, by path
+_units = {}
+
+def compileStage(ctx, path_name, emit='asm', source_code=None):
+    # Output of the stage emit for the Go file at path_name (or for
+    # source_code in its place): its tokens, its AST, its 3AC or its MIPS
+    # code.  Compilation stops at that stage
+    if emit == 'tokens':
+        return parser.lexFile(ctx, path_name, source_code)
+    parsed_output, sym_table = buildAndCompile(path_name, ctx, source_code)
+    if ctx.passTimer is not None:
+        ctx.passTimer.results['ast'] = parsed_output
+    if emit == 'ast':
+        return parsed_output
+    with passTiming(ctx, '3ac'):
+        tac_code = parsed_output.code.flatten()
+    if ctx.passTimer is not None:
+        ctx.passTimer.results['3ac'] = tac_code
+    if emit == '3ac':
+        return tac_code
+    if '3ac' in ctx.debug:
+        with passTiming(ctx, 'output'):
+            writeStage(f"{path_name[:-3]}{stageSuffixes['3ac']}", '3ac', tac_code)
+
+    ctx.checkCancelled()
+    with passTiming(ctx, 'codegen'):
+        codegen = MIPS(tac_code, sym_table, ctx.annotateAsm, ctx.optLevel)
+        asm = codegen.tac2mips()
+    ctx.regallocStats = codegen.regs.stats
+    if ctx.passTimer is not None:
+        ctx.passTimer.results['asm'] = asm
+    return asm
+
+def stageText(emit, output):
+    # Text of the output of the stage emit
+    if emit == 'tokens':
+        return ''.join(f"{tok.lineno} {tok.type} {tok.value}\n" for tok in output)
+    if emit == 'ast':
+        return pprint.pformat(output, width=10) + '\n'
+    return ''.join(f"{line}\n" for line in output)
+
+def writeStage(filename, emit, output):
+    with open(filename, 'w') as f:
+        f.write(stageText(emit, output))
+
+def compileFile(path_name, ctx, emit='asm', output=None):
+    # Compile the Go file at path_name up to the stage emit and write that
+    # stage's output to output (by default next to the source, see
+    # stageSuffixes).  Returns the output, see compileStage
+    result = compileStage(ctx, path_name, emit)
+    with passTiming(ctx, 'output'):
+        writeStage(output or f"{path_name[:-3]}{stageSuffixes[emit]}", emit, result)
+    return result
+
+def sourceFiles(paths):
+    # The .go files of paths; a directory stands for the .go files in it
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.go'))
+        else:
+            files.append(path)
+    return files
+
+def batchWorker(path, options, emit):
+    # Compile one file of the batch; returns (path, error message or None,
+    # seconds)
+    ctx = CompilationContext(*options)
+    ctx.packages.update(_units)
+    start = time.perf_counter()
+    try:
+        compileFile(path, ctx, emit)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    _units.update(ctx.packages)
+    return path, error, time.perf_counter() - start
+
+def compileBatch(paths, jobs=1, options=(), emit='asm', out=sys.stdout):
+    # Compile the files of paths, jobs at a time, printing the status of
+    # every file in order and the throughput.  Returns the number of files
+    # that failed to compile
+    files = sourceFiles(paths)
+    parser.getParser()
+    start = time.perf_counter()
+    failed = 0
+
+    if jobs > 1 and len(files) > 1:
+        # Forked workers start with the parser tables loaded
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        pool = ProcessPoolExecutor(min(jobs, len(files)), mp_context=context)
+        results = pool.map(batchWorker, files, [options] * len(files), [emit] * len(files))
+    else:
+        pool = None
+        results = (batchWorker(path, options, emit) for path in files)
+
+    try:
+        for path, error, seconds in results:
+            if error is None:
+                print(f"ok     {path} ({seconds * 1000:.1f} ms)", file=out)
+            else:
+                failed += 1
+                print(f"FAILED {path} ({seconds * 1000:.1f} ms): {error}", file=out)
+            out.flush()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - start
+    rate = len(files) / elapsed if elapsed > 0 else 0.0
+    print(f"{len(files)} files, {len(files) - failed} compiled, {failed} failed in {elapsed:.2f} s ({rate:.1f} files/sec)", file=out)
+    return failed
@@ -0,0 +1,89 @@
+import os, sys, json, socket, argparse
+
+## Compile server client
+##
+## Sends the files given to a running compile server (server.py) and prints
+## what comes back: the output of the stage for a single file, as compiler.py
+## prints the assembly, or a status line per file for several.  Interrupting
+## the client cancels the compilations it asked for.  It imports nothing of
+## the compiler so that it starts fast.
+
+# batch.stages
+stages = ('tokens', 'ast', '3ac', 'asm')
+
+def defaultSocket():
+    folder = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    return os.path.join(folder, f"go-mips-{os.getuid()}.sock")
+
+def main():
+    argparser = argparse.ArgumentParser(description="Compile Go sources on a running compile server (server.py)")
+    argparser.add_argument("path_name", nargs="*", help="Go source files")
+    argparser.add_argument("--socket", default=defaultSocket(), help="path of the server's socket (default: %(default)s)")
+    argparser.add_argument("--stage", choices=stages, default="asm", help="output to print (default: %(default)s)")
+    argparser.add_argument("-O", dest="opt_level", type=int, choices=(1, 2), default=1, help="optimization level, as compiler.py -O")
+    argparser.add_argument("--stdin", action="store_true", help="compile the contents of stdin in place of the (single) file; nothing is written")
+    argparser.add_argument("--timing", action="store_true", help="print the server's timing of every request on stderr")
+    argparser.add_argument("--status", action="store_true", help="print the server's status")
+    argparser.add_argument("--shutdown", action="store_true", help="stop the server")
+    args = argparser.parse_args()
+    if args.stdin and len(args.path_name) != 1:
+        argparser.error("--stdin compiles a single file")
+
+    requests = {}
+    for i, path in enumerate(args.path_name, 1):
+        requests[i] = {'op': 'compile', 'id': i, 'path': os.path.realpath(path), 'stage': args.stage, 'opt': args.opt_level}
+        if args.stdin:
+            requests[i]['source'] = sys.stdin.read()
+    if args.status:
+        requests['status'] = {'op': 'status', 'id': 'status'}
+    if args.shutdown:
+        requests['shutdown'] = {'op': 'shutdown', 'id': 'shutdown'}
+    if not requests:
+        argparser.error("nothing to do")
+
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(args.socket)
+    except OSError:
+        print(f"No compile server at {args.socket}, start one with python3 server.py", file=sys.stderr)
+        return 2
+    stream = conn.makefile('rwb')
+    for request in requests.values():
+        stream.write(json.dumps(request).encode() + b'\n')
+    stream.flush()
+
+    failed = 0
+    pending = set(requests)
+    while pending:
+        try:
+            line = stream.readline()
+        except KeyboardInterrupt:
+            for id in pending:
+                stream.write(json.dumps({'op': 'cancel', 'id': id}).encode() + b'\n')
+            stream.flush()
+            continue
+        if not line:
+            print("The compile server closed the connection", file=sys.stderr)
+            return 2
+        response = json.loads(line)
+        id = response.get('id')
+        if id not in pending:
+            continue
+        pending.discard(id)
+        request = requests[id]
+        if args.timing and 'timing' in response:
+            timing = response['timing']
+            print(f"{request.get('path', request['op'])}: queued {timing['queued']:.1f} ms, compile {timing['compile']:.1f} ms, total {timing['total']:.1f} ms", file=sys.stderr)
+        if not response['ok']:
+            failed += 1
+            print(f"{request.get('path', request['op'])}: {response['error']}", file=sys.stderr)
+        elif request['op'] == 'status':
+            print(" ".join(f"{key} {value}" for key, value in response.items() if key not in ('id', 'ok')))
+        elif request['op'] == 'compile' and len(args.path_name) == 1:
+            sys.stdout.write(response['output'])
+        elif request['op'] == 'compile':
+            print(f"ok     {request['path']}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
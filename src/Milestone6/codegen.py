@@ -1,15 +1,24 @@
 from calendar import c
 from scope import *
 from utils import *
+import tac
+from tracing import codegenTrace
+import regalloc
+import re
+
+# Operands of the generated code addressing the frame off $fp
+_fpAddress = re.compile(r'(-?\d+)\(\$fp\)')
 
 
 class Register:
-    def __init__(self):
+    def __init__(self, annotate=False):
+        # Comment the generated assembly (compiler.py --annotate-asm)
+        self.annotate = annotate
 
         self.count = 0
 
         # Store an array for registers, first value denotes var it stores,
-        # second value stores last time it has been used (for use in LRU algo)
+        # second value a use count
         self.regs = {'$t0': [None, 0],
                      '$t1': [None, 0],
                      '$t2': [None, 0],
@@ -81,197 +90,108 @@ class Register:
         self.cur_func_size = 0
         self._sp = 0
 
-    # Function to return the least recently used register
-    def find_new_reg(self, isFloat=False):
-        minn = 1e9
-        final_reg = None
-        foundEmpty = 0
-
-        if not isFloat:
-            for reg in self.regs:
-                if self.regs[reg][0] == None:
-                    foundEmpty = True
-
-                if self.regs[reg][1] <= minn:
-                    minn = self.regs[reg][1]
-                    final_reg = reg
-
-            # Only look in saved registers if temps are not available
-            if not foundEmpty:
-                for reg in self.regsSaved:
-                    if self.regsSaved[reg][1] <= minn:
-                        minn = self.regsSaved[reg][1]
-                        final_reg = reg
-
-            return final_reg
-        else:
-            for reg in self.regsF:
-                if self.regsF[reg][0] == None:
-                    foundEmpty = True
-
-                if self.regsF[reg][1] <= minn:
-                    minn = self.regsF[reg][1]
-                    final_reg = reg
-
-            # Only look in saved registers if temps are not available
-            if not foundEmpty:
-                for reg in self.regsSavedF:
-                    if self.regsSavedF[reg][1] <= minn:
-                        minn = self.regsSavedF[reg][1]
-                        final_reg = reg
-
-            return final_reg
-
-    # Function to be called to shift contents of register to memory, additionally
-    # location of variables to be shifted has to be given while calling this function
-    # NOTE: Flushes everything if regs is None
-    def move_reg(self, regList=None, new_loc=None, size=None, isFloat=False, isUnsigned=False):
-        if not isFloat:
-            if regList:
-                print("Requested to shift: ", regList)
-            if regList is None:
-                regList = self.regs.keys()
-
-            mips = []
-            for i, reg in enumerate(regList):
-                # If someone occupied the register previously
-                    if new_loc is None:
-                        if reg in self.regs and self.regs[reg][0]:
-                            self.locations[self.regs[reg][0]] = [1, self._sp]
-                        elif reg in self.regsSaved and self.regsSaved[reg][0]:
-                            self.locations[self.regsSaved[reg][0]] = [1, self._sp]
-
-                        new_loc_i = self._sp
-                    elif new_loc[i] != None:  # To be stored in memory
-                        new_loc_i = new_loc[i]
-                    else:
-                        raise Exception("Please provide a valid memory location")
-
-                    if (reg.startswith('$s') and self.regsSaved[reg][0] != None) or (reg in self.regs and self.regs[reg][0] != None):
-                        suffix = getsizeSuffix(size, isFloat, isUnsigned)
-                        self._sp -= 4
-                        new_loc_i -= 4
-                        mips.append("\tadd $sp, $sp, -4")
-                        mips.append("\ts" + suffix + "\t" + reg +
-                                "," + str(self._sp - self.cur_func_size - 32) + "($fp)\n")
-
-                    # Reset after shifting
-                    
-                    if reg in self.regs and self.regs[reg][0] != None:
-                        self.locations[self.regs[reg][0]][0] = 1
-                        self.locations[self.regs[reg][0]][1] = new_loc_i
-                        self.regs[reg][0] = None
-                        self.regs[reg][1] = 0
-                    elif reg in self.regsSaved and self.regsSaved[reg][0] != None:
-                        self.locations[self.regsSaved[reg][0]][0] = 1
-                        self.locations[self.regsSaved[reg][0]][1] = new_loc_i
-                        self.regsSaved[reg][0] = None
-                        self.regsSaved[reg][1] = 0
-
-            print("Instruction generated: ", mips)
-            return mips
-
-        else:
-            if regList:
-                print("Requested to shift: ", regList)
-            if regList in None:
-                regList = self.regsF.keys()
-
-            mips = []
-            for i, reg in enumerate(regList):
-                # If someone occupied the register previously
-                    if new_loc is None:
-                        if reg in self.regsF and self.regsF[reg][0]:
-                            self.locations[self.regsF[reg][0]] = [1, self._sp]
-                        elif reg in self.regsSavedF and self.regsSavedF[reg][0]:
-                            self.locations[self.regsSavedF[reg][0]] = [1, self._sp]
-
-                        new_loc_i = self._sp
-                    elif new_loc[i] != None:  # To be stored in memory
-                        new_loc_i = new_loc[i]
-                    else:
-                        raise Exception("Please provide a valid memory location")
-
-                    if (reg.startswith('$s') and self.regsSavedF[reg][0]) or (self.regsF[reg][0]):
-                        suffix = getsizeSuffix(size, isFloat, isUnsigned)
-                        self._sp -= 4
-                        mips.append("\tStoring {var}")
-                        mips.append('\taddi $sp, $sp, -4')
-                        mips.append("\ts" + suffix + "\t" + reg +
-                                "," + str(self._sp-self.cur_func_size-32) + "($fp)\n")
-
-                    # Reset after shifting
-                    
-                    if reg in self.regsF and self.regsF[reg][0]:
-                        self.locations[self.regsF[reg][0]][0] = 1
-                        self.locations[self.regsF[reg][0]][1] = new_loc_i
-                        self.regsF[reg][0] = None
-                        self.regsF[reg][1] = 0
-                    elif reg in self.regsSavedF and self.regsSavedF[reg][0]:
-                        self.locations[self.regsSavedF[reg][0]][0] = 1
-                        self.locations[self.regsSavedF[reg][0]][1] = new_loc_i
-                        self.regsSavedF[reg][0] = None
-                        self.regsSavedF[reg][1] = 0
-
-            print("Instruction generated: ", mips)
-            return mips
+        # Registers the allocator (regalloc.py) gives to temporaries, $t
+        # first, and the scratch registers for everything else
+        self.allocatable = ['$t0', '$t1', '$t2', '$t3', '$t4'] + list(self.regsSaved)
+        self.scratch = ['$t5', '$t6', '$t7', '$t8', '$t9']
+        # Only the caller-saved float registers, so that no function has
+        # $f20-$f31 to save
+        self.scratchF = [reg for reg in self.regsF if int(reg[2:]) < 20]
+        self.nextScratch = self.nextScratchF = 0
+        # Allocation of the function being generated, the temporary its
+        # current instruction writes and the stores pending for it
+        self.allocation = None
+        self.funcname = None
+        self.defining = None
+        self.pending = []
+        # Function -> temporaries, spilled temporaries, spill slots, coalesced
+        # copies and spill stores and reloads generated
+        self.stats = {}
+
+    def startFunction(self, funcname, allocation, frameVars):
+        # Registers and frame slots of the function about to be generated:
+        # the temporaries are where allocation put them, the variables of
+        # frameVars and the spilled temporaries in the slots below the locals
+        self.allocation = allocation
+        self.funcname = funcname
+        self.stats[funcname] = {'temps': len(allocation.intervals), 'spilled': len(allocation.spilled()),
+                                'slots': allocation.slots, 'coalesced': allocation.coalesced, 'spills': 0, 'reloads': 0}
+        for k, var in enumerate(frameVars):
+            self.locations[var] = [1, self.slotLocation(k)]
+        for temp, iv in allocation.intervals.items():
+            if iv.reg is not None:
+                self.locations[temp] = [0, iv.reg]
+            else:
+                self.locations[temp] = [1, self.slotLocation(len(frameVars) + iv.slot)]
+        if codegenTrace.debug:
+            for iv in sorted(allocation.intervals.values(), key=lambda iv: iv.start):
+                codegenTrace.log('debug', "%s: %s", funcname, iv)
+
+    def slotLocation(self, k):
+        # Location of the kth frame slot, below the locals
+        return -4 * (k + 1)
+
+    def isTemp(self, var):
+        return self.allocation is not None and var in self.allocation.intervals
+
+    def startInstr(self, instr):
+        # Temporary the 3AC instruction being generated writes, for the store
+        # of its value if it is spilled
+        dest = instr.dest
+        self.defining = dest.name if instr.op in tac.valueOps and dest.isPlain() and self.isTemp(dest.name) else None
+        self.pending = []
+
+    def finishInstr(self):
+        # Stores of the spilled temporary the instruction wrote
+        mips = []
+        for reg, location, suffix in self.pending:
+            self.stats[self.funcname]['spills'] += 1
+            mips.append(f"\ts{suffix}\t{reg},{location - self.cur_func_size - 32}($fp)")
+        self.pending = []
+        return mips
+
+    def scratchRegister(self, isFloat=False):
+        # Registers for the operands and results of a single instruction, in
+        # turn, so those of one instruction don't overlap
+        if isFloat:
+            self.nextScratchF = (self.nextScratchF + 1) % len(self.scratchF)
+            return self.scratchF[self.nextScratchF]
+        self.nextScratch = (self.nextScratch + 1) % len(self.scratch)
+        return self.scratch[self.nextScratch]
+
+    def noteReload(self, var):
+        if self.isTemp(var):
+            self.stats[self.funcname]['reloads'] += 1
 
     # Function that returns a tuple of register and instructions
-    # for a variable var. This function also has to be used while
-    # fetching location for a variable for execution of LRU policy
+    # for a variable var: the register of an allocated temporary, else a
+    # scratch register holding it (loaded from the frame) or to write it to
     def get_register(self, var=None, size=None, isFloat=False, isUnsigned=False, funcName = None):
-        mips = []   
-        if var in self.locations and self.locations[var][0] == 0:
-            self.count += 1
-            
-            if not isFloat:
-                if self.locations[var][1].startswith('$s'):
-                    self.regsSaved[self.locations[var][1]][1] = self.count    
-                else:
-                    self.regs[self.locations[var][1]][1] = self.count
-                return (self.locations[var][1], [])
-            else:
-                if self.locations[var][1].startswith('$s'):
-                    self.regsSavedF[self.locations[var][1]][1] = self.count    
-                else:
-                    self.regsF[self.locations[var][1]][1] = self.count
-                return (self.locations[var][1], [])
-
-        else:  # Need a new register
-            new_reg = self.find_new_reg(isFloat=isFloat)
-            mips.extend(self.move_reg([new_reg]))
-
-            self.count += 1
-            if not isFloat:
-                if new_reg.startswith('$s'):
-                    self.regsSaved[new_reg][0] = var
-                    self.regsSaved[new_reg][1] = self.count
-                else: 
-                    self.regs[new_reg][0] = var
-                    self.regs[new_reg][1] = self.count
-            else:
-                if new_reg.startswith('$s'):
-                    self.regsSavedF[new_reg][0] = var
-                    self.regsSavedF[new_reg][1] = self.count
-                else:
-                    self.regsF[new_reg][0] = var
-                    self.regsF[new_reg][1] = self.count
-
-            # It is stored in memory
-            if var in self.locations and self.locations[var][0] == 1:
-                self.locations[var][0] = 0
-                temp = self.locations[var][1]
-                self.locations[var][1] = new_reg
-                mips.append(f'\t# Swapping out reg {new_reg} for variable {var}')
-                suffix = getsizeSuffix(size, isFloat, isUnsigned)
-                # print("ASD: ", self.locations[var], var)
-                mips.append(f"\t# Changed {var}")
-                mips.append("\tl" + suffix + "\t" +
-                          str(new_reg) + "," +  str(temp - self.cur_func_size - 32) + "($fp)")
-            elif var is not None:
-                self.locations[var] = [0, new_reg]
-
-            return (new_reg, mips)
+        self.count += 1
+        location = self.locations.get(var)
+        if self.isTemp(var) and location[0] == 0:
+            return (location[1], [])
+
+        if var is not None and var == self.defining and location[0] == 1:
+            # Spilled temporary written by the instruction: stored after it
+            if not self.pending:
+                self.pending.append((self.scratchRegister(isFloat), location[1], getsizeSuffix(size, isFloat, isUnsigned)))
+            return (self.pending[0][0], [])
+
+        new_reg = self.scratchRegister(isFloat)
+        mips = []
+        # It is stored in memory
+        if location is not None and location[0] == 1:
+            self.noteReload(var)
+            suffix = getsizeSuffix(size, isFloat, isUnsigned)
+            if self.annotate:
+                mips.append(f"\t# Loading {var} into {new_reg}")
+            mips.append("\tl" + suffix + "\t" +
+                        str(new_reg) + "," + str(location[1] - self.cur_func_size - 32) + "($fp)")
+        elif var is not None:
+            self.locations[var] = [0, new_reg]
+
+        return (new_reg, mips)
 
     def _func_arg_size_on_stack(self, stm, funcname, local_var_size):
         param_size = 0 
@@ -298,8 +218,12 @@ class ActivationRecord:
 # Class to implement code generation from 3AC and symtable to MIPS
 class MIPS:
 
-    def __init__(self, code, stm):
-        self.regs = Register()
+    def __init__(self, code, stm, annotate=False, optLevel=1):
+        # Comment the generated assembly with what the code generator did
+        self.annotate = annotate
+        # Register allocation: 1 linear scan, 2 graph coloring (regalloc.py)
+        self.optLevel = optLevel
+        self.regs = Register(annotate)
         self.instr = []
         self.INDENT = " " * 4
         self.tac_code = code
@@ -312,35 +236,48 @@ class MIPS:
         self.act_records = {}
         self.curr_func = ""
         self.curr_pkg = None
-
-    def _location(self, label, isFloat = False):
-        if label in self.act_records[self.curr_func].local_var:
-            return (f'{self.act_records[self.curr_func].local_var[label]["offset"]-32}($fp)', [], 1)
-        elif label in self.global_var:
-            return (f'{self.global_var[label]["offset"]}($gp)', [], 1)
-        elif label[0].isnumeric() and '_' in label:
-            label = label.split('.')
-
-            if len(label) > 1:
+        # Parameters of the current function live after each position, and
+        # the registers saved for the call being generated.  They are saved
+        # in the slots at the bottom of the frame, below frameSize bytes under
+        # $fp; callSaveSlots is the most slots a call of the function needs
+        self.argsLiveAfter = {}
+        self.callSaves = []
+        self.frameSize = 0
+        self.callSaveSlots = 0
+        # What the code of the current function does that decides its frame
+        # (see _frame): calls a function, moves $sp in its body, and takes
+        # the address of something in its frame
+        self.makesCalls = self.movesSp = self.takesFrameAddress = False
+
+    def _location(self, operand, isFloat = False):
+        name = operand.name
+        local_var = self.act_records[self.curr_func].local_var
+        if operand.field is None and name in local_var:
+            return (f'{local_var[name]["offset"]-32}($fp)', [], 1)
+        elif operand.field is None and name in self.global_var:
+            return (f'{self.global_var[name]["offset"]}($gp)', [], 1)
+        elif operand.kind == tac.VAR:
+            if operand.field is not None:
                 temp_reg, code = self.regs.get_register()
-                code.append(f'\tlw {temp_reg}, {self.act_records[self.curr_func].local_var[label[0]]["offset"]}($fp)')
-                if label[1] == 'addr':
+                code.append(f'\tlw {temp_reg}, {local_var[name]["offset"]-32}($fp)')
+                if operand.field == 'addr':
                     code.append(f"\tlw {temp_reg}, 0({temp_reg})")
-                elif label[1] == 'len':
+                elif operand.field == 'len':
                     code.append(f"\tlw {temp_reg}, 4({temp_reg})")
-                elif label[1] == 'cap':
+                elif operand.field == 'cap':
                     code.append(f"\tlw {temp_reg}, 8({temp_reg})")
                 else:
                     raise Exception("Some syntax error in 3ac code")
 
                 return (temp_reg, code, 0)
 
-            offset = self.regs.locations[label[0]][1] - self.act_records[self.curr_func].localvar_space
+            offset = self.regs.locations[name][1] - self.act_records[self.curr_func].localvar_space
 
-            return (f"{offset-32}($fp)", [f"\t### LOCATION {label} : {offset}"], 1)
-        elif label in self.regs.locations:
-            reg, mips = self.regs.get_register(label, isFloat = isFloat)
-            mips.append(f"\t# {reg}, {label}")
+            return (f"{offset-32}($fp)", [f"\t### LOCATION {name} : {offset}"] if self.annotate else [], 1)
+        elif name in self.regs.locations:
+            reg, mips = self.regs.get_register(name, isFloat = isFloat)
+            if self.annotate:
+                mips.append(f"\t# {reg}, {name}")
             return (reg, mips, 0)
         else:
             raise NotImplementedError
@@ -396,13 +333,9 @@ class MIPS:
 
     def addTextSection(self):
         code = []
-        for i, codeline in enumerate(self.tac_code):
-            if codeline.startswith('package') or codeline.startswith('import'):
-                continue
-            elif codeline.startswith('\nFunc'):
+        for i, instr in enumerate(self.tac_code):
+            if instr.op == tac.FUNC:
                 code.extend(self.addFunction(i))
-            else:
-                continue
 
         return code
 
@@ -415,7 +348,7 @@ class MIPS:
                 code.append('\tli $a0, 12')
                 code.append('\tli $v0, 9')
                 code.append('\tsyscall')
-                code.append(f'\tsw $v0, {lv_info["offset"]}($fp)')
+                code.append(f'\tsw $v0, {lv_info["offset"]-32}($fp)')
             
                 if lv_info['dataType']['name'] == 'array':
                     code.append(f"\tli $a0, {lv_info['dataType']['baseType']['size']*lv_info['dataType']['length']}")
@@ -437,7 +370,7 @@ class MIPS:
 
     def addFunction(self, lineno):
         code = []
-        funcname = self.tac_code[lineno].split(' ')[1]
+        funcname = self.tac_code[lineno].name
         self.curr_func = funcname
         if funcname != 'main':
             code.extend(self.handle_label('_'+funcname))
@@ -460,72 +393,71 @@ class MIPS:
             for local_var, lv_info in self.stm.symTable[self.stm.functions[funcname]['scope']+1].localsymTable.items():
                 self.regs.locations[lv_info['tmp']][1] += local_var_size
 
-        for key in self.stm.pkgs:
-            if funcname in self.stm.pkgs[key].functions:
-                self.curr_pkg = key
-                for local_var, lv_info in self.stm.pkgs[key].symTable[self.stm.pkgs[key].functions[funcname]['scope']+1].localsymTable.items():
-                    local_var_size += lv_info['dataType']['size']
-                    self.act_records[funcname].local_var[lv_info['tmp']] = {'size': lv_info['dataType']['size'], 'offset': -local_var_size}
-                    self.regs.locations[lv_info['tmp']] = [1, -local_var_size]
+        key = self.stm.pkgFunctions.get(funcname)
+        if key is not None:
+            self.curr_pkg = key
+            for local_var, lv_info in self.stm.pkgs[key].symTable[self.stm.pkgs[key].functions[funcname]['scope']+1].localsymTable.items():
+                local_var_size += lv_info['dataType']['size']
+                self.act_records[funcname].local_var[lv_info['tmp']] = {'size': lv_info['dataType']['size'], 'offset': -local_var_size}
+                self.regs.locations[lv_info['tmp']] = [1, -local_var_size]
 
-            if funcname in self.stm.pkgs[key].functions:
-                self.curr_pkg = key
-                for local_var, lv_info in self.stm.pkgs[key].symTable[self.stm.pkgs[key].functions[funcname]['scope']+1].localsymTable.items():
-                    self.regs.locations[lv_info['tmp']][1] += local_var_size
+            for local_var, lv_info in self.stm.pkgs[key].symTable[self.stm.pkgs[key].functions[funcname]['scope']+1].localsymTable.items():
+                self.regs.locations[lv_info['tmp']][1] += local_var_size
 
         self.act_records[self.curr_func].localvar_space = local_var_size
         stack_return_size = self.regs._func_arg_size_on_stack(self.stm, funcname, local_var_size)
         
-        code.append(f'\taddi $sp, $sp, -4')
-        code.append(f'\tsw $ra, 0($sp)')
-        code.append(f'\taddi $sp, $sp, -4')
-        code.append(f'\tsw $fp, 0($sp)')
-        code.append(f'\tadd $fp, $sp, $0')
-        code.append(f'\taddi $sp, $sp, -{local_var_size}')
-
-        code.append(f'\t### Saving $s registers')
-        for reg in self.regs.regsSaved:
-            self.regs._sp -= 4
-            code.append(f'\tadd $sp, $sp, -4')
-            code.append(f'\tsw {reg}, 0($sp)')
+        allocation = regalloc.allocate(self.tac_code, lineno, self.regs.allocatable, coloring=self.optLevel >= 2)
+        frameVars = self._blockLocals(lineno)
+        self.regs.startFunction(funcname, allocation, frameVars)
+        self.argsLiveAfter = regalloc.liveness(self.tac_code, lineno+1, regalloc.functionEnd(self.tac_code, lineno),
+                                               tac.ARG)[1]
+
+        # Frame, from $fp down: the slots of the $s registers, the locals
+        # (-32 - offset), the slots of the block locals and the spilled
+        # temporaries and those of the registers saved across calls; $ra and
+        # $fp are above $fp.  Only the $s registers the
+        # function uses are saved.  The code is generated off $fp, and the
+        # prologue and epilogue once it is done (see _frame)
+        saved = [reg for reg in self.regs.regsSaved if reg in allocation.registers()]
+        frame = 32 + local_var_size + 4 * (len(frameVars) + allocation.slots)
+        self.frameSize, self.callSaveSlots = frame, 0
+        self.makesCalls = self.movesSp = self.takesFrameAddress = False
+        header, code = code, []
+        if self.annotate:
+            code.append(f"\t### Saving {' '.join(saved) or 'no $s registers'}")
+        for k, reg in enumerate(self.regs.regsSaved):
+            if reg in saved:
+                code.append(f'\tsw {reg}, {-4 * (k + 1)}($fp)')
             self.regs.regsSaved[reg][0] = None
+        self.regs._sp -= 32
 
         code.extend(self._addLocalCompositeVars())
 
         for i in range(lineno+1, len(self.tac_code)):
-            items = self.tac_code[i].split(' ')
-            if self.tac_code[i].startswith('Func END'):
+            instr = self.tac_code[i]
+            op = instr.op
+            self.regs.startInstr(instr)
+            if op == tac.FUNC_END:
                 code.append(f'\t_return_{funcname}:')
-                code.append(f'\t### Restoring $s registers')
-                saved_regs = list(self.regs.regsSaved.keys())
-                saved_regs.reverse()
-                for reg in saved_regs:
-                    self.regs._sp += 4
-                    code.append(f'\tlw {reg}, 0($sp)')
-                    code.append(f'\tadd $sp, $sp, 4')
-                    self.regs.regsSaved[reg][0] = None
-                code.append(f'\tlw $ra, 4($fp)')
-                code.append(f'\taddi $sp, $fp, {stack_return_size + 8}')
-                code.append(f'\tlw $fp, 0($fp)')
+                if self.annotate:
+                    code.append(f'\t### Restoring $s registers')
+                for k, reg in enumerate(self.regs.regsSaved):
+                    if reg in saved:
+                        code.append(f'\tlw {reg}, {-4 * (k + 1)}($fp)')
+                if codegenTrace.info:
+                    stats = self.regs.stats[funcname]
+                    codegenTrace.log('info', "%s: %d temporaries in %s, %d spilled to %d slots, %d copies coalesced, %d spill stores, %d reloads",
+                                     funcname, stats['temps'], ' '.join(allocation.registers()) or 'no registers',
+                                     stats['spilled'], stats['slots'], stats['coalesced'], stats['spills'], stats['reloads'])
                 self.regs._sp = 0
+                return header + self._frame(funcname, code, frame + 4 * self.callSaveSlots, stack_return_size)
 
-                if funcname != 'main':
-                    code.append(f'\tjr $ra')
-                else:
-                    code.extend(self.exit())
-                return code
-
-            elif self.tac_code[i].startswith('return'):
-                j = 1
-                retValues = []
-                while self.tac_code[i-j].startswith('retparams'):
-                    retValues.append(self.tac_code[i-j].split()[1])
-                    j += 1
-
-                retValues.reverse()
+            elif op == tac.RETURN and instr.values:
+                retValues = instr.values
                 retReg, _code = self._get_label(retValues[0])
                 code.extend(_code)
-                if len(self.stm.functions[funcname]['return']) == 1 and not retValues[0].startswith("vartemp"):
+                if len(self.stm.functions[funcname]['return']) == 1:
                     code.append(f"\taddi $v0, {retReg}, 0")
                 else:
                     retSize = 0
@@ -541,185 +473,210 @@ class MIPS:
                         offset += retVal['size']
                     code.append(f"\taddi $v1, $0, {retSize}")
 
-            if self.tac_code[i].startswith('temp'):
-                reg, mips = self.handle_temp(items)
-                code.extend(mips)
-            elif self.tac_code[i].startswith('vartemp'):
-                pass
-            elif self.tac_code[i].startswith('*') or self.tac_code[i].startswith('[]'):
-                # * a = b
-                # * a = unop b
-                # * a = b binop c
-                items = self.tac_code[i].split(' ')
-                if items[1].startswith('temp'):
-                    if len(items) == 4:
-                        loc, _mips, type_loc = self._location(items[1])
-                        reg, mips = self.regs.get_register(items[3])
-                        code.extend(_mips)
-                        code.extend(mips)
-                        if type_loc == 1:
-                            empty_reg, mips = self.regs.get_register()
-                            code.extend(mips)
-                            code.append(f'\tlw {empty_reg} {loc}')
-                            code.append(f'\tsw {reg}, 0({empty_reg})')
-                        else:
-                            code.append(f'\tsw {reg}, 0({loc})')
-                    elif len(items) == 5: 
-                        reg, mips = self.regs.get_register()
-                        code.extend(mips)
-                        code.extend(self.handle_unOp(items[3], items[4], reg))
-                        loc, _mips, type_loc = self._location(items[1])
-                        code.extend(_mips)
-                        if type_loc == 1:
-                            empty_reg, mips = self.regs.get_register()
-                            code.extend(mips)
-                            code.append(f'\tlw {empty_reg} {loc}')
-                            code.append(f'\tsw {reg}, 0({empty_reg})')
-                        else:
-                            code.append(f'\tsw {reg}, 0({loc})')
-                    elif len(items) == 6:
-                        reg, mips = self.regs.get_register()
-                        code.extend(mips)
-                        code.extend(self.handle_binOp(items[3], items[5], items[4], reg))
-                        loc, _mips, type_loc = self._location(items[1])
-                        code.extend(_mips)
-                        if type_loc == 1:
-                            empty_reg, mips = self.regs.get_register()
-                            code.extend(mips)
-                            code.append(f'\tlw {empty_reg} {loc}')
-                            code.append(f'\tsw {reg}, 0({empty_reg})')
-                        else:
-                            code.append(f'\tsw {reg}, 0({loc})')
-                elif items[1][0].isnumeric() and '_' in items[1]:
-                    loc, _mips, type_loc = self._location(items[1])
-                    new_items = items[1:] 
-                    new_items[0] = "temp_{fixxx}" 
-                    reg, mips = self.handle_temp(new_items)
+            if op in tac.valueOps:
+                dest = instr.dest
+                if dest.deref:
+                    code.extend(self.handle_store(instr))
+                elif dest.kind == tac.TEMP:
+                    reg, mips = self.handle_temp(dest.name, instr)
                     code.extend(mips)
-                    if type_loc == 1:
-                        empty_reg, mips = self.regs.get_register()
-                        code.extend(mips)
-                        code.append(f'\tlw {empty_reg} {loc}')
-                        code.append(f'\tsw {reg}, 0({empty_reg})')
-                    else:
-                        code.append(f'\tsw {reg}, 0({loc})')
-                elif items[1].startswith('arg'):
-                    reg, mips = self._get_label(items[1])
-                    code.extend(mips)
-                    # empty_reg, mips = self.regs.get_register()
-                    # code.extend(mips)
-                    if items[3] == "__syscall":
-                        code.append(f"\tsw $v0, 0({reg})")
-                    else:
-                        reg2, mips = self.regs.get_register(items[3])
-                        code.extend(mips)
-                        code.append(f'\tsw {reg2} 0({reg})')
-                elif items[1].startswith('vartemp'):
-                    # TODO
+                elif dest.kind == tac.VAR_TEMP:
                     pass
-            elif self.tac_code[i].startswith('call'):
-                ## TODO 
-                j = 1
-                paramValues = []
-                while self.tac_code[i-j].startswith('params'):
-                    paramValues.append(self.tac_code[i-j].split()[1])
-                    j += 1
-
-                if len(paramValues) > 4:
-                    paramValues = paramValues[:-4] 
-                    for param in paramValues:
-                        reg, mips = self._get_label(param)
-                        code.extend(mips)
-                        code.append("\tadd $sp, $sp, -4")
-                        code.append(f"\tsw {reg}, 0($sp)")
-
-                items = self.tac_code[i].split(' ')
-                if i >= 1 and not self.tac_code[i-1].startswith('params'):
-                    code.append("\t#### Saving temporary registers")
-                    for reg in self.regs.regs:
-                        code.append(f"\tadd $sp, $sp, -4")
-                        code.append(f"\tsw {reg}, 0($sp)")
-                        self.regs._sp -= 4
-                    code.append("\t#### Done saving temporary registers")
-                    code.append("\t#### Saving argument registers")
-                    for reg in self.regs.arg_regs:
-                        code.append(f"\tadd $sp, $sp, -4")
-                        code.append(f"\tsw {reg}, 0($sp)")
-                        self.regs._sp -= 4
-                    code.append("\t#### Done saving argument registers")
-
-                if items[1].startswith('#syscall'):
-                    param_count = 0
-                    while self.tac_code[i-param_count-1].startswith('params'):
-                        param_count -= 1
-                    code.insert(len(code)-param_count, f"\tli $v0, {items[1].split('_')[-1]}")
-                    code.append('\tsyscall') 
-                else:
-                    code.append(f'\tjal _{items[1]}')
-                for i in range(4):
-                    self.regs.arg_regs[f"$a{i}"][0] = None
-                code.append(f"\t### Restoring argument registers")
-                for i in range(3, -1, -1):
-                    code.append(f"\tlw $a{i}, 0($sp)")
-                    code.append(f"\tadd $sp, $sp, 4")
-                    self.regs._sp += 4
-                code.append(f"\t### Done restoring argument registers")
-                for i in range(9, -1, -1):
-                    code.append(f"\tlw $t{i}, 0($sp)")
-                    code.append(f"\tadd $sp, $sp, 4")
-                    self.regs._sp += 4
-
-                pass
-            elif self.tac_code[i].startswith('new'):
+                elif dest.kind == tac.RETVAL:
+                    reg, mips = self.handle_returns(dest)
+                    code.extend(mips)
+                    return code
+                elif dest.kind == tac.ARG:
+                    ## TODO : Handle composite literal
+                    code.extend(self.handle_args(instr))
+                elif dest.kind == tac.VAR:
+                    code.extend(self.handle_localvars(instr))
+            elif op == tac.CALL:
+                code.extend(self.handle_call(i))
+            elif op == tac.NEW:
                 ## TODO 
-                items = self.tac_code[i].split(' ')
+                self.movesSp = True
                 code.append(f"\taddi $sp, $sp, -12")
-                space = int(items[2])
+                space = int(instr.args[0].name)
                 code.extend(self.malloc(space))
                 code.append(f'\tsw $v0, 0($sp)')
                 code.append(f'\tsw {space}, 4($sp)')
                 code.append(f'\tsw {space}, 8($sp)')
                 code.append(f'\tadd $sp, $sp, -12')
-            elif self.tac_code[i].startswith('params'):
-                items = self.tac_code[i].split(' ')
-                if len(items) == 3 and items[1] == '*':
-                    items[1] = f"{items[2]}#point"
-                    new_reg, _code = self.regs.get_register(items[1])
-                    code.extend(_code)
-                    param_reg, _code = self.regs.get_register(items[2])
-                    code.extend(_code)
-                    code.append(f"\tlw {new_reg}, 0({param_reg})")
-
-                code.extend(self.handle_param(items[1]))
-            elif self.tac_code[i].startswith('retparams'):
+            elif op == tac.PARAMS:
+                pass ## Done with the call (handle_call)
+            elif op == tac.RETPARAMS:
                 pass ## Done inside addFunction
-            elif self.tac_code[i].startswith('retval'):
-                reg, mips = self.handle_returns(self.tac_code[i].split(' ')[0])
-                code.extend(mips)
-                return code
-            elif self.tac_code[i].startswith('if'):
-                cond = items[2]
-                elselab = items[5]
-                code.extend(self.handle_ifStmt(cond, elselab))
-            elif self.tac_code[i].startswith('goto'):
-                code.extend(self.handle_goto(self.tac_code[i].split(' ')[1]))
-            elif self.tac_code[i].endswith(':'):  # label
-                code.extend(self.handle_label(self.tac_code[i][:-1]))
-            elif self.tac_code[i].startswith('arg'):
-                ## TODO : Handle composite literal
-                code.extend(self.handle_args(items)) 
-                pass
-            elif len(self.tac_code[i]) > 0 and self.tac_code[i][0].isnumeric():
-                code.extend(self.handle_localvars(items))  
-                pass
-            elif self.tac_code[i].startswith('return'):
+            elif op == tac.IFNOT:
+                code.extend(self.handle_ifStmt(instr.args[0].name, instr.name))
+            elif op == tac.GOTO:
+                code.extend(self.handle_goto(instr.name))
+            elif op == tac.LABEL:
+                code.extend(self.handle_label(instr.name))
+            elif op == tac.RETURN:
                 code.append(f'\tj _return_{self.curr_func}')
+            code.extend(self.regs.finishInstr())
         return code
 
-    def _get_label(self, label, isFloat = False):
+    def _blockLocals(self, lineno):
+        # Variables of the function whose FUNC is at lineno that live in the
+        # blocks of its body, not in its locals
+        local_var = self.act_records[self.curr_func].local_var
+        names = []
+        for i in range(lineno+1, regalloc.functionEnd(self.tac_code, lineno)):
+            instr = self.tac_code[i]
+            for operand in (instr.dest, *instr.args):
+                if operand is not None and operand.kind == tac.VAR and operand.name not in local_var \
+                        and operand.name not in self.global_var and operand.name not in names:
+                    names.append(operand.name)
+        return names
+
+    def _returns(self, func):
+        # Return types of func, a function of the package being generated or
+        # of the program
+        if self.curr_pkg != None and func in self.stm.pkgs[self.curr_pkg].functions:
+            return self.stm.pkgs[self.curr_pkg].functions[func]['return']
+        return self.stm.functions[func]['return']
+
+    def _compute(self, instr, reg):
+        # Code computing the value of a UNOP or BINOP, or of an ASSIGN of a
+        # pointed to value (a = * b), into reg
+        if instr.op == tac.ASSIGN:
+            return self.handle_unOp('*', instr.args[0].pointer(), reg)
+        elif instr.op == tac.UNOP:
+            return self.handle_unOp(instr.typedOperator(), instr.args[0], reg)
+        return self.handle_binOp(instr.args[0], instr.args[1], instr.typedOperator(), reg)
+
+    def _isCopy(self, instr):
+        # a = b, of a b that isn't read through a pointer
+        return instr.op == tac.ASSIGN and not instr.args[0].deref
+
+    def handle_store(self, instr):
+        # * a = b
+        # * a = unop b
+        # * a = b binop c
         code = []
-        if label.startswith("temp") or (label[0].isdigit() and ('_' in label)):
-            _type, offset, type_loc =self._location(label, isFloat = isFloat)
+        pointer = instr.dest.pointer()
+        if pointer.kind == tac.TEMP:
+            if self._isCopy(instr):
+                loc, _mips, type_loc = self._location(pointer)
+                reg, mips = self.regs.get_register(instr.args[0].name)
+                code.extend(_mips)
+                code.extend(mips)
+            else:
+                reg, mips = self.regs.get_register()
+                code.extend(mips)
+                code.extend(self._compute(instr, reg))
+                loc, _mips, type_loc = self._location(pointer)
+                code.extend(_mips)
+            if type_loc == 1:
+                empty_reg, mips = self.regs.get_register()
+                code.extend(mips)
+                code.append(f'\tlw {empty_reg} {loc}')
+                code.append(f'\tsw {reg}, 0({empty_reg})')
+            else:
+                code.append(f'\tsw {reg}, 0({loc})')
+        elif pointer.kind == tac.VAR:
+            loc, _mips, type_loc = self._location(pointer)
+            reg, mips = self.handle_temp("temp_{fixxx}", instr)
+            code.extend(mips)
+            if type_loc == 1:
+                empty_reg, mips = self.regs.get_register()
+                code.extend(mips)
+                code.append(f'\tlw {empty_reg} {loc}')
+                code.append(f'\tsw {reg}, 0({empty_reg})')
+            else:
+                code.append(f'\tsw {reg}, 0({loc})')
+        elif pointer.kind == tac.ARG:
+            reg, mips = self._get_label(pointer)
+            code.extend(mips)
+            # empty_reg, mips = self.regs.get_register()
+            # code.extend(mips)
+            if instr.args[0].kind == tac.SYSCALL:
+                code.append(f"\tsw $v0, 0({reg})")
+            else:
+                reg2, mips = self.regs.get_register(instr.args[0].name)
+                code.extend(mips)
+                code.append(f'\tsw {reg2} 0({reg})')
+        elif pointer.kind == tac.VAR_TEMP:
+            # TODO
+            pass
+        return code
+
+    def handle_call(self, i):
+        # The parameters of the call at position i (its PARAMS) go in $a0-$a3,
+        # and those past the fourth on the stack
+        code = []
+        instr = self.tac_code[i]
+        for param in instr.values:
+            code.extend(self.handle_param(param, i))
+
+        if len(instr.values) > 4:
+            self.movesSp = True
+            for param in reversed(instr.values[4:]):
+                reg, mips = self._value(param)
+                code.extend(mips)
+                code.append("\tadd $sp, $sp, -4")
+                code.append(f"\tsw {reg}, 0($sp)")
+
+        func = instr.name
+        if not instr.values:
+            code.extend(self._saveCallerRegs(i))
+
+        if func.startswith('#syscall'):
+            code.append(f"\tli $v0, {func.split('_')[-1]}")
+            code.append('\tsyscall') 
+        else:
+            self.makesCalls = True
+            code.append(f'\tjal _{func}')
+        for k in range(4):
+            self.regs.arg_regs[f"$a{k}"][0] = None
+        code.extend(self._restoreCallerRegs())
+        return code
+
+    def _liveAcrossCall(self, call):
+        # Caller-saved registers holding what the function reads after the
+        # call at position call: the $t registers of the live temporaries and
+        # the $a registers of the live parameters.  A syscall only overwrites
+        # the $a registers its parameters are put in
+        isSyscall = self.tac_code[call].name.startswith('#syscall')
+        params = len(self.tac_code[call].values)
+        live = set()
+        if not isSyscall:
+            for temp in self.regs.allocation.liveAfter.get(call, ()):
+                location = self.regs.locations[temp]
+                if location[0] == 0 and location[1] in self.regs.regs:
+                    live.add(location[1])
+        for arg in self.argsLiveAfter.get(call, ()):
+            _type, reg = self.get_args(tac.operand(arg))
+            if _type == 0 and reg in self.regs.arg_regs and (not isSyscall or int(reg[2:]) < params):
+                live.add(reg)
+        return [reg for reg in (*self.regs.regs, *self.regs.arg_regs) if reg in live]
+
+    def _saveCallerRegs(self, call):
+        code = []
+        self.callSaves = self._liveAcrossCall(call)
+        if self.annotate:
+            code.append(f"\t#### Saving {' '.join(self.callSaves) or 'no registers'} across the call")
+        for k, reg in enumerate(self.callSaves):
+            code.append(f"\tsw {reg}, {-self.frameSize - 4 * (k + 1)}($fp)")
+        self.callSaveSlots = max(self.callSaveSlots, len(self.callSaves))
+        return code
+
+    def _restoreCallerRegs(self):
+        code = []
+        if self.callSaves:
+            if self.annotate:
+                code.append(f"\t### Restoring {' '.join(self.callSaves)}")
+            for k, reg in enumerate(self.callSaves):
+                code.append(f"\tlw {reg}, {-self.frameSize - 4 * (k + 1)}($fp)")
+        self.callSaves = []
+        return code
+
+    def _get_label(self, operand, isFloat = False):
+        code = []
+        if operand.kind in (tac.TEMP, tac.VAR):
+            _type, offset, type_loc =self._location(operand, isFloat = isFloat)
             if type_loc == 1:
                 reg, mips = self.regs.get_register()
                 code.extend(mips)
@@ -727,9 +684,9 @@ class MIPS:
                 return reg, code
             else:
                 return _type, offset
-        elif label.startswith("arg"):
+        elif operand.kind == tac.ARG:
             stm_entry = self.stm.get(self.curr_func)
-            offset = -int(label.split('_')[-1].split('.')[0][:-1])
+            offset = -operand.index
             j = 0
             curr_offset = 0
             for param in stm_entry['params']:
@@ -741,56 +698,34 @@ class MIPS:
                 return f"$a{j-1}", []
             reg, mips = self.regs.get_register(isFloat = isFloat)
             code.extend(mips)
-            if len(label.split('_')[-1].split('.')) > 1: 
-                if label.split('_')[-1].split('.')[1] == 'length':
-                    offset += 4 
-                else:
-                    offset += 8
+            if operand.field == 'length':
+                offset += 4 
+            elif operand.field is not None:
+                offset += 8
             code.append(f'\tlw {reg}, {offset}($fp)')
             return reg, code
-        elif label.startswith("vartemp"):
-            loc, _mips, type_loc = self._location(label.split('.')[0])
-            code.extend(_mips)
-            reg = None
-            if label.endswith('.addr'):
-                reg, mips = self.regs.get_register(isFloat = isFloat)
-                code.extend(mips)
-                if type_loc == 1:
-                    code.append(f'\tlw {reg}, {loc}')
-                else:
-                    code.append('\tadd {reg}, {loc}, $0')
-            elif label.endswith('.length'):
-                reg, mips = self.regs.get_register(isFloat = isFloat)
-                code.extend(mips)
-                code.append(f'\tlw {reg}, {offset + 4}')
-            elif label.endswith('.capacity'):
-                reg, mips = self.regs.get_register(isFloat = isFloat)
-                code.extend(mips)
-                code.append(f'\tlw {reg}, {offset + 8}')
-            # else:
-            #     reg1, mips = self.regs.get_register(isFloat = isFloat)
-            #     code.extend(mips)
-            #     code.append(f'\tlw {reg}, {offset}')
-            #     reg2, mips = self.regs.get_register(isFloat = isFloat)
-            #     code.extend(mips)
-            #     code.append(f'\tlw {reg2}, {offset + 4}')
-            #     reg3, mips = self.regs.get_register(isFloat = isFloat)
-            #     code.extend(mips)
-            #     code.append(f'\tlw {reg3}, {offset + 8}')
-            #     return [reg1, reg2, reg3], code
-        elif label.startswith('retval'):
-            return self.handle_returns(label)
+        elif operand.kind == tac.RETVAL:
+            return self.handle_returns(operand)
         else:
             reg, mips = self.regs.get_register()
             code.extend(mips)
-            code.append(f'\tli {reg}, {label}')
+            code.append(f'\tli {reg}, {operand}')
 
         return reg, code
 
-    def handle_newvartemp(self, items):
+    def _value(self, operand, isFloat = False):
+        # Register holding the value of operand, read through the pointer if
+        # it is * p, and the code putting it there
+        if operand.deref:
+            reg, code = self.regs.get_register(isFloat = isFloat)
+            code.extend(self.handle_unOp('*', operand.pointer(), reg))
+            return reg, code
+        return self._get_label(operand, isFloat = isFloat)
+
+    def handle_newvartemp(self, instr):
         code = []
-        var_temp = items[1]
-        var_temp_sz = int(items[2])
+        var_temp = instr.dest
+        var_temp_sz = int(instr.args[0].name)
         code.extend(self.malloc(var_temp_sz))
         pass
 
@@ -803,341 +738,201 @@ class MIPS:
         code = []
         pass
 
-    def handle_localvars(self, items):
+    def handle_localvars(self, instr):
         code = []
+        dest = instr.dest
 
-        if items[0] not in self.regs.locations:
-            self.regs._sp -= 4
-            code.append("\tadd $sp, $sp, -4")
-            self.regs.locations[items[0]] = [1, -self.regs._sp]
-
-        if len(items) == 3:
+        if self._isCopy(instr):
             # a = b
-            if items[2].startswith('temp'):
-                loc, _mips, type_loc = self._location(items[0])
+            b = instr.args[0]
+            if b.kind == tac.TEMP:
+                loc, _mips, type_loc = self._location(dest)
                 code.extend(_mips)
-                find_new_reg, mips, type_new_reg = self._location(items[2])
+                find_new_reg, mips, type_new_reg = self._location(b)
                 code.extend(mips)
                 if type_loc == 1:
                     code.append(f'\tsw {find_new_reg}, {loc}')
                 else:
                     code.append(f'\tadd {loc}, {find_new_reg}, $0')
-            elif items[2].startswith('args'):
-                loc, _mips, type_loc = self._location(items[0])
-                code.extend(_mips)
-                offset2 = -int(items[2].split('_')[-1].split('.')[0][:-1])
-                if len(items[2].split('_')[-1].split('.')) > 1: 
-                    if items[2].split('_')[-1].split('.')[1] == 'length':
-                        offset2 += 4 
-                    else:
-                        offset2 += 8
-                helper_reg, mips = self.regs.get_register()
-                code.extend(mips)  
-                code.append(f'\tlw {helper_reg}, {offset2}($fp)')
-                if type_loc == 1:
-                    code.append(f'\tsw {helper_reg}, {loc}')
-                else:
-                    code.append('\tadd {loc}, {helper_reg}, $0')
 
-            elif items[2].startswith('var_temp'):
-                retReg, mips = self._get_label(items[2])
+            elif b.kind == tac.VAR_TEMP:
+                retReg, mips = self._get_label(b)
                 code.extend(mips)
                 retReg = retReg[0] ## Both point to same location
-                loc, _mips, type_loc = self._location(items[0])[1]
+                loc, _mips, type_loc = self._location(dest)[1]
                 code.extend(_mips)
                 if type_loc == 1:  
                     code.append(f'\tsw {retReg}, {loc}')
                 else:
                     code.append('\tadd {loc}, {retReg}, $0')
 
-            elif items[2].startswith('retval'):
-                funcName = '_'.join(items[2].split('_')[1:-1])
-                if self.curr_pkg != None and funcName in self.stm.pkgs[self.curr_pkg].functions:
-                    new_stm = self.stm.pkgs[self.curr_pkg]
-                else:
-                    new_stm = self.stm
-                num_returns = len(
-                    new_stm.functions[funcName]['return'])
+            elif b.kind == tac.RETVAL:
+                num_returns = len(self._returns(b.func))
                 if num_returns == 1:
-                    reg, mips = self.regs.get_register(items[0])
+                    reg, mips = self.regs.get_register(dest.name)
                     code.extend(mips)
                     code.append(f'\taddi {reg}, $v0, 0')
                 else:
-                    ret_reg, mips = self.handle_returns(items[2])
+                    ret_reg, mips = self.handle_returns(b)
                     code.extend(mips)
-                    loc, _mips, type_loc = self._location(items[0])
+                    loc, _mips, type_loc = self._location(dest)
                     if type_loc == 1:
                         code.append(f'\tlw {ret_reg}, {loc}')
                     else:
                         code.append('\tadd {loc}, {ret_reg}, $0')
 
-            elif items[2].startswith('__syscall'):
-                loc, _mips, type_loc = self._location(items[0])
+            elif b.kind == tac.SYSCALL:
+                loc, _mips, type_loc = self._location(dest)
                 code.extend(_mips)
                 if type_loc == 1:
                     code.append(f'\tsw $v0, {loc}')
                 else:
                     code.append(f'\tadd {loc}, $v0, $0')
 
-            else:
-                if items[2][0] == '"':
-                    # string: TODO
-                    pass
-                elif items[2].isnumeric():
-                    if str(int(items[2])) == items[2]:
-                        # integer
-                        loc, _mips, type_loc = self._location(items[0])
-                        code.extend(_mips)
-                        helper_reg, mips = self.regs.get_register()
-                        code.extend(mips) 
-                        code.append(f'\tli {helper_reg}, {items[2]}')
-                        if type_loc == 1:
-                            code.append(f'\tsw {helper_reg}, {loc}')
-                        else:
-                            code.append(f'\tadd {loc}, {helper_reg}, $0')
-                        pass
-                    else:
-                        # float
-                        loc, _mips, type_loc = self._location(items[0])
-                        code.extend(_mips)
-                        helper_reg, mips = self.regs.get_register(items[0], isFloat = True)
-                        code.extend(mips)
-                        code.append(f'\tli.s {helper_reg}, {items[2]}')
-                        if type_loc == 1:
-                            code.append(f'\tsw {helper_reg}, {loc}')
-                        else:
-                            code.append(f'\tadd {loc}, {helper_reg}, $0')
-                        pass
-                elif items[2][0] == "'":
-                    # rune
-                    loc, _mips, type_loc = self._location(items[0])
-                    code.extend(_mips)
-                    helper_reg, mips = self.regs.get_register(items[0])
-                    code.extend(mips)
-                    code.append(f'\tli {helper_reg}, {items[2]}')
-                    if type_loc == 1:
-                        code.append(f'\tsw {helper_reg}, {loc}')
-                    else:
-                        code.append(f'\tadd {loc}, {helper_reg}, $0')                    
-                    pass
-                else:
-                    raise NotImplementedError
-        elif len(items) == 4:
-            # a = unop b
-            loc, _mips, type_loc = self._location(items[0])
-            code.extend(_mips)
-            reg, mips = self.regs.get_register()
-            code.extend(mips)
-            code.extend(self.handle_unOp(items[2], items[3], reg))
-            if type_loc == 1:
-                code.append(f'\tsw {reg}, {loc}')
-            else:
-                code.append(f'\tadd {loc}, {reg}, $0')
-
-        elif len(items) == 5:
-            # a = b binop c
-            # a = & * b
-            if items[2] == '&' and items[3] == '*': 
-                loc, _mips, type_loc = self._location(items[0])
-                code.extend(_mips)
-                old_reg, mips = self.regs.get_register(items[2])
-                code.extend(mips)
-
-                if type_loc == 1:
-                    code.append(f'\tsw {old_reg}, {loc}')
-                else:
-                    code.append(f'\tadd {loc}, {old_reg}, $0')
-            else:
-                reg, mips = self.regs.get_register()
-                code.extend(mips)
-                code.extend(self.handle_binOp(items[2], items[4], items[3], reg))
-                reg2, mips2 = self.regs.get_register()
-                code.extend(mips2)
-                code.append(f'\tadd {reg2}, {reg}, $0')
-                loc, _mips, type_loc = self._location(items[0])
+            elif b.kind == tac.STRING:
+                # string: TODO
+                pass
+            elif b.kind == tac.INT:
+                loc, _mips, type_loc = self._location(dest)
                 code.extend(_mips)
+                helper_reg, mips = self.regs.get_register()
+                code.extend(mips) 
+                code.append(f'\tli {helper_reg}, {b}')
                 if type_loc == 1:
-                    code.append(f'\tsw {reg2}, {loc}')
+                    code.append(f'\tsw {helper_reg}, {loc}')
                 else:
-                    code.append(f'\tadd {loc}, {reg2}, $0')
-        elif len(items) == 6:
-            # a = * b binop c
-            # a = b binop * c
-            if items[2] == '*': 
-                loc, _mips, type_loc = self._location(items[0])
+                    code.append(f'\tadd {loc}, {helper_reg}, $0')
+            elif b.kind == tac.FLOAT:
+                loc, _mips, type_loc = self._location(dest)
                 code.extend(_mips)
-                reg, mips = self.regs.get_register()
-                code.extend(mips)
-                new_reg, mips = self.regs.get_register()
+                helper_reg, mips = self.regs.get_register(dest.name, isFloat = True)
                 code.extend(mips)
-                code.extend(self.handle_unOp(items[2], items[3], new_reg))
-                binop_reg, mips = self.regs.get_register()
-                code.extend(mips)
-                code.extend(self.handle_binOp(new_reg, items[4], binop_reg, isreg1 = True))
-                code.append(f"\tadd {reg}, {binop_reg}, $0")
-                
+                code.append(f'\tli.s {helper_reg}, {b}')
                 if type_loc == 1:
-                    code.append(f'\tsw {binop_reg}, {loc}')
+                    code.append(f'\tsw {helper_reg}, {loc}')
                 else:
-                    code.append(f'\tadd {loc}, {binop_reg}, $0')
-            elif items[4] == '*':
-                loc, _mips, type_loc = self._location(items[0])
+                    code.append(f'\tadd {loc}, {helper_reg}, $0')
+            elif b.kind == tac.RUNE:
+                loc, _mips, type_loc = self._location(dest)
                 code.extend(_mips)
-                reg, mips = self.regs.get_register()
-                code.extend(mips)
-                new_reg, mips = self.regs.get_register()
+                helper_reg, mips = self.regs.get_register(dest.name)
                 code.extend(mips)
-                code.extend(self.handle_unOp(items[4], items[5], new_reg))
-                binop_reg, mips = self.regs.get_register
-                code.extend(mips)
-                code.extend(self.handle_binOp(items[2], new_reg, binop_reg, isreg2 = True))
-                code.append(f"\tadd {reg}, {binop_reg}, $0")
-                
-                if type_loc == 0:
-                    code.append(f'\tadd {loc}, {reg}, $0')
+                code.append(f'\tli {helper_reg}, {b}')
+                if type_loc == 1:
+                    code.append(f'\tsw {helper_reg}, {loc}')
                 else:
-                    code.append(f'\tsw {reg}, {loc}')
+                    code.append(f'\tadd {loc}, {helper_reg}, $0')                    
+            else:
+                raise NotImplementedError
+        elif instr.op == tac.BINOP:
+            # a = b binop c
+            reg, mips = self.regs.get_register()
+            code.extend(mips)
+            code.extend(self._compute(instr, reg))
+            reg2, mips2 = self.regs.get_register()
+            code.extend(mips2)
+            code.append(f'\tadd {reg2}, {reg}, $0')
+            loc, _mips, type_loc = self._location(dest)
+            code.extend(_mips)
+            if type_loc == 1:
+                code.append(f'\tsw {reg2}, {loc}')
+            else:
+                code.append(f'\tadd {loc}, {reg2}, $0')
         else:
-            raise NotImplementedError
+            # a = unop b
+            # a = * b
+            loc, _mips, type_loc = self._location(dest)
+            code.extend(_mips)
+            reg, mips = self.regs.get_register()
+            code.extend(mips)
+            code.extend(self._compute(instr, reg))
+            if type_loc == 1:
+                code.append(f'\tsw {reg}, {loc}')
+            else:
+                code.append(f'\tadd {loc}, {reg}, $0')
 
         return code
 
 
-    def handle_temp(self, items):
+    def handle_temp(self, dest, instr):
+        # Code of the value instruction instr writing to the temporary dest,
+        # and the register it is in
         code = []
-        if len(items) == 3:
+        if self._isCopy(instr):
             # a = b
-            if items[2].startswith('temp'):
-                old_reg, mips = self.regs.get_register(items[2])
+            b = instr.args[0]
+            if b.kind == tac.TEMP:
+                old_reg, mips = self.regs.get_register(b.name)
                 code.extend(mips)
-                find_new_reg, mips = self.regs.get_register(items[0])
+                find_new_reg, mips = self.regs.get_register(dest)
                 code.extend(mips)
-                code.append(f'\tadd {find_new_reg}, {old_reg}, $0')
+                # No copy if the two were coalesced
+                if find_new_reg != old_reg:
+                    code.append(f'\tadd {find_new_reg}, {old_reg}, $0')
                 return find_new_reg, code
-            elif items[2].startswith('args'):
-                find_new_reg, mips = self.regs.get_register(items[0])
-                code.extend(mips)
-                offset = -int(items[2].split('_')[-1].split('.')[0][:-1])
-                if len(items[2].split('_')[-1].split('.')) > 1: 
-                    if items[2].split('_')[-1].split('.')[1] == 'length':
-                        offset += 4 
-                    else:
-                        offset += 8
-                code.append(f'\tlw {find_new_reg}, {offset}($fp)')
-                return find_new_reg, code
-            elif items[2].startswith('var_temp'):
-                retReg, mips = self._get_label(items[2])
+            elif b.kind == tac.VAR_TEMP:
+                retReg, mips = self._get_label(b)
                 code.extend(mips)
                 retReg = retReg[0] ## Both point to same location
-                find_new_reg, mips = self.regs.get_register(items[0])
+                find_new_reg, mips = self.regs.get_register(dest)
                 code.extend(mips)
                 code.append(f'\tadd {find_new_reg}, {retReg}, $0')
                 return find_new_reg, code
 
-            elif items[2].startswith('retval'):
-                funcName = '_'.join(items[2].split('_')[1:-1])
-                print(funcName)
-                if self.curr_pkg != None and funcName in self.stm.pkgs[self.curr_pkg].functions:
-                    new_stm = self.stm.pkgs[self.curr_pkg]
-                else:
-                    new_stm = self.stm
-                num_returns = len(new_stm.functions[funcName]['return'])
+            elif b.kind == tac.RETVAL:
+                if codegenTrace.debug:
+                    codegenTrace.log('debug', "Return value of %s", b.func)
+                num_returns = len(self._returns(b.func))
                 if num_returns == 1:
-                    code.append(f"\t### STACK1: {self.regs._sp}, {items[0]}")
-                    code.append(f"\t### {items[0] in self.regs.locations}")
-                    reg, mips = self.regs.get_register(items[0])
+                    if self.annotate:
+                        code.append(f"\t### STACK1: {self.regs._sp}, {dest}")
+                        code.append(f"\t### {dest in self.regs.locations}")
+                    reg, mips = self.regs.get_register(dest)
                     code.extend(mips)
-                    code.append(f"\t### STACK2: {self.regs._sp}")
+                    if self.annotate:
+                        code.append(f"\t### STACK2: {self.regs._sp}")
                     code.append(f'\taddi {reg}, $v0, 0')
                     return reg, code
                 else:
-                    ret_reg, mips = self.handle_returns(items[2])
+                    ret_reg, mips = self.handle_returns(b)
                     code.extend(mips)
-                    reg, mips = self.regs.get_register(items[0])
+                    reg, mips = self.regs.get_register(dest)
                     code.extend(mips)
                     code.append(f'\taddi {reg}, {ret_reg}, 0')
                     return reg, code
-            else:
-                if items[2][0] == '"':
-                    # string: TODO
-                    pass
-                elif items[2].isnumeric():
-                    if str(int(items[2])) == items[2]:
-                        # integer
-                        reg, mips = self.regs.get_register(items[0])
-                        code.extend(mips)
-                        code.append(f'\tli {reg}, {items[2]}')
-                        return reg, code
-                    else:
-                        # float
-                        reg, mips = self.regs.get_register(items[0], isFloat = True)
-                        code.extend(mips)
-                        code.append(f'\tli.s {reg}, {items[2]}')
-                        return reg, code
-                elif items[2][0] == "'":
-                    # rune
-                    reg, mips = self.regs.get_register(items[0])
-                    code.extend(mips)
-                    code.append(f'\tli {reg}, {items[2]}')
-                    return reg, code
-                else:
-                    raise NotImplementedError
-        elif len(items) == 4:
-            # a = unop b
-            reg, mips = self.regs.get_register(items[0])
-            code.extend(mips)
-            code.extend(self.handle_unOp(items[2], items[3], reg))
-            return reg, code
-        elif len(items) == 5:
-            # a = b binop c
-            # a = & * b
-            if items[2] == '&' and items[3] == '*': 
-                old_reg, mips = self.regs.get_register(items[2])
-                code.extend(mips)
-                find_new_reg, mips = self.regs.get_register(items[0])
-                code.extend(mips)
-                code.append(f'\tadd {find_new_reg}, {old_reg}, $0')
-                return find_new_reg, code
-            else:
-                reg, mips = self.regs.get_register()
+            elif b.kind == tac.STRING:
+                # string: TODO
+                return self.regs.get_register(dest)
+            elif b.kind == tac.INT:
+                reg, mips = self.regs.get_register(dest)
                 code.extend(mips)
-                code.extend(self.handle_binOp(items[2], items[4], items[3], reg))
-                reg2, mips2 = self.regs.get_register(items[0])
-                code.extend(mips2)
-                code.append(f'\tadd {reg2}, {reg}, $0')
-                return reg2, code
-        elif len(items) == 6:
-            # a = * b binop c
-            # a = b binop * c
-            if items[2] == '*': 
-                reg, mips = self.regs.get_register(items[0])
-                code.extend(mips)
-                new_reg, mips = self.regs.get_register()
-                code.extend(mips)
-                code.extend(self.handle_unOp(items[2], items[3], new_reg))
-                binop_reg, mips = self.regs.get_register
-                code.extend(mips)
-                code.extend(self.handle_binOp(new_reg, items[4], binop_reg, isreg1 = True))
-                code.append("\tadd {reg}, {binop_reg}, $0")
+                code.append(f'\tli {reg}, {b}')
                 return reg, code
-            elif items[4] == '*':
-                reg, mips = self.regs.get_register(items[0])
-                code.extend(mips)
-                new_reg, mips = self.regs.get_register()
+            elif b.kind == tac.FLOAT:
+                reg, mips = self.regs.get_register(dest, isFloat = True)
                 code.extend(mips)
-                code.extend(self.handle_unOp(items[4], items[5], new_reg))
-                binop_reg, mips = self.regs.get_register()
+                code.append(f'\tli.s {reg}, {b}')
+                return reg, code
+            elif b.kind == tac.RUNE:
+                reg, mips = self.regs.get_register(dest)
                 code.extend(mips)
-                code.extend(self.handle_binOp(items[2], new_reg, items[4], binop_reg, isreg2 = True))
-                code.append(f"\tadd {reg}, {binop_reg}, $0")
+                code.append(f'\tli {reg}, {b}')
                 return reg, code
-
+            else:
+                raise NotImplementedError
         else:
-            raise NotImplementedError
+            # a = unop b
+            # a = * b
+            # a = b binop c: straight into the register of a, the allocators
+            # never give it the register of an operand
+            reg, mips = self.regs.get_register(dest)
+            code.extend(mips)
+            code.extend(self._compute(instr, reg))
+            return reg, code
 
-    def get_args(self, label):
+    def get_args(self, operand):
         stm_entry = self.stm.get(self.curr_func)
-        offset = -int(label.split('_')[-1].split('.')[0][:-1])
+        offset = -operand.index
         j = 0
         curr_offset = 0
         for param in stm_entry['params']:
@@ -1148,216 +943,153 @@ class MIPS:
         if j <= 4:
             return 0, f"$a{j-1}"
         else:
-            offset = int(label.split('_')[-1].split('.')[0][:-1])
-            if len(label.split('_')[-1].split('.')) > 1:
-                if label.split('_')[-1].split('.')[1] == 'length':
-                    offset += 4 
-                else:
-                    offset += 8
+            offset = operand.index
+            if operand.field == 'length':
+                offset += 4 
+            elif operand.field is not None:
+                offset += 8
             return 1, -offset-16
 
-    def handle_args(self, items): 
-        print(items)
+    def handle_args(self, instr): 
+        if codegenTrace.debug:
+            codegenTrace.log('debug', "Argument %s", instr)
         code = []
-        if len(items) == 3:
+        dest = instr.dest
+        if self._isCopy(instr):
             # a = b
-            if items[2].startswith('temp'):
-                _type, offset = self.get_args(items[0])
-                find_new_reg, mips = self._get_label(items[2])
+            b = instr.args[0]
+            if b.kind == tac.TEMP:
+                _type, offset = self.get_args(dest)
+                find_new_reg, mips = self._get_label(b)
                 code.extend(mips)
                 if _type == 0:
                     code.append(f'\tadd {offset}, {find_new_reg}, $0')
                     return code
                 code.append(f'\tsw {find_new_reg}, {offset}($fp)')
-            elif items[2].startswith('args'):
-                _type1, offset1 = self.get_args(items[0])
-                _type2, offset2 = self.get_args(items[2])
-                helper_reg, mips = self.regs.get_register()
-                code.extend(mips)  
-                if _type1 == 1:
-                    code.append(f'\tlw {helper_reg}, {offset2}($fp)')
-                else:
-                    code.append(f'\tlw {offset1}, {helper_reg}, $0')
-                if _type2 == 1:
-                    code.append(f'\tsw {helper_reg}, {offset1}($fp)')
-                else:
-                    code.append(f'\tlw {offset2}, {helper_reg}, $0')
- 
-            elif items[2].startswith('var_temp'):
-                retReg, mips = self._get_label(items[2])
+            elif b.kind == tac.VAR_TEMP:
+                retReg, mips = self._get_label(b)
                 code.extend(mips)
                 retReg = retReg[0] ## Both point to same location
-                _type, offset = self.get_args(items[0]) 
+                _type, offset = self.get_args(dest) 
                 if _type == 1:
                     code.append(f'\tsw {retReg}, {offset}($fp)')
                 else:
                     code.append(f'\tadd {offset}, {retReg}, $0')
 
-            elif items[2].startswith('retval'):
-                funcName = '_'.join(items[2].split('_')[1:-1])
-                if self.curr_pkg != None and funcName in self.stm.pkgs[self.curr_pkg].functions:
-                    new_stm = self.stm.pkgs[self.curr_pkg]
-                else:
-                    new_stm = self.stm
-                num_returns = len(
-                    new_stm.functions[funcName]['return'])
+            elif b.kind == tac.RETVAL:
+                num_returns = len(self._returns(b.func))
                 if num_returns == 1:
-                    reg, mips = self._get_label(items[0])
+                    reg, mips = self._get_label(dest)
                     code.extend(mips)
                     code.append(f'\taddi {reg}, $v0, 0')
                 else:
-                    ret_reg, mips = self.handle_returns(items[2])
+                    ret_reg, mips = self.handle_returns(b)
                     code.extend(mips)
-                    _type, offset = self.get_args(items[0])
+                    _type, offset = self.get_args(dest)
                     if _type == 1:
                         code.append(f'\tlw {ret_reg}, {offset}($fp)')
                     else:
                         code.append(f'\tadd {offset}, {ret_reg}, $0')
-            else:
-                if items[2][0] == '"':
-                    # string: TODO
-                    pass
-                elif items[2].isnumeric():
-                    if str(int(items[2])) == items[2]:
-                        # integer
-                        _type, offset = self.get_args(items[0])
-                        helper_reg, mips = self.regs.get_register()
-                        code.extend(mips) 
-                        code.append(f'\tli {helper_reg}, {items[2]}')
-                        if _type == 1:
-                            code.append(f'\tsw {helper_reg}, {offset}($fp)')
-                        else:
-                            code.append(f'\tadd {offset}, {helper_reg}, $0')
-                        pass
-                    else:
-                        # float
-                        _type, offset = self.get_args(items[0])
-                        helper_reg, mips = self._get_label(items[0], isFloat = True)
-                        code.extend(mips)
-                        code.append(f'\tli.s {helper_reg}, {items[2]}')
-                        if _type == 1:
-                            code.append(f'\tsw {helper_reg}, {offset}($fp)')
-                        else:
-                            code.append(f'\tadd {offset}, {helper_reg}, $0')                        
-                            pass
-                elif items[2][0] == "'":
-                    # rune
-                    _type, offset = self.get_args(items[0])
-                    helper_reg, mips = self._get_label(items[0])
-                    code.extend(mips)
-                    code.append(f'\tli {helper_reg}, {items[2]}')
-                    if _type == 1:
-                        code.append(f'\tsw {helper_reg}, {offset}($fp)')
-                    else:
-                        code.append(f'\tadd {offset}, {helper_reg}, $0')                    
-                        pass
-                else:
-                    raise NotImplementedError
-        elif len(items) == 4:
-            # a = unop b
-            _type, offset = self.get_args(items[0])
-            reg, mips = self.regs.get_register()
-            code.extend(mips)
-            code.extend(self.handle_unOp(items[2], items[3], reg))
-            if _type == 1:
-                code.append(f'\tsw {reg}, {offset}($fp)')
-            else:
-                code.append(f'\tadd {offset}, {reg}, $0')
-        elif len(items) == 5:
-            # a = b binop c
-            # a = & * b
-            if items[2] == '&' and items[3] == '*': 
-                _type, offset = self.get_args(items[0])
-                old_reg, mips = self.regs.get_register(items[2])
-                code.extend(mips)
-                if _type == 1:
-                    code.append(f'\tsw {old_reg}, {offset}($fp)')
-                else:
-                    code.append(f'\tadd {offset}, {old_reg}, $0')              
-            else:
-                _type, offset = self.get_args(items[0])
-                reg, mips = self.regs.get_register()
-                code.extend(mips)
-                code.extend(self.handle_binOp(items[2], items[4], items[3], reg))
-                reg2, mips2 = self.regs.get_register()
-                code.extend(mips2)
-                code.append(f'\tadd {reg2}, {reg}, $0')
+            elif b.kind == tac.STRING:
+                # string: TODO
+                pass
+            elif b.kind == tac.INT:
+                _type, offset = self.get_args(dest)
+                helper_reg, mips = self.regs.get_register()
+                code.extend(mips) 
+                code.append(f'\tli {helper_reg}, {b}')
                 if _type == 1:
-                    code.append(f'\tsw {reg2}, {offset}($fp)')
+                    code.append(f'\tsw {helper_reg}, {offset}($fp)')
                 else:
-                    code.append(f'\tadd {offset}, {reg2}, $0')        
-        elif len(items) == 6:
-            # a = * b binop c
-            # a = b binop * c
-            if items[2] == '*': 
-                _type, offset = self.get_args(items[0])
-                reg, mips = self.regs.get_register()
-                code.extend(mips)
-                new_reg, mips = self.regs.get_register()
+                    code.append(f'\tadd {offset}, {helper_reg}, $0')
+            elif b.kind == tac.FLOAT:
+                _type, offset = self.get_args(dest)
+                helper_reg, mips = self._get_label(dest, isFloat = True)
                 code.extend(mips)
-                code.extend(self.handle_unOp(items[2], items[3], new_reg))
-                binop_reg, mips = self.regs.get_register()
-                code.extend(mips)
-                code.extend(self.handle_binOp(new_reg, items[4], binop_reg, isreg1 = True))
-                code.append("\tadd {reg}, {binop_reg}, $0")
+                code.append(f'\tli.s {helper_reg}, {b}')
                 if _type == 1:
-                    code.append(f'\tsw {binop_reg}, {offset}($fp)')
+                    code.append(f'\tsw {helper_reg}, {offset}($fp)')
                 else:
-                    code.append(f'\tadd {offset}, {binop_reg}, $0')            
-        elif items[4] == '*':
-                _type, offset = self.get_args(items[0])  
-                reg, mips = self.regs.get_register()
+                    code.append(f'\tadd {offset}, {helper_reg}, $0')                        
+            elif b.kind == tac.RUNE:
+                _type, offset = self.get_args(dest)
+                helper_reg, mips = self._get_label(dest)
                 code.extend(mips)
-                new_reg, mips = self.regs.get_register()
-                code.extend(mips)
-                code.extend(self.handle_unOp(items[4], items[5], new_reg))
-                binop_reg, mips = self.regs.get_register()
-                code.extend(mips)
-                code.extend(self.handle_binOp(items[2], new_reg, binop_reg, isreg2 = True))
-                code.append("\tadd {reg}, {binop_reg}, $0")
+                code.append(f'\tli {helper_reg}, {b}')
                 if _type == 1:
-                    code.append(f'\tsw {reg}, {offset}($fp)')
+                    code.append(f'\tsw {helper_reg}, {offset}($fp)')
                 else:
-                    code.append(f'\tadd {offset}, {reg}, $0')        
+                    code.append(f'\tadd {offset}, {helper_reg}, $0')                    
+            else:
+                raise NotImplementedError
+        elif instr.op == tac.BINOP:
+            # a = b binop c
+            _type, offset = self.get_args(dest)
+            reg, mips = self.regs.get_register()
+            code.extend(mips)
+            code.extend(self._compute(instr, reg))
+            reg2, mips2 = self.regs.get_register()
+            code.extend(mips2)
+            code.append(f'\tadd {reg2}, {reg}, $0')
+            if _type == 1:
+                code.append(f'\tsw {reg2}, {offset}($fp)')
+            else:
+                code.append(f'\tadd {offset}, {reg2}, $0')        
         else:
-            raise NotImplementedError
+            # a = unop b
+            # a = * b
+            _type, offset = self.get_args(dest)
+            reg, mips = self.regs.get_register()
+            code.extend(mips)
+            code.extend(self._compute(instr, reg))
+            if _type == 1:
+                code.append(f'\tsw {reg}, {offset}($fp)')
+            else:
+                code.append(f'\tadd {offset}, {reg}, $0')
 
         return code
 
-    def handle_param(self, param):
+    def handle_param(self, param, call):
+        # Moves param, a parameter of the call at position call, to the first
+        # free $a register; the registers live across the call are saved
+        # before the first parameter
         # TODO : Handle vartemp and sizes
-        found = 0            
         code = []
-        
+        reg = None
+        if param.deref:
+            # * p, read before it is moved
+            reg, mips = self.regs.get_register()
+            code.extend(mips)
+            pointer_reg, mips = self.regs.get_register(param.name)
+            code.extend(mips)
+            code.append(f"\tlw {reg}, 0({pointer_reg})")
+
         for i in range(4):
             if self.regs.arg_regs[f'$a{i}'][0] == None:
                 if i == 0:
-                    code.append("\t#### Saving temporary registers")
-                    for reg in self.regs.regs:
-                        code.append(f"\tadd $sp, $sp, -4")
-                        code.append(f"\tsw {reg}, 0($sp)")
-                        self.regs._sp -= 4 
-                    code.append("\t#### Done saving temporary registers")
-                    code.append("\t#### Saving argument registers")
-                    for reg in self.regs.arg_regs:
-                        code.append(f"\tadd $sp, $sp, -4")
-                        code.append(f"\tsw {reg}, 0($sp)")
-                        self.regs._sp -= 4
-                    code.append("\t#### Done saving argument registers")
-                found = 1 
-                code.append(f"\t#### YAYYY {param}")
-                if param.startswith('temp'):
+                    code.extend(self._saveCallerRegs(call))
+                if self.annotate:
+                    code.append(f"\t#### YAYYY {param}")
+                if reg is not None:
                     self.regs.arg_regs[f'$a{i}'][0] = param
                     self.regs.arg_regs[f'$a{i}'][1] = self.regs.count
                     self.regs.count += 1
-                    offset = self.regs.locations[param]
-                    code.append(f"\t### offset: {offset}, {param}")
+                    code.append(f"\tadd $a{i}, {reg}, $0")
+                    break
+                elif param.kind == tac.TEMP:
+                    self.regs.arg_regs[f'$a{i}'][0] = param
+                    self.regs.arg_regs[f'$a{i}'][1] = self.regs.count
+                    self.regs.count += 1
+                    offset = self.regs.locations[param.name]
+                    if self.annotate:
+                        code.append(f"\t### offset: {offset}, {param}")
                     if offset[0] == 1:
+                        self.regs.noteReload(param.name)
                         code.append(f"\tlw $a{i}, {offset[1] - self.act_records[self.curr_func].localvar_space - 32}($fp)")
                     else:
                         code.append(f"\tadd $a{i}, {offset[1]}, $0")
                     break
-                elif param.startswith('arg'):
+                elif param.kind == tac.ARG:
                     _type, offset = self.get_args(param)
                     self.regs.arg_regs[f"$a{i}"] = [self.regs.count, param]
                     self.regs.count += 1
@@ -1366,7 +1098,7 @@ class MIPS:
                     else:
                         code.append(f"\tadd $a{i}, {offset}, $0")
                     break
-                elif param[0].isnumeric() and '_' in param:
+                elif param.kind == tac.VAR:
                     self.regs.arg_regs[f'$a{i}'][0] = param
                     self.regs.arg_regs[f'$a{i}'][1] = self.regs.count
                     self.regs.count += 1
@@ -1375,9 +1107,9 @@ class MIPS:
                     code.append(f"\tadd $a{i}, {regs}, $0")
                     break
                 else:
-                    loc, _mips, type_loc = self._location(param.split('.')[0])
+                    loc, _mips, type_loc = self._location(param)
                     code.extend(_mips)
-                    if param.endswith('.addr'):
+                    if param.field == 'addr':
                         # params var_temp#x.addr
                         self.regs.arg_regs[f'$a{i}'][0] = param
                         self.regs.arg_regs[f'$a{i}'][1] = self.regs.count
@@ -1386,35 +1118,32 @@ class MIPS:
                             code.append(f'\tlw $a{i}, {loc}')
                         else:
                             code.append(f'\tadd $a{i}, {loc}, $0')
-                    elif param.endswith('.length'):
+                        break
+                    elif param.field == 'length':
                         # params var_temp#x.length
                         self.regs.arg_regs[f'$a{i}'][0] = param
                         self.regs.arg_regs[f'$a{i}'][1] = self.regs.count
                         self.regs.count += 1
                         code.append(f'\tlw $a{i}, {int(loc.split("(")[0]) + 4}($fp)')
-                    elif param.endswith('.capacity'):
+                        break
+                    elif param.field == 'capacity':
                         self.regs.arg_regs[f'$a{i}'][0] = param
                         self.regs.arg_regs[f'$a{i}'][1] = self.regs.count
                         self.regs.count += 1
                         code.append(f'\tlw $a{i}, {int(loc.split("(")[0]) + 8}($fp)')
+                        break
                     else:
                         ## TODO
                         pass
         return code
 
     def handle_returns(self, returnval):
-        
-        funcName = '_'.join(returnval.split('_')[1:-1])
-        num = int(returnval.split('_')[-1])
-
+        # Register loaded with the return value returnval (retval_f_N) of the
+        # last call
         code = []
         offset = 0
-        if self.curr_pkg != None and funcName in self.stm.pkgs[self.curr_pkg].functions:
-            new_stm = self.stm.pkgs[self.curr_pkg]
-        else:
-            new_stm = self.stm
-        for idx, retVal in enumerate(new_stm.functions[funcName]['return']):
-            if idx == num:
+        for idx, retVal in enumerate(self._returns(returnval.func)):
+            if idx == returnval.index:
                 break
             offset += retVal['size']
 
@@ -1423,6 +1152,45 @@ class MIPS:
         code.append(f'\tlw {reg}, {offset}($v0)')
         return reg, code
 
+    def _frame(self, funcname, body, frame, argSize):
+        # Prologue, body and epilogue of a function whose frame below $fp is
+        # frame bytes and whose arguments on the stack are argSize bytes.  A
+        # leaf function (no jal) leaves $ra in its register, and a function
+        # whose body doesn't move $sp has its frame at a static offset from
+        # $sp, addressed off $sp without setting up $fp.  A function that
+        # takes the address of something in its frame keeps $fp for the
+        # pointer to point into, and main keeps both
+        leaf = funcname != 'main' and not self.makesCalls
+        static = funcname != 'main' and not self.movesSp and not self.takesFrameAddress
+        code = [f'\taddi $sp, $sp, -{frame + 8}']
+        if self.annotate:
+            code.append(f"\t### {'Leaf function, ' if leaf else ''}frame of {frame + 8} bytes off {'$sp' if static else '$fp'}")
+        if not leaf:
+            code.append(f'\tsw $ra, {frame + 4}($sp)')
+        if static:
+            for line in body:
+                line = _fpAddress.sub(lambda m: f'{int(m.group(1)) + frame}($sp)', line)
+                if '$fp' in line.split('#', 1)[0]:
+                    raise Exception(f"{funcname}: $fp left in a frame addressed off $sp: {line.strip()}")
+                code.append(line)
+            if not leaf:
+                code.append(f'\tlw $ra, {frame + 4}($sp)')
+            code.append(f'\taddi $sp, $sp, {frame + argSize + 8}')
+        else:
+            code.append(f'\tsw $fp, {frame}($sp)')
+            code.append(f'\taddi $fp, $sp, {frame}')
+            code.extend(body)
+            if not leaf:
+                code.append(f'\tlw $ra, 4($fp)')
+            code.append(f'\taddi $sp, $fp, {argSize + 8}')
+            code.append(f'\tlw $fp, 0($fp)')
+
+        if funcname != 'main':
+            code.append(f'\tjr $ra')
+        else:
+            code.extend(self.exit())
+        return code
+
     def handle_label(self, label):
         return [f"{label}:"]
 
@@ -1438,16 +1206,12 @@ class MIPS:
         code.append(f"\tbeqz {reg[0]}, {elselab}")
         return code
 
-    def handle_floatBinOp(self, operand1, operand2, operator, finalreg, isreg1 = False, isreg2 = False):
+    def handle_floatBinOp(self, operand1, operand2, operator, finalreg):
         code = []
-        reg1 = operand1  
-        reg2 = operand2 
-        if not isreg1:
-            reg1, mips = self._get_label(operand1, isFloat=True)
-            code.extend(mips)
-        if not isreg2:
-            reg2, mips = self._get_label(operand2, isFloat=True)
-            code.extend(mips)
+        reg1, mips = self._value(operand1, isFloat=True)
+        code.extend(mips)
+        reg2, mips = self._value(operand2, isFloat=True)
+        code.extend(mips)
         reg3, mips = self.get_register(isFloat=True)
         code.extend(mips)
 
@@ -1483,16 +1247,12 @@ class MIPS:
             code.append(f'cfc1 {finalreg}, {reg3}')
         return code
 
-    def handle_intBinOp(self, operand1, operand2, operator, finalreg, isreg1 = False, isreg2 = False):
+    def handle_intBinOp(self, operand1, operand2, operator, finalreg):
         code = []
-        reg1 = operand1
-        reg2 = operand2
-        if not isreg1:
-            reg1, mips = self._get_label(operand1)
-            code.extend(mips)
-        if not isreg2:
-            reg2, mips = self._get_label(operand2)
-            code.extend(mips)
+        reg1, mips = self._value(operand1)
+        code.extend(mips)
+        reg2, mips = self._value(operand2)
+        code.extend(mips)
 
         if operator.startswith('+'):
             code.append(f'\tadd {finalreg}, {reg1}, {reg2}')
@@ -1559,12 +1319,12 @@ class MIPS:
 
         return code
 
-    def handle_binOp(self, operand1, operand2, operator, finalreg, isreg1 = False, isreg2 = False):
+    def handle_binOp(self, operand1, operand2, operator, finalreg):
 
         if 'float' in operator:
-            return self.handle_floatBinOp(operand1, operand2, operator, finalreg, isreg1, isreg2)
+            return self.handle_floatBinOp(operand1, operand2, operator, finalreg)
         else:
-            return self.handle_intBinOp(operand1, operand2, operator, finalreg, isreg1, isreg2)
+            return self.handle_intBinOp(operand1, operand2, operator, finalreg)
 
     def handle_unOp(self, opr, operand, finalreg):
         code = []
@@ -1572,38 +1332,46 @@ class MIPS:
             return []
 
         elif opr[0] == '-':
-            if 'float' in opr:
-                isFloat = True 
-            reg, mips = self._get_label(operand, isFloat = isFloat)
+            isFloat = 'float' in opr
+            reg, mips = self._value(operand, isFloat = isFloat)
             code.extend(mips)
             code.append(f'\tsubi {finalreg}, 0, {reg}')
             return code
 
         elif opr[0] == '*':
-            reg, mips = self._get_label(operand)
+            reg, mips = self._value(operand)
             code.extend(mips)
 
             code.append(f"\tlw {finalreg}, 0({reg})")
             return code
 
+        elif opr[0] == '&' and operand.deref:
+            # & * p is p
+            reg, mips = self._get_label(operand.pointer())
+            code.extend(mips)
+            code.append(f'\tadd {finalreg}, {reg}, $0')
+            return code
+
         elif opr[0] == '&':
             loc, _mips, type_loc = self._location(operand)
             code.extend(_mips)
             if type_loc == 1:
                 offset = loc.split('$')[0][:-1]
                 reg = loc.split('$')[1][:-1] 
+                if reg == 'fp':
+                    self.takesFrameAddress = True
                 code.append(f'\taddi {finalreg}, ${reg}, {offset}')
             else:
                 code.append(f'\tadd {finalreg}, {loc}, $0')
             return code
 
         elif opr[0] == '!':
-            reg, mips = self._get_label(operand)
+            reg, mips = self._value(operand)
             code.extend(mips)
             code.append(f'\tnor {finalreg}, {reg}, $0')
 
         elif opr[0] == '^':
-            reg, mips = self._get_label(operand)
+            reg, mips = self._value(operand)
             code.extend(mips)
             reg_helper, mips = self.regs.get_register()
             code.extend(mips)
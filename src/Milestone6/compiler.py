@@ -1,24 +1,92 @@
-from parser import buildAndCompile
-from codegen import MIPS
-import sys, os
+import parser
+from batch import compileFile, compileStage, compileBatch, stageText, stages, debugArtifacts
+from pkgcache import PackageCache
+from context import CompilationContext
+from profiling import PassTimer, memoryReport
+import importgraph, tracing
+import sys, os, json, argparse, cProfile, tracemalloc
 
-if(len(sys.argv)) != 2:
-    exit()
-path_name = sys.argv[1]
+def debugList(value):
+    debug = set(value.split(',')) - {''}
+    if 'all' in debug:
+        return set(debugArtifacts)
+    unknown = debug - set(debugArtifacts)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown debug artifact {', '.join(sorted(unknown))} (choose from {', '.join(debugArtifacts)}, all)")
+    return debug
 
-parsed_output, sym_table = buildAndCompile(path_name)
+argparser = argparse.ArgumentParser(description="Compile a Go source file to MIPS assembly")
+argparser.add_argument("path_name", nargs="+", help="Go source file; several files or a directory compile as a batch")
+argparser.add_argument("--emit", choices=stages, default="asm", help="stage to stop at and write the output of (default: %(default)s)")
+argparser.add_argument("-o", "--output", metavar="FILE", help="file to write the output to, - for stdout (default: next to the source)")
+argparser.add_argument("--debug", type=debugList, default=set(), metavar="LIST", help=f"comma separated debug artifacts to write as well: {', '.join(debugArtifacts)} or all")
+argparser.add_argument("-O", dest="opt_level", type=int, choices=(1, 2), default=1, help="optimization level: 1 allocates registers by linear scan, 2 by graph coloring with copy coalescing (default: %(default)s)")
+argparser.add_argument("--annotate-asm", action="store_true", help="comment the generated assembly with what the code generator did")
+argparser.add_argument("--trace", metavar="SPEC", default="", help=f"comma separated category[:level] compiler traces to print on stderr; categories: {', '.join(tracing.tracers)}, all; levels: {', '.join(tracing.levels)}")
+argparser.add_argument("--time-passes", nargs="?", const="-", metavar="FILE", help="write a JSON report of the time, runs and memory of every pass and the reductions of every grammar action to FILE (default: stderr)")
+argparser.add_argument("--mem-report", nargs="?", const="-", metavar="FILE", help="trace the compiler's memory with tracemalloc and write a JSON report of the AST, symbol table and 3AC footprint and the memory of every pass to FILE (default: stderr)")
+argparser.add_argument("--spill-report", nargs="?", const="-", metavar="FILE", help="write a JSON report of the temporaries, spills and reloads of the register allocation of every function to FILE (default: stderr)")
+argparser.add_argument("--profile", metavar="FILE", help="profile the compilation with cProfile and dump the stats to FILE (see python -m pstats)")
+argparser.add_argument("--token-buffer", action="store_true", help="lex each file into a compact token buffer before parsing")
+argparser.add_argument("--stream", action="store_true", help="memory-map source files and lex them a window at a time")
+argparser.add_argument("--pkg-cache", metavar="DIR", help="directory of the compiled package cache (default: ~/.cache/go-mips/packages)")
+argparser.add_argument("--no-pkg-cache", action="store_true", help="compile imported packages from source without the package cache")
+argparser.add_argument("-j", "--jobs", type=int, default=1, help="compile imported packages (or the files of a batch) on this many processes")
+args = argparser.parse_args()
+pkgCache = None if args.no_pkg_cache else PackageCache(args.pkg_cache)
+try:
+    tracing.configure(args.trace)
+except ValueError as e:
+    argparser.error(str(e))
 
-with open(f"{path_name[:-3]}_3ac.txt", 'w') as f:
-    for line in parsed_output.code:
-        f.write(line)
-        f.write("\n")
+if 'automaton' in args.debug:
+    parser.genAutomaton(parser.getParser()[0])
 
-codegen = MIPS(parsed_output.code, sym_table)
-mips = codegen.tac2mips()
+if len(args.path_name) > 1 or os.path.isdir(args.path_name[0]):
+    if args.output:
+        argparser.error("--output takes a single source file")
+    if args.time_passes or args.mem_report or args.spill_report or args.profile:
+        argparser.error("--time-passes, --mem-report, --spill-report and --profile take a single source file")
+    options = (args.token_buffer, args.stream, pkgCache, args.debug, args.annotate_asm, args.opt_level)
+    sys.exit(1 if compileBatch(args.path_name, args.jobs, options, args.emit) else 0)
 
-print(mips)
-with open(path_name[:-3]+'.s', 'w') as f:
-    for ins in mips:
-        f.write(ins)
-        f.write('\n')
+def writeReport(report, filename):
+    # JSON report to filename, - for stderr
+    if filename == '-':
+        json.dump(report, sys.stderr, indent=1)
+        print(file=sys.stderr)
+    else:
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=1)
+            print(file=f)
 
+path_name = args.path_name[0]
+if args.mem_report:
+    tracemalloc.start()
+ctx = CompilationContext(tokenBuffer=args.token_buffer, streamInput=args.stream, pkgCache=pkgCache,
+                         debug=args.debug, annotateAsm=args.annotate_asm, optLevel=args.opt_level)
+if args.time_passes or args.mem_report:
+    ctx.passTimer = PassTimer(memory=bool(args.mem_report))
+profiler = cProfile.Profile() if args.profile else None
+
+if profiler is not None:
+    profiler.enable()
+try:
+    if args.jobs > 1 and args.emit != 'tokens':
+        importgraph.precompile(ctx, path_name, args.jobs)
+    if args.output == '-':
+        sys.stdout.write(stageText(args.emit, compileStage(ctx, path_name, args.emit)))
+    else:
+        compileFile(path_name, ctx, args.emit, args.output)
+finally:
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+    if args.time_passes:
+        writeReport(dict(file=path_name, emit=args.emit, **ctx.passTimer.report()), args.time_passes)
+    if args.mem_report:
+        writeReport(dict(file=path_name, emit=args.emit, **memoryReport(ctx)), args.mem_report)
+    if args.spill_report and ctx.regallocStats is not None:
+        totals = {key: sum(stats[key] for stats in ctx.regallocStats.values())
+                  for key in ('temps', 'spilled', 'coalesced', 'spills', 'reloads')}
+        writeReport({'file': path_name, 'total': totals, 'functions': ctx.regallocStats}, args.spill_report)
@@ -0,0 +1,105 @@
+import tac
+from scope import SymTableMaker
+
+## Compilation context
+##
+## Everything a compilation changes as it goes: the symbol tables, the symbol
+## table dumps, the temporaries and the packages of the program.  Grammar
+## actions reach it through the lexer of the parse (p.lexer.context), so
+## compilations with a context each can share a process or run on threads,
+## and the names they generate don't depend on what was compiled before.
+
+_symbol = '_'
+
+def renumberTemps(code, shift, varShift):
+    # Copy of code (a list of tac.Instr) with temp_N moved to temp_{N+shift}
+    # and var_temp_N to var_temp_{N+varShift}, wherever they are ('* temp_3',
+    # 'temp_3.addr'); literals are kept as they are, whatever their text
+    def renumber(x):
+        if x.kind == tac.TEMP:
+            return tac.operand(x.text.replace(x.name, f"temp_{int(x.name[5:]) + shift}", 1))
+        if x.kind == tac.VAR_TEMP:
+            return tac.operand(x.text.replace(x.name, f"var_temp_{int(x.name[9:]) + varShift}", 1))
+        return x
+    return [tac.Instr(instr.op, renumber(instr.dest) if instr.dest is not None else None,
+                      [renumber(arg) for arg in instr.args], instr.operator, instr.type, instr.name,
+                      [renumber(value) for value in instr.values]) for instr in code]
+
+class CompileCancelled(Exception):
+    pass
+
+class CompilationContext:
+    def __init__(self, tokenBuffer=False, streamInput=False, pkgCache=None, debug=(), annotateAsm=False, optLevel=1):
+        # Lex each source file into an array-backed token buffer before
+        # parsing it instead of producing tokens on demand
+        self.tokenBuffer = tokenBuffer
+        # Memory-map source files and lex them a window at a time instead of
+        # reading them into one string
+        self.streamInput = streamInput
+        # Package cache (pkgcache.PackageCache) imports are loaded from and
+        # stored to; None compiles every imported package from source
+        self.pkgCache = pkgCache
+        # Debug artifacts to write besides the output of the compilation, see
+        # batch.debugArtifacts
+        self.debug = set(debug)
+        # Comment the generated assembly, see codegen.MIPS
+        self.annotateAsm = annotateAsm
+        # Optimization level of the code generator, see codegen.MIPS
+        self.optLevel = optLevel
+        # This compilation's copy of the shared LR parser, see parser.parse
+        self.parser = None
+        # threading.Event another thread sets to stop the compilation, which
+        # then raises CompileCancelled at the next reduction of the parse;
+        # None for compilations that can't be cancelled
+        self.cancelEvent = None
+        # profiling.PassTimer timing the passes of the compilation; None for
+        # compilations that aren't timed
+        self.passTimer = None
+        # Function -> register allocation counts of the generated code (see
+        # codegen.Register.stats); None before code generation
+        self.regallocStats = None
+
+        self.stm = SymTableMaker()
+        self.stm.add(_symbol, {'dataType': {'name': '_', 'baseType': '_', 'level': 0, 'size': 4}})
+        # Function name -> symbol table dump of the function
+        self.infoTables = {}
+        self.targetFolder = ''
+        self.currFuncId = 'global'
+        self.currTemp = 0
+        self.currVarTemp = 0
+
+        # Packages of the program: compiled units by path (see
+        # parser.compileUnit), the paths whose code is in the program, and the
+        # paths of the files being compiled, importers first
+        self.packages = {}
+        self.emittedPackages = set()
+        self.importChain = []
+        # Imports and dependencies of the units being compiled, innermost last
+        self.units = []
+
+    def checkCancelled(self):
+        if self.cancelEvent is not None and self.cancelEvent.is_set():
+            raise CompileCancelled("Compilation cancelled")
+
+    def newTemp(self):
+        temp = self.currTemp
+        self.currTemp += 1
+        return "temp_" + str(temp)
+
+    def varNewTemp(self):
+        varTemp = self.currVarTemp
+        self.currVarTemp += 1
+        return "var_temp_" + str(varTemp)
+
+    def tempCounts(self):
+        return self.currTemp, self.currVarTemp
+
+    def setTempCounts(self, temps, varTemps):
+        self.currTemp = temps
+        self.currVarTemp = varTemps
+
+    def skipTemps(self, temps, varTemps):
+        # Account for the temporaries of code generated apart from the program
+        # (compiled units of imported packages)
+        self.currTemp += temps
+        self.currVarTemp += varTemps
@@ -0,0 +1,115 @@
+import os, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import parser
+from context import CompilationContext
+from utils import getPath, importCycleError
+
+## Import graph scheduler
+##
+## Reads the import declarations of the files of a program with the lexer
+## only, then compiles every imported package once, in dependency order, on a
+## pool of processes: a package is compiled as soon as the ones it imports
+## are.  The compiled units go to the packages of the compilation context,
+## where the parse of the program picks them up (see parser.importPackage).
+
+def scanImports(path):
+    # (import path, is dot import, lineno) of the import declarations of the
+    # Go source at path
+    _, lexer = parser.getParser()
+    lexer = lexer.clone()
+    lexer.lineno = 1
+    with open(path, 'r') as f:
+        lexer.input(f.read())
+
+    imports = []
+    inImport = grouped = dot = False
+    for tok in iter(lexer.token, None):
+        if tok.type == 'IMPORT':
+            inImport = True
+        elif not inImport:
+            # Imports end with the first top level declaration
+            if tok.type not in ('PACKAGE', 'IDENT', 'SEMICOLON'):
+                break
+        elif tok.type == 'LPAREN':
+            grouped = True
+        elif tok.type == 'RPAREN':
+            inImport = grouped = False
+        elif tok.type == 'PERIOD':
+            dot = True
+        elif tok.type == 'STRING':
+            imports.append((tok.value[1:-1], dot, tok.lineno))
+            inImport = grouped
+            dot = False
+    return imports
+
+def importGraph(mainPath):
+    # {path: [(imported path, is dot import)]} of the files reachable from
+    # mainPath, and their paths ordered so that every file comes after the
+    # ones it imports
+    graph = {}
+    order = []
+    chain = []
+
+    def visit(path):
+        chain.append(path)
+        graph[path] = []
+        folder = os.path.dirname(path)
+        for name, dot, lineno in scanImports(path):
+            dep = os.path.realpath(getPath(name + '.go', folder))
+            if dep in chain:
+                raise importCycleError(chain[chain.index(dep):] + [dep], lineno)
+            graph[path].append((dep, dot))
+            if dep not in graph:
+                visit(dep)
+        chain.pop()
+        order.append(path)
+
+    visit(os.path.realpath(mainPath))
+    return graph, order
+
+def compileWorker(path, deps, options):
+    # Runs in a pool process: compile the package at path given the units of
+    # the packages it imports
+    ctx = CompilationContext(*options)
+    ctx.packages.update(deps)
+    return parser.compileUnit(ctx, path)
+
+def precompile(ctx, mainPath, jobs):
+    graph, order = importGraph(mainPath)
+
+    # Dot imports are compiled into their importer, so a unit waits for the
+    # packages its dot imports import
+    def unitDeps(path):
+        deps = set()
+        for dep, dot in graph[path]:
+            deps |= unitDeps(dep) if dot else {dep}
+        return deps
+
+    units = {dep for path in graph for dep, dot in graph[path] if not dot}
+    waiting = {}
+    for path in order:
+        if path not in units or path in ctx.packages:
+            continue
+        entry = parser.loadUnit(ctx, path)
+        if entry is not None:
+            ctx.packages[path] = entry
+        else:
+            waiting[path] = unitDeps(path)
+
+    if not waiting:
+        return
+    options = (ctx.tokenBuffer, ctx.streamInput, ctx.pkgCache)
+    # Forked workers start with the parser tables loaded
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(min(jobs, len(waiting)), mp_context=context) as pool:
+        running = {}
+        while waiting or running:
+            for path in [path for path, deps in waiting.items() if all(dep in ctx.packages for dep in deps)]:
+                deps = {dep: ctx.packages[dep] for dep in waiting.pop(path)}
+                running[pool.submit(compileWorker, path, deps, options)] = path
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = running.pop(future)
+                entry = future.result()
+                parser.linkUnit(ctx, entry)
+                ctx.packages[path] = entry
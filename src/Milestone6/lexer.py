@@ -51,6 +51,10 @@ tokens = [
 ## Simple regex statements
 
 t_ignore  = ' \t\n'
+
+## Openers and closers of the only tokens that can span several lines
+## (general comments and raw strings), used when lexing a streamed input
+multiline_delimiters = {'/*': '*/', '`': '`'}
 t_ADD = r'\+'
 t_SUB = r'-'
 t_MUL = r'\*'
@@ -129,6 +133,15 @@ float_lit = d_float + r"|" + h_float
 #change rune and decide order
 t_RUNE = r'\'([^\n\'\\]|\\([abfnrtv\'\"]|[0-7]{3}|x[0-9a-f]{2}|u([0-9a-cA-CefEF][0-9a-fA-F]|[dD][0-7])[0-9a-fA-F]{2}|U00(0[0-9a-fA-F]|10)[0-9a-fA-F]{4}))\''
 
+## Function rules are tried in the order they are defined. Identifiers and
+## keywords are by far the most common tokens, so they are matched first;
+## none of the other rules can start with a letter or an underscore.
+def t_IDENT(t):
+    r'([A-Za-z_]|[^\x00-\x7F])([A-Za-z_0-9]|[^\x00-\x7F])*'
+    t.type = reserved.get(t.value, 'IDENT')
+    t.value = sys.intern(t.value)
+    return t
+
 #need to print comments as tokens?
 def t_COMMENT(t):
     r'(//.*)|(/\*(.|\n)*?\*/)'
@@ -139,12 +152,6 @@ def t_STRING(t):
     t.lexer.lineno += t.value.count('\n')
     return t
 
-def t_IDENT(t):
-    r'([A-Za-z_]|[^\x00-\x7F])([A-Za-z_0-9]|[^\x00-\x7F])*'
-    if t.value in list(reserved.keys()):
-        t.type = reserved[t.value]
-    return t
-
 int_lit = r"0(x|X)[0-9a-fA-F]((_?)[0-9a-fA-F]+)*|0(o|O)[0-7]((_?)[0-7]+)*|0(b|B)[0-1]((_?)[0|1]+)*|[1-9]((_?)[0-9]+)*|[0-7]((_?)[0-7]+)*"
 imaginary = r"(" + d_digits + r"|" + int_lit + r"|" + float_lit + r")i"
 
@@ -161,7 +168,7 @@ def t_INT(t):
     return t
 
 def t_error(t):
-    print("Not valid token: '%s'" % t.value[0])
+    print("Not valid token: '%s'" % t.value[0], file=sys.stderr)
     t.lexer.skip(1)
 
 #test
@@ -1,6 +1,5 @@
 from multiprocessing import Condition
 from typing import List
-from copy import deepcopy
 import ply.yacc as yacc
 import ply.lex as lex
 import lexer
@@ -9,7 +8,13 @@ import sys
 import pprint
 from scope import *
 from utils import *
-import os, csv
+import tac
+import pkgcache
+from tracing import parserTrace, driverTrace
+from profiling import passTiming
+from context import CompilationContext, renumberTemps, _symbol
+import os, csv, threading
+from copy import copy
 
 tokens=lexer.tokens
 tokens.remove('COMMENT')
@@ -43,24 +48,13 @@ ignored_tokens = [';', '{', '}', '(', ')', '[', ']', ',']
 ####################                                        ######################
 ##################################################################################
 
-info_tables = {}
-stm = SymTableMaker()
-target_folder = ''
-curr_func_id = 'global'
-
-_symbol = '_'
-stm.add(_symbol, {'dataType': {'name': '_', 'baseType': '_', 'level': 0, 'size': 4}})
+## The state of a compilation is kept in a CompilationContext (context.py),
+## grammar actions get it as p.lexer.context
 
 def p_SourceFile(p):
     """
     SourceFile : PackageClause SEMICOLON ImportDeclMult TopLevelDeclMult
     """
-    # Check if any label has expecting key set
-    for label in stm.labels:
-        if stm.labels[label]['expecting'] == True:
-            assert(len(stm.labels[label]['prevGotos']) > 0)
-            goto = stm.labels[label]['prevGotos'][0]
-            raise LogicalError(f"{goto[1]}: Goto declared without declaring any label {label}.")
     p[4].addChild(p[3][1]) 
     # p[4].code = ["// Source Code Top Level Declaration"] + p[4].code
     p[0] = FileNode(p[1], p[3][0], p[4])
@@ -74,7 +68,7 @@ def p_PackageClause(p):
     PackageClause : PACKAGE IDENT
     """
     p[0] = LitNode(dataType = 'string', label = f'"{p[2]}"')
-    p[0].code.append(f"package {p[2]}")
+    p[0].code.append(tac.package(p[2]))
 
 ###################################################################################
 ### Import related grammar
@@ -120,39 +114,136 @@ def p_ImportSpec(p):
               | IDENT ImportPath
               | ImportPath 
     """
+    ctx = p.lexer.context
 
-    global stm, target_folder
     if p[1] != '.':
         alias = IdentNode(0, p[1][1:-1])
     else:
         alias = IdentNode(0, p[2][1:-1])
     if len(p) == 2:
-        pathname = getPath(p[1][1:-1]+'.go', target_folder)
+        pathname = getPath(p[1][1:-1]+'.go', ctx.targetFolder)
         path = LitNode(dataType = "string", label = p[1])
     else:
-        pathname = getPath(p[2][1:-1]+'.go', target_folder)
+        pathname = getPath(p[2][1:-1]+'.go', ctx.targetFolder)
         path = LitNode(dataType = "string", label = p[2])
 
-    if alias.label in stm.pkgs:
-        raise NameError(f"{p.lexer.lineno}: Cyclic import not supported")
+    if alias.label in ctx.stm.pkgs:
+        raise NameError(f"{p.lexer.lineno}: Package {alias.label} imported more than once")
     
-    tmp_target_folder = target_folder
+    tmp_target_folder = ctx.targetFolder
+    key = os.path.realpath(pathname)
     if p[1] != '.':
-        temp_stm = stm
-        stm = SymTableMaker()
-        stm.add(_symbol, {'dataType': {'name': '_', 'baseType': '_', 'level': 0, 'size': 0}})
-        astNode, _ = buildAndCompile(pathname)
-        temp_stm.pkgs[alias.label] = stm
-        stm = temp_stm
+        entry = importPackage(ctx, key, p.lexer.lineno)
+        ctx.stm.addPackage(alias.label, entry['stm'])
+        astNode = Node("FILE")
+        if ctx.units:
+            ctx.units[-1]['imports'].append((alias.label, key))
+        else:
+            # Compiling the program itself, the package's code goes here
+            astNode.code = emitPackage(ctx, key)
         ipnode = ImportPathNode(alias, path, astNode)
-        ipnode.code.append(f"import {p[len(p)-1]}")
+        ipnode.code.append(tac.importPath(p[len(p)-1]))
         p[0] = (NodeList([ipnode]), NodeList([]))
     else:
-        astNode, _ = buildAndCompile(pathname)
-        stm.pkgs[alias.label] = None
+        # Compiled into the scope of the importing file
+        if key in ctx.importChain:
+            raise importCycleError(ctx.importChain[ctx.importChain.index(key):] + [key], p.lexer.lineno)
+        if ctx.units:
+            ctx.units[-1]['deps'].append(key)
+        ctx.importChain.append(key)
+        astNode = compilePackage(ctx, pathname)
+        ctx.importChain.pop()
+        ctx.stm.addPackage(alias.label, None)
         p[0] = (NodeList(astNode.children[1].children), NodeList(astNode.children[2].children))
     
-    target_folder = tmp_target_folder
+    ctx.targetFolder = tmp_target_folder
+
+def importPackage(ctx, key, lineno=0):
+    # Compiled unit of the package at path key.  A package is compiled once
+    # per program however many files import it
+    if key in ctx.importChain:
+        raise importCycleError(ctx.importChain[ctx.importChain.index(key):] + [key], lineno)
+    if key not in ctx.packages:
+        ctx.packages[key] = compileUnit(ctx, key)
+    if ctx.units:
+        ctx.units[-1]['deps'].append(key)
+    return ctx.packages[key]
+
+def compileUnit(ctx, pathname):
+    # Compile the package at pathname in a symbol table of its own, as a unit
+    # that can go anywhere in a program: the code of the packages it imports
+    # is left out (emitPackage adds it) and its temporaries are numbered from
+    # zero.  Loaded from the package cache when possible
+    entry = loadUnit(ctx, pathname)
+    if entry is not None:
+        return entry
+
+    temp_stm, temp_tables, temps = ctx.stm, ctx.infoTables, ctx.tempCounts()
+    ctx.stm = SymTableMaker()
+    ctx.stm.add(_symbol, {'dataType': {'name': '_', 'baseType': '_', 'level': 0, 'size': 0}})
+    ctx.infoTables = {}
+    ctx.setTempCounts(0, 0)
+    ctx.importChain.append(pathname)
+    ctx.units.append({'imports': [], 'deps': []})
+    astNode = compilePackage(ctx, pathname)
+    unit = ctx.units.pop()
+    ctx.importChain.pop()
+
+    # Packages imported directly or not, for invalidating cache entries
+    deps = []
+    for dep in unit['deps']:
+        deps.append(dep)
+        if dep in ctx.packages:
+            deps.extend(path for path, _ in ctx.packages[dep]['deps'])
+    entry = {
+        'imports': unit['imports'],
+        'deps': [(dep, pkgcache.sourceHash(dep) if ctx.pkgCache is not None else None) for dep in dict.fromkeys(deps)],
+        'stm': ctx.stm,
+        'code': astNode.code.flatten() if astNode is not None else [],
+        # Symbol table dumps of the package's functions
+        'infoTables': ctx.infoTables,
+        'temps': ctx.tempCounts()
+    }
+    ctx.stm, ctx.infoTables = temp_stm, temp_tables
+    ctx.setTempCounts(*temps)
+    if ctx.pkgCache is not None and astNode is not None:
+        ctx.pkgCache.store(pathname, entry)
+    return entry
+
+def loadUnit(ctx, pathname):
+    # Compiled unit of the package at pathname from the package cache, or None
+    if ctx.pkgCache is None:
+        return None
+    entry = ctx.pkgCache.load(pathname)
+    if entry is not None:
+        linkUnit(ctx, entry)
+    return entry
+
+def linkUnit(ctx, entry):
+    # Share the symbol tables of the packages a unit imports with the rest of
+    # the program instead of the copies it was stored (or sent) with
+    for alias, dep in entry['imports']:
+        entry['stm'].pkgs[alias] = importPackage(ctx, dep)['stm']
+
+def emitPackage(ctx, key):
+    # Code of the package at key, preceded by that of the packages it
+    # imports which are not in the program yet.  Empty if the program has the
+    # package already
+    code = Code()
+    if key in ctx.emittedPackages:
+        return code
+    ctx.emittedPackages.add(key)
+    entry = ctx.packages[key]
+    for alias, dep in entry['imports']:
+        code.extend(emitPackage(ctx, dep))
+    ctx.infoTables.update(entry['infoTables'])
+    instrs = entry['code']
+    temps = ctx.tempCounts()
+    if temps != (0, 0):
+        instrs = renumberTemps(instrs, *temps)
+    ctx.skipTemps(*entry['temps'])
+    code.extend(Code(instrs))
+    return code
 
 def p_ImportPath(p):
     """
@@ -177,7 +268,9 @@ def p_TopLevelDeclMult(p):
         # else:
             
 
-        p[0].addChild(*p[3].children)
+        # p[3].code is its children's code; share it instead of re-adding each
+        p[0].children.extend(p[3].children)
+        p[0].code.extend(p[3].code)
 
     if len(p)==1:
         p[0] = DeclNode()
@@ -233,6 +326,7 @@ def p_ConstSpec(p):
               | IdentifierList IDENT ASSIGN ExpressionList
               | IdentifierList ASSIGN ExpressionList
     """
+    ctx = p.lexer.context
     p[0] = NodeList([])
     length = len(p)-1
 
@@ -247,7 +341,7 @@ def p_ConstSpec(p):
                 dt_return = p[length][i].dataType
             else:
                 func_name = p[length][i].children[0].label
-                dt_return = stm.functions[func_name]["return"]
+                dt_return = ctx.stm.functions[func_name]["return"]
             expression_datatypes.extend(dt_return)
             if len(dt_return) == 0:
                 raise TypeError(f"{p.lexer.lineno}: Function does not return anything!")
@@ -268,12 +362,12 @@ def p_ConstSpec(p):
 
     if len(p) > 4:
         if isinstance(p[2], str):
-            p[2] = stm.findType(p[2])
+            p[2] = ctx.stm.findType(p[2])
     
         dt = p[2].dataType
 
         for i, expression in enumerate(expression_datatypes):
-            if not isTypeCastable(stm, dt, expression):
+            if not isTypeCastable(ctx.stm, dt, expression):
                 raise TypeError(f"{p.lexer.lineno}: Mismatch of type for identifier: " + p[1][i].label)
 
     if count_1 > 0:
@@ -309,8 +403,8 @@ def p_ConstSpec(p):
     for i, ident in enumerate(p[1]):
 
         # Check redeclaration for identifier list
-        latest_scope = stm.getScope(ident.label)
-        if latest_scope == stm.id or ident.label in stm.functions:
+        latest_scope = ctx.stm.getScope(ident.label)
+        if latest_scope == ctx.stm.id or ident.label in ctx.stm.functions:
             raise NameError(f'{p.lexer.lineno}: Redeclaration of identifier: ' + ident)
         
         if len(p) > 4:
@@ -321,9 +415,9 @@ def p_ConstSpec(p):
                 dt = p[2].dataType
 
             if not_base_type:
-                present = checkTypePresence(stm, dt) 
+                present = checkTypePresence(ctx.stm, dt) 
             else:
-                present = stm.findType(stm, dt)
+                present = ctx.stm.findType(ctx.stm, dt)
 
             if present == -1:
                 raise TypeError(f'{p.lexer.lineno}: Type not declared/found: ' + dt)
@@ -336,7 +430,7 @@ def p_ConstSpec(p):
                 elif dt['name'].startswith('float'):
                     val = float(extended_list[i].val)
                 ## Write conditions for rune and other types
-                stm.add(ident.label, {'dataType': dt, 'isConst' : True, 'val': val})
+                ctx.stm.add(ident.label, {'dataType': dt, 'isConst' : True, 'val': val})
                 p[1][i].dataType = dt
         else:
             val = extended_list[i].label
@@ -347,7 +441,7 @@ def p_ConstSpec(p):
             elif dt['name'].startswith('float'):    
                 val = float(extended_list[i].label)
             ## Write conditions for rune and other types
-            stm.add(ident.label, {'dataType': dt, 'isConst' : True, 'val': val})
+            ctx.stm.add(ident.label, {'dataType': dt, 'isConst' : True, 'val': val})
             p[1][i].dataType = dt
  
     # for expr in p[length]:
@@ -355,13 +449,13 @@ def p_ConstSpec(p):
 
     if count_1 == 0:
         for i in range(len(p[1])):
-            p[0].code.append(f"{stm.id}_{p[1][i].label} = {p[length][i].place}")
-            stm.symTable[stm.id].updateAttr(p[1][i].label, {'tmp': f"{stm.id}_{p[1][i].label}"})
+            p[0].code.append(tac.assign(f"{ctx.stm.id}_{p[1][i].label}", p[length][i].place))
+            ctx.stm.symTable[ctx.stm.id].updateAttr(p[1][i].label, {'tmp': f"{ctx.stm.id}_{p[1][i].label}"})
 
     else:
         for i in range(len(p[1])):
-            p[0].code.append(f"{stm.id}_{p[1][i].label} = {p[length][0].place[i]}")
-            stm.symTable[stm.id].updateAttr(p[1][i].label, {'tmp': f"{stm.id}_{p[1][i].label}"})
+            p[0].code.append(tac.assign(f"{ctx.stm.id}_{p[1][i].label}", p[length][0].place[i]))
+            ctx.stm.symTable[ctx.stm.id].updateAttr(p[1][i].label, {'tmp': f"{ctx.stm.id}_{p[1][i].label}"})
 
 
 ###################################################################################
@@ -398,6 +492,7 @@ def p_VarSpec(p):
             | IdentifierList Type
             | IdentifierList IDENT
     """
+    ctx = p.lexer.context
     p[0] = NodeList([])
     length = len(p)-1
     if len(p) >= 4:
@@ -412,7 +507,7 @@ def p_VarSpec(p):
                     dt_return = p[length][i].dataType
                 else:
                     func_name = p[length][i].children[0].label
-                    dt_return = stm.functions[func_name]["return"]
+                    dt_return = ctx.stm.functions[func_name]["return"]
                 expression_datatypes.extend(dt_return)
                 if len(dt_return) == 0:
                     raise TypeError(f"{p.lexer.lineno}: Function does not return anything!")
@@ -432,7 +527,7 @@ def p_VarSpec(p):
 
         if len(p) > 4:
             if isinstance(p[2], str):
-                p[2] = stm.findType(p[2])
+                p[2] = ctx.stm.findType(p[2])
 
             if isinstance(p[2], str):
                 dt = {'baseType' : p[2], 'name': p[2], 'level': 0, 'size': 12}
@@ -440,7 +535,7 @@ def p_VarSpec(p):
             else:
                 dt = p[2].dataType
             for i, expression in enumerate(expression_datatypes):
-                if not isTypeCastable(stm, dt, expression):
+                if not isTypeCastable(ctx.stm, dt, expression):
                     raise TypeError(f"{p.lexer.lineno}: Mismatch of type for identifier: " + p[1][i].label)
 
         if count_1 > 0:
@@ -471,8 +566,8 @@ def p_VarSpec(p):
         for i, ident in enumerate(p[1]):
 
             # Check redeclaration for identifier list
-            latest_scope = stm.getScope(ident.label)
-            if latest_scope == stm.id or ident.label in stm.functions:
+            latest_scope = ctx.stm.getScope(ident.label)
+            if latest_scope == ctx.stm.id or ident.label in ctx.stm.functions:
                 raise NameError(f'{p.lexer.lineno}: Redeclaration of identifier: ' + ident.label)
             
             if len(p) > 4:
@@ -483,34 +578,34 @@ def p_VarSpec(p):
                     dt = p[2].dataType
 
                 if not_base_type:
-                    present = checkTypePresence(stm, dt) 
+                    present = checkTypePresence(ctx.stm, dt) 
                 else:
-                    present = stm.findType(stm, dt)
+                    present = ctx.stm.findType(ctx.stm, dt)
 
                 if present == -1:
                     raise TypeError(f'{p.lexer.lineno}: Type not declared/found: ' + dt['name'])
                 else:
                     # Add to symbol table
 
-                    stm.add(ident.label, {'dataType': dt, 'isConst' : False})
+                    ctx.stm.add(ident.label, {'dataType': dt, 'isConst' : False})
                     p[1][i].dataType = dt    
             else:
                 dt = extended_list[i].dataType
                 # Add to symbol table
-                stm.add(ident.label, {'dataType': dt, 'isConst' : False})
+                ctx.stm.add(ident.label, {'dataType': dt, 'isConst' : False})
                 p[1][i].dataType = dt
 
         # for expr in p[length]:
         #     p[0].code.extend(expr.code)
         if count_1 == 0:
             for i in range(len(p[1])):
-                p[0].code.append(f"{stm.id}_{p[1][i].label} = {p[length][i].place}")
-                stm.symTable[stm.id].updateAttr(p[1][i].label, {'tmp': f"{stm.id}_{p[1][i].label}"})
+                p[0].code.append(tac.assign(f"{ctx.stm.id}_{p[1][i].label}", p[length][i].place))
+                ctx.stm.symTable[ctx.stm.id].updateAttr(p[1][i].label, {'tmp': f"{ctx.stm.id}_{p[1][i].label}"})
 
         else:
             for i in range(len(p[1])):
-                p[0].code.append(f"{stm.id}_{p[1][i].label} = {p[length][0].place[i]}")
-                stm.symTable[stm.id].updateAttr(p[1][i].label, {'tmp': f"{stm.id}_{p[1][i].label}"})
+                p[0].code.append(tac.assign(f"{ctx.stm.id}_{p[1][i].label}", p[length][0].place[i]))
+                ctx.stm.symTable[ctx.stm.id].updateAttr(p[1][i].label, {'tmp': f"{ctx.stm.id}_{p[1][i].label}"})
     else:
         not_base_type = False
 
@@ -520,8 +615,8 @@ def p_VarSpec(p):
         for i, ident in enumerate(p[1]):
 
             # Check redeclaration for identifier list
-            latest_scope = stm.getScope(ident.label)
-            if latest_scope == stm.id or ident.label in stm.functions:
+            latest_scope = ctx.stm.getScope(ident.label)
+            if latest_scope == ctx.stm.id or ident.label in ctx.stm.functions:
                 raise NameError(f'{p.lexer.lineno}: Redeclaration of identifier: ' + ident)
 
             if not not_base_type:
@@ -531,19 +626,19 @@ def p_VarSpec(p):
                 dt = p[2].dataType
 
             if not_base_type:
-                present = checkTypePresence(stm, dt) 
+                present = checkTypePresence(ctx.stm, dt) 
             else:
-                present = stm.findType(dt)
+                present = ctx.stm.findType(dt)
 
             if present == -1:
                 raise TypeError(f'{p.lexer.lineno}: Type not declared/found: ' + dt)
             else:
                 # Add to symbol table
-                stm.add(ident.label, {'dataType': dt, 'isConst' : False})
+                ctx.stm.add(ident.label, {'dataType': dt, 'isConst' : False})
                 p[1][i].dataType = dt
 
         for i in range(len(p[1])):
-            stm.symTable[stm.id].updateAttr(p[1][i].label, {'tmp': f"{stm.id}_{p[1][i].label}"})
+            ctx.stm.symTable[ctx.stm.id].updateAttr(p[1][i].label, {'tmp': f"{ctx.stm.id}_{p[1][i].label}"})
 
 ###################################################################################
 ### Type Declarations
@@ -573,6 +668,7 @@ def p_AliasDecl(p):
     AliasDecl : IDENT ASSIGN Type
                 | IDENT ASSIGN IDENT
     """ 
+    ctx = p.lexer.context
     
     dt = {}
     if isinstance(p[3], str):
@@ -582,20 +678,20 @@ def p_AliasDecl(p):
     else:
         dt = p[3].dataType
 
-    if checkTypePresence(stm, dt) == -1:
+    if checkTypePresence(ctx.stm, dt) == -1:
         raise TypeError(f"{p.lexer.lineno}: baseType " + dt + " not declared yet")
 
-    if p[1] in stm.symTable[stm.id].typeDefs:
+    if p[1] in ctx.stm.symTable[ctx.stm.id].typeDefs:
         raise TypeError(f"{p.lexer.lineno}: Redeclaration of Alias " + p[1])
         
-    elif isinstance(p[3], str) and p[3] in stm.symTable[stm.id].avlTypes:
-        stm.symTable[stm.id].typeDefs[p[1]] = p[3]
+    elif isinstance(p[3], str) and p[3] in ctx.stm.symTable[ctx.stm.id].avlTypes:
+        ctx.stm.addType(p[1], p[3])
     
     elif isinstance(p[3], str):
-        stm.symTable[stm.id].typeDefs[p[1]] = stm.symTable[stm.id].typeDefs[p[3]]
+        ctx.stm.addType(p[1], ctx.stm.symTable[ctx.stm.id].typeDefs[p[3]])
 
     else:
-        stm.symTable[stm.id].typeDefs[p[1]] = dt
+        ctx.stm.addType(p[1], dt)
 
 def p_TypeDef(p):
     """
@@ -603,25 +699,26 @@ def p_TypeDef(p):
               | IDENT IDENT
 
     """
+    ctx = p.lexer.context
     if isinstance(p[2], str):
-        p[2] = stm.findType(p[2])
+        p[2] = ctx.stm.findType(p[2])
     dt = p[2].dataType
 
-    if checkTypePresence(stm, dt) == -1:
+    if checkTypePresence(ctx.stm, dt) == -1:
         raise TypeError(f"{p.lexer.lineno}: baseType " + dt + " not declared yet")
 
-    if p[1] in stm.symTable[stm.id].typeDefs:
+    if p[1] in ctx.stm.symTable[ctx.stm.id].typeDefs:
         raise TypeError(f"{p.lexer.lineno}: Redeclaration of type " + p[1])
         
-    elif isinstance(p[2], str) and p[2] in stm.symTable[stm.id].avlTypes:
-        stm.symTable[stm.id].typeDefs[p[1]] = {'baseType': p[2], 'name': p[2], 'level' : 0, 'size': basicTypeSizes[p[2]]}
+    elif isinstance(p[2], str) and p[2] in ctx.stm.symTable[ctx.stm.id].avlTypes:
+        ctx.stm.addType(p[1], {'baseType': p[2], 'name': p[2], 'level' : 0, 'size': basicTypeSizes[p[2]]})
     
     elif isinstance(p[2], str):
-        stm.symTable[stm.id].typeDefs[p[1]] = stm.symTable[stm.id].typeDefs[p[2]]
+        ctx.stm.addType(p[1], ctx.stm.symTable[ctx.stm.id].typeDefs[p[2]])
 
     else:
-        p[2].dataType['baseType'] = p[1]
-        stm.symTable[stm.id].typeDefs[p[1]] = p[2]
+        p[2].dataType = updateType(p[2].dataType, baseType=p[1])
+        ctx.stm.addType(p[1], p[2])
 
 ###################################################################################
 ### Identifier List
@@ -632,7 +729,8 @@ def p_IdentifierList(p):
     IdentifierList : IDENT
                    | IDENT COMMA IdentifierList
     """
-    p[0] = NodeList([IdentNode(label = p[1], scope = stm.id)])
+    ctx = p.lexer.context
+    p[0] = NodeList([IdentNode(label = p[1], scope = ctx.stm.id)])
 
     if len(p) > 2:
         p[0].extend(p[3])
@@ -649,14 +747,16 @@ def p_ExpressionList(p):
     ExpressionList : Expr
                    | ExpressionList COMMA Expr
     """
+    ctx = p.lexer.context
     if len(p) == 2 and not isinstance(p[1], NodeList):
         p[0] = NodeList([])
         p[0].append(p[1])
     elif len(p) == 2:
         p[0] = NodeList([])
-        print(p[1].__dict__) 
+        if parserTrace.debug:
+            parserTrace.log('debug', "Expression list %s", p[1].__dict__)
         for ident in p[1]:      
-            stm_entry = stm.get(ident.label)
+            stm_entry = ctx.stm.get(ident.label)
             dt = stm_entry['dataType']
             curr_node = ExprNode(dataType=dt, label = ident.label, isAddressable=True, isConst=stm_entry.get('isConst', False), val=stm_entry.get('val', None))
             if stm_entry.get('isArg', None):
@@ -691,6 +791,7 @@ def p_Expr(p):
          | Expr AND Expr
          | Expr AND_NOT Expr
     """
+    ctx = p.lexer.context
     if len(p) == 2:
         p[0] = p[1]
     else:
@@ -701,10 +802,10 @@ def p_Expr(p):
         if hasattr(p[3], 'label') and  isinstance(p[3].label, List):
             firstChar = p[3].label[0]
 
-        if not checkBinOp(stm, dt1, dt2, p[2], firstChar):
+        if not checkBinOp(ctx.stm, dt1, dt2, p[2], firstChar):
             raise TypeError(f"{p.lexer.lineno}: Incompatible operand types")
 
-        dt = getFinalType(stm, dt1, dt2, p[2])
+        dt = getFinalType(ctx.stm, dt1, dt2, p[2])
 
         isConst = False
         val = None
@@ -715,12 +816,12 @@ def p_Expr(p):
         p[0] = ExprNode(operator = p[2], dataType = dt, isConst = isConst, val=val, label = val)
         p[0].addChild(p[1], p[3])
         if((p[1].place)[0] == '*' and (p[3].place)[0] == '*') :
-            point = new_temp()
-            p[0].code.append(f"{point} = {p[1].place}")
+            point = ctx.newTemp()
+            p[0].code.append(tac.assign(point, p[1].place))
             p[1].place = point
-        temp_var = new_temp()
+        temp_var = ctx.newTemp()
 
-        p[0].code.append(f"{temp_var} = {p[1].place} {p[2]}({dt['name']}) {p[3].place}")
+        p[0].code.append(tac.binOp(temp_var, p[1].place, p[2], p[3].place, dt['name']))
         p[0].place = temp_var
 
 
@@ -734,13 +835,14 @@ def p_UnaryExpr(p):
             | MUL UnaryExpr
             | AND UnaryExpr
     """
+    ctx = p.lexer.context
     if len(p) == 2:
         p[0] = p[1]
     else:
         flag = False
         if not isinstance(p[2], str) and hasattr(p[2], 'isAddressable'):
             flag = p[2].isAddressable 
-        if not checkUnOp(stm, p[2].dataType, p[1], flag):
+        if not checkUnOp(ctx.stm, p[2].dataType, p[1], flag):
             raise TypeError(f"{p.lexer.lineno}: Incompatible operand for Unary Expression")
         val = None
         isConst = p[2].isConst
@@ -755,18 +857,18 @@ def p_UnaryExpr(p):
         if p[1] == '&' and p[2].isRef == True:
             raise LogicalError(f"{p.lexer.lineno}: Can't reference a variable more than once.")
         isAddressable = flag and (p[1] == '*')
-        p[0] = ExprNode(dataType = getUnaryType(stm, p[2].dataType, p[1]), operator=p[1], isAddressable = isAddressable, isConst=isConst, val=val)
+        p[0] = ExprNode(dataType = getUnaryType(ctx.stm, p[2].dataType, p[1]), operator=p[1], isAddressable = isAddressable, isConst=isConst, val=val)
         p[0].addChild(p[2])
-        temp_var = new_temp()
+        temp_var = ctx.newTemp()
         if p[1] == '*':
             p[0].isDeRef = True
             p[0].lvalue = p[2].place
         elif p[1] == '&':
             p[0].isRef = True
         if p[1] == '-':
-            p[0].code.append(f"{temp_var} = {p[1]}({p[2].dataType['name']}) {p[2].place}")
+            p[0].code.append(tac.unOp(temp_var, p[1], p[2].place, p[2].dataType['name']))
         else:
-            p[0].code.append(f"{temp_var} = {p[1]} {p[2].place}")
+            p[0].code.append(tac.unOp(temp_var, p[1], p[2].place))
         p[0].place = temp_var
 
 ###################################################################################
@@ -784,6 +886,7 @@ def p_PrimaryExpr(p):
                 | PrimaryExpr Slice
                 | PrimaryExpr Arguments
     """
+    ctx = p.lexer.context
     
     ## PrimaryExpr -> Lit
     if len(p) == 2 and (isinstance(p[1], LitNode) or isinstance(p[1], CompositeLitNode)):
@@ -804,41 +907,43 @@ def p_PrimaryExpr(p):
         if p[1] in builtinFunctions:
             p[0] = ExprNode(label=p[1], dataType={})
             return
-        identType = getBaseType(stm, p[1])
+        identType = getBaseType(ctx.stm, p[1])
         place = None
             
-        if p[1] in stm.pkgs and stm.pkgs[p[1]] != None:
+        if p[1] in ctx.stm.pkgs and ctx.stm.pkgs[p[1]] != None:
             p[0] = IdentNode(0, p[1], dataType={'name': 'package'})
             # The name of package doesn't have any place value
             p[0].place = None
             return
 
         ## TODO : What is the need for this?        
-        if p[1] in stm.symTable[0].typeDefs:
+        if p[1] in ctx.stm.symTable[0].typeDefs:
             # Type Declaration Found
             # Assuming Constructor Initialisation
-            dt = stm.symTable[0].typeDefs[p[1]]
+            dt = ctx.stm.symTable[0].typeDefs[p[1]]
             p[0] = ExprNode(dataType=dt, label=p[1], isAddressable=False, isConst=False, val=None)
             # Types need not have place values; they only has role in semantics
             # may consider writing type conversion functions if supporting type conversion. 
-            # p[0].place = stm.get(p[1]).get('tmp', None)
+            # p[0].place = ctx.stm.get(p[1]).get('tmp', None)
             p[0].place = None
             return
 
         # If typecast function
-        print(p[1])
-        if p[1] in utils.basicTypes and isBasicNumeric(stm, {'baseType': p[1], 'level': 0}):
+        if parserTrace.debug:
+            parserTrace.log('debug', "Operand %s", p[1])
+        if p[1] in utils.basicTypes and isBasicNumeric(ctx.stm, {'baseType': p[1], 'level': 0}):
             p[0] = ExprNode(dataType = {'baseType': 'typeCastFunc'}, label = p[1], isAddressable = True, isConst = False)
             pass
 
         # Check declaration
-        latest_scope = ((stm.getScope(p[1]) != -1) or (p[1] in stm.functions)) 
+        latest_scope = ((ctx.stm.getScope(p[1]) != -1) or (p[1] in ctx.stm.functions)) 
 
         if latest_scope == 0:
             ## To be checked for global declarations (TODO)
-            print("Expecting global declaration for ",p[1])
+            if parserTrace.info:
+                parserTrace.log('info', "Expecting global declaration for %s", p[1])
 
-        stm_entry = stm.get(p[1])
+        stm_entry = ctx.stm.get(p[1])
         dt = stm_entry['dataType']
         p[0] = ExprNode(dataType=dt, label = p[1], isAddressable=True, isConst=stm_entry.get('isConst', False), val=stm_entry.get('val', None))
         if stm_entry.get('isArg', None):
@@ -857,7 +962,7 @@ def p_PrimaryExpr(p):
         ## PrimaryExpr -> PrimaryExpr Selector
         if isinstance(p[2], DotNode):
             if isinstance(p[1], IdentNode) and 'name' in p[1].dataType and p[1].dataType['name'] == 'package':
-                pkg_stm = stm.pkgs[p[1].label]
+                pkg_stm = ctx.stm.pkgs[p[1].label]
                 stm_entry = pkg_stm.get(p[2].children[0])
                 if stm_entry is None:
                     raise NameError(f"{p.lexer.lineno}: No such variable or function in package {p[1].label}")
@@ -882,8 +987,8 @@ def p_PrimaryExpr(p):
             p[2].addChild(p[1])
             dt = p[1].dataType['keyTypes'][field]
             
-            temp = new_temp()
-            code.append(f"{temp} = {p[1].place} + {struct_off}")
+            temp = ctx.newTemp()
+            code.append(tac.binOp(temp, p[1].place, '+', struct_off))
             place = f"* {temp}"
 
         ## PrimaryExpr -> PrimaryExpr Index
@@ -893,38 +998,38 @@ def p_PrimaryExpr(p):
 
             if p[1].dataType['name'] == 'array' or p[1].dataType['name'] == 'slice':
                 if isinstance(p[2].dataType, str):
-                    if not isBasicInteger(stm, p[2].dataType):
+                    if not isBasicInteger(ctx.stm, p[2].dataType):
                         raise TypeError(f"{p.lexer.lineno}: Index cannot be of type " + p[2].dataType)
                 else:
                     if isinstance(p[2].dataType['baseType'], str) and p[2].dataType['level'] == 0:
-                        if not isBasicInteger(stm, p[2].dataType['baseType']):
+                        if not isBasicInteger(ctx.stm, p[2].dataType['baseType']):
                             raise TypeError(f"{p.lexer.lineno}: Index cannot be of type " + p[2].dataType)
                     else:
                         raise TypeError(f"{p.lexer.lineno}: Index type incorrect")
 
-                dt = deepcopy(p[1].dataType['baseType'])
+                dt = p[1].dataType['baseType']
                 if dt['level']==0:
-                    dt = stm.findType(dt['baseType']).dataType
+                    dt = ctx.stm.findType(dt['baseType']).dataType
 
-                temp1 = new_temp()
+                temp1 = ctx.newTemp()
                 elem_size = dt['size']
                 code.extend(p[1].code)
                 # code.extend(p[2].code)
-                code.append(f"{temp1} = {p[2].place} * {elem_size}")
-                temp2 = new_temp()
-                code.append(f"{temp2} = {p[1].place}.addr + {temp1}")
-                # temp3 = new_temp()        
+                code.append(tac.binOp(temp1, p[2].place, '*', elem_size))
+                temp2 = ctx.newTemp()
+                code.append(tac.binOp(temp2, f"{p[1].place}.addr", '+', temp1))
+                # temp3 = ctx.newTemp()        
                 # code.append(f"{temp3} = * {temp2}")
                 place = f"* {temp2}"
 
             ## TODO : Discuss Layout for MapType
             if p[1].dataType['name'] == 'map':
-                if not isTypeCastable(stm, p[2].dataType, p[1].dataType['KeyType']):
+                if not isTypeCastable(ctx.stm, p[2].dataType, p[1].dataType['KeyType']):
                     raise TypeError(f"{p.lexer.lineno}: Incorrect type for map " + p.lexer.lineno)
 
                 # found = False
                 # idx = 0
-                # for key in stm.get(p[1].label)['val'].keys:
+                # for key in ctx.stm.get(p[1].label)['val'].keys:
                 #     if p[2] == key:
                 #         found = True 
                 #         break 
@@ -933,15 +1038,15 @@ def p_PrimaryExpr(p):
                 # keySize = p[1].dataType['KeyType']['size']
                 # valSize = p[1].dataType['ValueType']['size']
 
-                # temp1 = new_temp()
+                # temp1 = ctx.newTemp()
                 # code.append(f"{temp1} = {keySize} * {idx}")
-                # temp2 = new_temp()
+                # temp2 = ctx.newTemp()
                 # code.append(f"{temp2} = {valSize} * {idx}")
-                # temp3 = new_temp()
+                # temp3 = ctx.newTemp()
                 # code.append(f"{temp3} = {temp1} + {temp2}")
-                # temp4 = new_temp()
+                # temp4 = ctx.newTemp()
                 # code.append(f"{temp4} = {p[1]} + {temp3}")
-                # temp5 = new_temp()
+                # temp5 = ctx.newTemp()
                 # code.append(f"{temp5} = *({temp4} + {keySize})")
                 dt = p[1].dataType['ValueType']
 
@@ -953,51 +1058,51 @@ def p_PrimaryExpr(p):
                 raise TypeError(f"{p.lexer.lineno}: Expecting a slice type but found different one")
 
             if  p[2].lIndexNode != None: 
-                if not isBasicInteger(stm, p[2].lIndexNode.dataType['baseType']):
+                if not isBasicInteger(ctx.stm, p[2].lIndexNode.dataType['baseType']):
                     raise TypeError(f"{p.lexer.lineno}: Index cannot be of type " + p[2].dataType)
             
             if  p[2].rIndexNode != None: 
-                if not isBasicInteger(stm, p[2].rIndexNode.dataType['baseType']):
+                if not isBasicInteger(ctx.stm, p[2].rIndexNode.dataType['baseType']):
                     raise TypeError(f"{p.lexer.lineno}: Index cannot be of type " + p[2].dataType)
 
             else:
                 if isinstance(p[2].lIndexNode.dataType, str):
-                    if not isBasicInteger(stm, p[2].lIndexNode.dataType):
+                    if not isBasicInteger(ctx.stm, p[2].lIndexNode.dataType):
                         raise TypeError(f"{p.lexer.lineno}: Index cannot be of type " + p[2].lIndexNode.dataType)
                 else:
                     if isinstance(p[2].lIndexNode.dataType['baseType'], str) and p[2].lIndexNode.dataType['level'] == 0:
-                        if not isBasicInteger(stm, p[2].lIndexNode.dataType):
+                        if not isBasicInteger(ctx.stm, p[2].lIndexNode.dataType):
                             raise TypeError(f"{p.lexer.lineno}: Index cannot be of type " + p[2].lIndexNode.dataType)
                     else:
                         raise TypeError(f"{p.lexer.lineno}: Index type incorrect")
                 
                 if isinstance(p[2].rIndexNode.dataType, str):
-                    if not isBasicInteger(stm, p[2].rIndexNode.dataType):
+                    if not isBasicInteger(ctx.stm, p[2].rIndexNode.dataType):
                         raise TypeError(f"{p.lexer.lineno}: Index cannot be of type " + p[2].rIndexNode.dataType)
                 else:
                     if isinstance(p[2].rIndexNode.dataType['baseType'], str) and p[2].rIndexNode.dataType['level'] == 0:
-                        if not isBasicInteger(stm, p[2].rIndexNode.dataType):
+                        if not isBasicInteger(ctx.stm, p[2].rIndexNode.dataType):
                             raise TypeError(f"{p.lexer.lineno}: Index cannot be of type " + p[2].rIndexNode.dataType)
                     else:
                         raise TypeError(f"{p.lexer.lineno}: Index type incorrect")
  
-            dt = deepcopy(p[1].dataType['baseType'])
+            dt = p[1].dataType['baseType']
 
             if dt['level']==0:
                 dt = {'name': dt['baseType'], 'baseType': dt['baseType'], 'level': 0}
                 dt['size'] = basicTypeSizes[dt['name']]
 
-            temp1 = new_temp()
+            temp1 = ctx.newTemp()
             elem_size = dt['size']
-            code.append(f"{temp1} = {p[2].lIndexNode.place} * {elem_size}")
-            temp2 = new_temp()
-            code.append(f"{temp2} = {p[2].rIndexNode.place} - {p[2].lIndexNode.place}")
-            temp3 = new_temp()
-            code.append(f"{temp3} = {p[1].place}.capacity - {p[2].lIndexNode.place}")
-            temp4 = var_new_temp()
-            code.append(f"{temp4}.addr = {p[1].place}.addr + {temp1}")
-            code.append(f"{temp4}.length = {temp2}")
-            code.append(f"{temp4}.capacity = {temp3}")
+            code.append(tac.binOp(temp1, p[2].lIndexNode.place, '*', elem_size))
+            temp2 = ctx.newTemp()
+            code.append(tac.binOp(temp2, p[2].rIndexNode.place, '-', p[2].lIndexNode.place))
+            temp3 = ctx.newTemp()
+            code.append(tac.binOp(temp3, f"{p[1].place}.capacity", '-', p[2].lIndexNode.place))
+            temp4 = ctx.varNewTemp()
+            code.append(tac.binOp(f"{temp4}.addr", f"{p[1].place}.addr", '+', temp1))
+            code.append(tac.assign(f"{temp4}.length", temp2))
+            code.append(tac.assign(f"{temp4}.capacity", temp3))
 
             dt = p[1].dataType.copy()
             p[2].children[0] = p[1]
@@ -1005,11 +1110,11 @@ def p_PrimaryExpr(p):
         ## PrimaryExpr -> PrimaryExpr Arguments
         elif isinstance(p[2], List):
             if hasattr(p[1], "pkg") and p[1].pkg is not None:
-                new_stm = stm.pkgs[p[1].pkg]
+                new_stm = ctx.stm.pkgs[p[1].pkg]
             else:
-                new_stm = stm
+                new_stm = ctx.stm
 
-            if p[1].label in basicTypes and (isBasicNumeric(stm, {'baseType': p[1].label, 'level': 0}) or p[1].label == 'string'):
+            if p[1].label in basicTypes and (isBasicNumeric(ctx.stm, {'baseType': p[1].label, 'level': 0}) or p[1].label == 'string'):
                 if len(p[2]) > 1:
                     raise LogicalError(f"{p.lexer.lineno:} Only one expression can be typecasted at a time!")
                 
@@ -1019,17 +1124,17 @@ def p_PrimaryExpr(p):
                 elif isinstance(p[2][0].dataType, list):
                     dt = p[2][0].dataType[0]
                 
-                if not isBasicNumeric(stm, dt):
+                if not isBasicNumeric(ctx.stm, dt):
                     raise TypeError(f"{p.lexer.lineno:} Only Basic Numeric Types can be typecasted with each other!")
                 else:
                     if p[2][0].isConst:
                         p[0] = p[2][0]
                         p[0].isAddressable = False
                         p[0].isConst = p[2][0].isConst
-                        place = new_temp()
+                        place = ctx.newTemp()
                         try:
                             p[0].val = typecast(p[2][0].val, p[1].label)
-                            code.append(f"{place} = {p[0].val}")
+                            code.append(tac.assign(place, p[0].val))
                         except Exception as e:
                             raise TypeError(f"{p.lexer.lineno}: Couldn't typecase constant in compile time.")
                     else:
@@ -1037,8 +1142,8 @@ def p_PrimaryExpr(p):
                         p[0].isAddressable = False
                         p[0].isConst = p[2][0].isConst
                         place = f"retval_typecast_{dt['baseType']}_to_{p[1].label}_0"
-                        code.append(f"params {p[2][0].place}")
-                        code.append(f"call typecast_{dt['baseType']}_to_{p[1].label}")
+                        code.append(tac.params(p[2][0].place))
+                        code.append(tac.call(f"typecast_{dt['baseType']}_to_{p[1].label}", [p[2][0].place]))
                     p[0].dataType = {'baseType': p[1].label, 'name': p[1].label, 'level': 0, 'size': utils.basicTypeSizes[p[1].label]}
                     p[0].code.extend(code)
                     p[0].place = place            
@@ -1050,7 +1155,7 @@ def p_PrimaryExpr(p):
                 if not isinstance(dt, StructType):
                     raise TypeError(f'Not of type struct')
                 
-                p[2] = CompositeLitNode(new_stm, dt.dataType, p[2])
+                p[2] = CompositeLitNode(ctx, new_stm, dt.dataType, p[2])
                 p[0] = p[2]
                 p[0].dataType = dt.dataType
                 p[0].isAddressable = False
@@ -1091,7 +1196,7 @@ def p_PrimaryExpr(p):
                             dt_return = p[2][i].dataType
                         else:
                             func_name = p[2][i].children[0].label
-                            dt_return = stm.functions[func_name]["return"]
+                            dt_return = ctx.stm.functions[func_name]["return"]
                         expression_datatypes.extend(dt_return)
                         if len(dt_return) == 0:
                             raise TypeError(f"{p.lexer.lineno}: Function does not return anything!")
@@ -1112,19 +1217,19 @@ def p_PrimaryExpr(p):
                     if not isTypeCastable(new_stm, dt1, dt2):
                         raise TypeError(f"{p.lexer.lineno}: Type mismatch on argument number: {i} - {argument}")
 
-                    code.append(f"params {argument.place}")
-                code.append(f"call {p[1].label}")
+                    code.append(tac.params(argument.place))
+                code.append(tac.call(p[1].label, [argument.place for argument in p[2]]))
                 p[2] = FuncCallNode(p[1], p[2])
                 if len(info['return']) > 1:
                     place = [] 
                     for i in range (len(info['return'])): 
-                        temp = new_temp()
+                        temp = ctx.newTemp()
                         place.append(temp)
-                        code.append(f"{temp} = retval_{p[1].label}_{i}")
+                        code.append(tac.assign(temp, f"retval_{p[1].label}_{i}"))
                 elif len(info['return']) == 1:
-                    temp = new_temp() 
+                    temp = ctx.newTemp() 
                     place = temp
-                    code.append(f"{temp} = retval_{p[1].label}_0")
+                    code.append(tac.assign(temp, f"retval_{p[1].label}_0"))
         p[0] = p[2]                       
 
         p[0].isAddressable = True
@@ -1234,12 +1339,13 @@ def p_TypeT(p):
           | LPAREN TypeT RPAREN
           | LPAREN IDENT RPAREN
     """
+    ctx = p.lexer.context
     if len(p) == 2:
         p[0] = p[1]
     elif len(p) == 4:
         dt = None
         if isinstance(p[2], str):
-            p[0] = stm.findType(p[2])
+            p[0] = ctx.stm.findType(p[2])
         else:
             p[0] = p[2]
 
@@ -1253,8 +1359,9 @@ def p_PointerType(p):
     PointerType : MUL Type %prec UMUL
                | MUL IDENT %prec UMUL
     """
+    ctx = p.lexer.context
     if isinstance(p[2], str):
-        p[2] = stm.findType(p[2])
+        p[2] = ctx.stm.findType(p[2])
         if p[2] == -1:
             raise TypeError(f"{p.lexer.lineno}: No such type")
 
@@ -1282,7 +1389,8 @@ def p_ArrayType(p):
     """
     ArrayType : LBRACK ArrayLength RBRACK ElementType
     """
-    if stm.id == 0:
+    ctx = p.lexer.context
+    if ctx.stm.id == 0:
         if not p[2].isConst:
             raise LogicalError(f"{p.lexer.lineno}: Array length must be a constant in global scope.")
     p[0] = BrackType(p[4].dataType, p[2])
@@ -1316,8 +1424,9 @@ def p_ElementType(p):
     ElementType : Type
                 | IDENT
     """    
+    ctx = p.lexer.context
     if isinstance(p[1], str):
-        p[0] = stm.findType(p[1]) 
+        p[0] = ctx.stm.findType(p[1]) 
     else:
         p[0] = p[1]
 
@@ -1360,13 +1469,14 @@ def p_FieldDecl(p):
               | IdentifierList IDENT
               | EmbeddedField
     """
+    ctx = p.lexer.context
     if len(p) == 2:
         p[0] = NodeList([StructFieldType(p[1], p[1])])
 
     elif len(p) == 3:
         p[0] = NodeList([])
         if isinstance(p[2], str):
-            p[2] = stm.findType(p[2])
+            p[2] = ctx.stm.findType(p[2])
         for key in p[1]:
             p[0].append(StructFieldType(key, p[2]))
     
@@ -1375,18 +1485,19 @@ def p_EmbeddedField(p):
     EmbeddedField : MUL IDENT
                   | IDENT
     """
+    ctx = p.lexer.context
     if len(p) == 2:
-        t = stm.findType(p[1])
+        t = ctx.stm.findType(p[1])
         t.label = p[1]
         p[0] = t
     else:
-        t = stm.findType(p[2])
+        t = ctx.stm.findType(p[2])
         t.label = p[2]
         p[2] = t
         p[0] = PointerType(p[2])
         p[0].dataType['baseType'] = p[2]
         p[0].dataType['level'] = 1
-    p[0].dataType['name'] = 'embedded'
+    p[0].dataType = updateType(p[0].dataType, name='embedded')
 
 ###################################################################################
 ### Map Type
@@ -1406,8 +1517,9 @@ def p_KeyType(p):
     KeyType : Type
             | IDENT
     """
+    ctx = p.lexer.context
     if isinstance(p[1], str):
-        p[0] = stm.findType(p[1])
+        p[0] = ctx.stm.findType(p[1])
     else:
         p[0] = p[1]
 
@@ -1447,58 +1559,64 @@ def p_IntLit(p):
     """
     IntLit : INT
     """
+    ctx = p.lexer.context
     if check_int(p[1]):
         p[0] = LitNode(dataType = {'name': 'int', 'baseType': 'int', 'level': 0, 'size': 4}, label = p[1], isConst=True, val=int(p[1]))
     else:
         raise (f"{p.lexer.lineno}: Integer Overflow detected")
     # print(p[1])
-    temp = new_temp()
-    p[0].code.append(f"{temp} = {p[1]}")
+    temp = ctx.newTemp()
+    p[0].code.append(tac.assign(temp, p[1]))
     p[0].place = temp 
 
 def p_FloatLit(p):
     """
     FloatLit : FLOAT
     """
+    ctx = p.lexer.context
     p[0] = LitNode(dataType = {'name': 'float32', 'baseType': 'float32', 'level': 0, 'size': 4}, label = p[1], isConst=True, val=float(p[1]))
-    temp = new_temp()
-    p[0].code.append(f"{temp} = {p[1]}")
+    temp = ctx.newTemp()
+    p[0].code.append(tac.assign(temp, p[1]))
     p[0].place = temp 
     
 def p_ImagLit(p):
     """
     ImagLit : IMAG
     """
+    ctx = p.lexer.context
     p[0] = LitNode(dataType = {'name': 'complex128', 'baseType': 'complex128', 'level': 0, 'size': 8}, label = p[1], isConst=True, val=float(p[1].strip('i')))
-    temp = new_temp()
-    p[0].code.append(f"{temp} = {p[1]}")
+    temp = ctx.newTemp()
+    p[0].code.append(tac.assign(temp, p[1]))
     p[0].place = temp 
 
 def p_RuneLit(p):
     """
     RuneLit : RUNE
     """
+    ctx = p.lexer.context
     p[0] = LitNode(dataType = {'name': 'rune', 'baseType': 'rune', 'level': 0, 'size': 4}, label = p[1], isConst=True, val=p[1])
-    temp = new_temp()
-    p[0].code.append(f"{temp} = {p[1]}")
+    temp = ctx.newTemp()
+    p[0].code.append(tac.assign(temp, p[1]))
     p[0].place = temp 
 
 def p_StringLit(p):
     """
     StringLit : STRING
     """
+    ctx = p.lexer.context
     p[0] = LitNode(dataType = {'name': 'string', 'baseType': 'string', 'level': 0, 'size': 12}, label = p[1], isConst=True, val=p[1])
-    temp = new_temp()
-    p[0].code.append(f"{temp} = {p[1]}")
+    temp = ctx.newTemp()
+    p[0].code.append(tac.assign(temp, p[1]))
     p[0].place = temp 
 
 def p_BoolLit(p):
     """
     BoolLit : BOOL
     """
+    ctx = p.lexer.context
     p[0] = LitNode(dataType = {'name': 'bool', 'baseType': 'bool', 'level': 0, 'size': 4}, label = p[1], isConst=True, val = p[1])
-    temp = new_temp()
-    p[0].code.append(f"{temp} = {p[1]}")
+    temp = ctx.newTemp()
+    p[0].code.append(tac.assign(temp, p[1]))
     p[0].place = temp 
 
 ###################################################################################
@@ -1515,10 +1633,11 @@ def p_CompositeLit(p):
                  | MapType LiteralValue
                  | IDENT LiteralValue
     """
+    ctx = p.lexer.context
     if isinstance(p[1], str):
-        p[1] = stm.findType(p[1])
+        p[1] = ctx.stm.findType(p[1])
 
-    p[0] = CompositeLitNode(stm, p[1].dataType, p[2])
+    p[0] = CompositeLitNode(ctx, ctx.stm, p[1].dataType, p[2])
 
 def p_LiteralValue(p):
     """
@@ -1585,56 +1704,73 @@ def p_FuncDecl(p):
     FuncDecl : FuncSig FunctionBody
              | FuncSig
     """
+    ctx = p.lexer.context
     ## Make node
     if len(p) == 2:
         p[0] = FuncNode(p[1][0], p[1][1][0], p[1][1][1], None)
     else:
         p[0] = FuncNode(p[1][0], p[1][1][0], p[1][1][1], p[2])
-    p[0].code.append(f"Func END\n")
+    p[0].code.append(tac.funcEnd())
 
 
-    global curr_func_id
-    stm.currentReturnType = None
-    for symbol in stm.symTable[stm.id].localsymTable:
-        if symbol not in info_tables[curr_func_id]:
-            info_tables[curr_func_id][symbol] = {}
+    ctx.stm.currentReturnType = None
+    checkGotos(ctx.stm)
+    for symbol in ctx.stm.symTable[ctx.stm.id].localsymTable:
+        if symbol not in ctx.infoTables[ctx.currFuncId]:
+            ctx.infoTables[ctx.currFuncId][symbol] = {}
             
-        if stm.id not in info_tables[curr_func_id][symbol]:
-            info_tables[curr_func_id][symbol][stm.id] = {}
-        info_tables[curr_func_id][symbol][stm.id] = stm.symTable[stm.id].localsymTable[symbol]
-    curr_func_id = 'global'
+        if ctx.stm.id not in ctx.infoTables[ctx.currFuncId][symbol]:
+            ctx.infoTables[ctx.currFuncId][symbol][ctx.stm.id] = {}
+        ctx.infoTables[ctx.currFuncId][symbol][ctx.stm.id] = ctx.stm.symTable[ctx.stm.id].localsymTable[symbol]
+    ctx.currFuncId = 'global'
     # Analyze whether return statements are present
-    if len(p[1][1][1].dataType) > 0 and not stm.symTable[stm.id].okReturn:
+    if len(p[1][1][1].dataType) > 0 and not ctx.stm.symTable[ctx.stm.id].okReturn:
         raise LogicalError(f"{p.lexer.lineno}: Function having non-void return type doesn't return anything.")
-    stm.exitScope()
+    ctx.stm.exitScope()
+
+def checkGotos(stm):
+    # Check every goto of the function against its label in one pass; labels
+    # are local to the function
+    for goto in stm.gotos:
+        label = stm.labels[goto[0]]
+        if label['expecting']:
+            raise LogicalError(f"{goto[3]}: Goto declared without declaring any label {goto[0]}.")
+        if not isValidGoto(stm, label, goto):
+            if goto[4]:
+                raise LogicalError(f"{label['lineno']}: Invalid placement of Goto at {goto[3]} - Goto statement outside of a Block can't jump inside a Block and variable declarations can't be skipped.")
+            else:
+                raise LogicalError(f"{goto[3]}: Invalid placement of goto wrt label at {label['lineno']} - Goto statement outside of a Block can't jump inside a block.")
+    stm.labels = {}
+    stm.gotos = []
+    stm.currentLabel = None
 
 def p_FuncSig(p):
     """
     FuncSig : FUNC FunctionName Signature
     """
-    global curr_func_id
+    ctx = p.lexer.context
     if p[3][1] == None:
         if p[3][0] == None:
-            stm.addFunction(p[2].label, {"params": [] , "return": [], "dataType": {'name': 'func', 'baseType': 'func', 'level': 0}})
+            ctx.stm.addFunction(p[2].label, {"params": [] , "return": [], "dataType": {'name': 'func', 'baseType': 'func', 'level': 0}})
         else:
-            stm.addFunction(p[2].label, {"params": p[3][0].dataType, "return": [], "dataType": {'name': 'func', 'baseType': 'func', 'level': 0}})
+            ctx.stm.addFunction(p[2].label, {"params": p[3][0].dataType, "return": [], "dataType": {'name': 'func', 'baseType': 'func', 'level': 0}})
             for i, param in enumerate(p[3][0].children):
-                stm.add(param.label, {"dataType": param.dataType, "val": param.val, "isConst": param.isConst, "isArg": True, 'paramOf': p[2].label}, True)
-                p[3][0].children[i].scope = stm.id
+                ctx.stm.add(param.label, {"dataType": param.dataType, "val": param.val, "isConst": param.isConst, "isArg": True, 'paramOf': p[2].label}, True)
+                p[3][0].children[i].scope = ctx.stm.id
 
     else:
         if p[3][0] == None:
-            stm.addFunction(p[2].label, {"params": [] , "return": p[3][1].dataType, "dataType": {'name': 'func', 'baseType': 'func', 'level': 0}})
+            ctx.stm.addFunction(p[2].label, {"params": [] , "return": p[3][1].dataType, "dataType": {'name': 'func', 'baseType': 'func', 'level': 0}})
         else:
-            stm.addFunction(p[2].label, {"params": p[3][0].dataType, "return": p[3][1].dataType, "dataType": {'name': 'func', 'baseType': 'func', 'level': 0}})
+            ctx.stm.addFunction(p[2].label, {"params": p[3][0].dataType, "return": p[3][1].dataType, "dataType": {'name': 'func', 'baseType': 'func', 'level': 0}})
             for i, param in enumerate(p[3][0].children):
-                stm.add(param.label, {"dataType": param.dataType, "val": param.val, "isConst": param.isConst, "isArg": True, 'paramOf': p[2].label}, True)
-                p[3][0].children[i].scope = stm.id
-    stm.currentReturnType = deepcopy(p[3][1])
-    # print("M: ", len(stm.currentReturnType.dataType), p.lexer.lineno)
+                ctx.stm.add(param.label, {"dataType": param.dataType, "val": param.val, "isConst": param.isConst, "isArg": True, 'paramOf': p[2].label}, True)
+                p[3][0].children[i].scope = ctx.stm.id
+    ctx.stm.currentReturnType = p[3][1]
+    # print("M: ", len(ctx.stm.currentReturnType.dataType), p.lexer.lineno)
 
-    curr_func_id = p[2].label
-    info_tables[curr_func_id] = {}
+    ctx.currFuncId = p[2].label
+    ctx.infoTables[ctx.currFuncId] = {}
 
     p[0] = NodeList([p[2], p[3]])
 
@@ -1644,13 +1780,14 @@ def p_FunctionName(p):
     """
     FunctionName : IDENT
     """
+    ctx = p.lexer.context
     ##  Check redeclaration
-    if p[1] in stm.functions or stm.getScope(p[1]) >= 0 :
+    if p[1] in ctx.stm.functions or ctx.stm.getScope(p[1]) >= 0 :
         raise (f"{p.lexer.lineno}: Redeclaration of function " + p[1])
 
-    p[0] = IdentNode(scope = stm.id, label = p[1], dataType = "func")
+    p[0] = IdentNode(scope = ctx.stm.id, label = p[1], dataType = "func")
 
-    p[0].code.append(f"\nFunc {p[1]}")
+    p[0].code.append(tac.func(p[1]))
 
 ###################################################################################
 ## Function Body
@@ -1706,9 +1843,10 @@ def p_ParameterDecl(p):
     ParameterDecl : IdentifierList Type
                   | IdentifierList IDENT
     """
+    ctx = p.lexer.context
     p[0] = p[1]
     if isinstance(p[2], str):
-        p[2] = stm.findType(p[2])
+        p[2] = ctx.stm.findType(p[2])
     for i in range(len(p[0])):
         p[0][i].dataType = p[2].dataType
 
@@ -1722,9 +1860,10 @@ def p_Result(p):
            | IDENT
            | Type
     """
+    ctx = p.lexer.context
     if len(p) > 3:
         if isinstance(p[2], str):
-            p[2] = stm.findType(p[2])
+            p[2] = ctx.stm.findType(p[2])
         if isinstance(p[2], Type):
             p[2] = [p[2]]
             # print("K: ", p[2])
@@ -1733,7 +1872,7 @@ def p_Result(p):
         p[0] = FuncReturnNode([])
     else:
         if isinstance(p[1], str):
-            p[1] = stm.findType(p[1])
+            p[1] = ctx.stm.findType(p[1])
         if isinstance(p[1], Type):
             p[1] = [p[1]]
         # print("G: ", p[1])
@@ -1746,18 +1885,19 @@ def p_ParametersType(p):
                    | ParametersType COMMA IDENT
                    | ParametersType COMMA Type
     """
+    ctx = p.lexer.context
     if len(p) == 2:
         if isinstance(p[1], str):
             p[0] = FuncParamType()
             # print("F: ", p[0].__dict__)
-            p[0].addChild(stm.findType(p[1]))
+            p[0].addChild(ctx.stm.findType(p[1]))
         else:
             p[0] = FuncParamType()
             # print("G: ", p[0].__dict__)
             p[0].addChild(p[1])
     else:
         if isinstance(p[3], str):
-            p[1].addChild(stm.findType(p[3]))
+            p[1].addChild(ctx.stm.findType(p[3]))
         else:
             p[1].addChild(p[3])
         p[0] = p[1]
@@ -1777,7 +1917,7 @@ def p_StatementList(p):
     if len(p) == 4:
         assert(isinstance(p[3], NodeList))
         p[0] = NodeList([p[1]])
-        p[0].extend(p[3])
+        p[0].concat(p[3])
     else:
         p[0] = NodeList([])
 
@@ -1806,10 +1946,11 @@ def p_LabeledStmt(p):
     """
     LabeledStmt : Label COLON Statement
     """
-    stm.labels[p[1]]['statementType'] = type(p[3])
+    ctx = p.lexer.context
+    ctx.stm.labels[p[1]]['statementType'] = type(p[3])
     p[0] = LabelNode(p[1], LabelStatementNode(p[3], p.lexer.lineno))
-    stm.currentLabel = None
-    p[0].code = [f"{stm.labels[p[1]]['mappedName']}:"] + p[0].code
+    ctx.stm.currentLabel = None
+    p[0].code = [tac.label(ctx.stm.labels[p[1]]['mappedName'])] + p[0].code
 
 def p_JumpLabel(p):
     """
@@ -1821,33 +1962,30 @@ def p_Label(p):
     """
     Label : IDENT
     """
-    labelScopeTab = deepcopy(stm.symTable[stm.getCurrentScope()])
-    if p[1] not in stm.labels:
+    ctx = p.lexer.context
+    labelScope = ctx.stm.getCurrentScope()
+    if p[1] not in ctx.stm.labels:
         # Create a new label and need not set expecting to true; set it to false
-        stm.labels[p[1]] = {
-            'scopeTab': labelScopeTab,
-            'mappedName' : stm.getNewLabel(),
+        ctx.stm.labels[p[1]] = {
+            'scope': labelScope,
+            'declSeq': ctx.stm.symTable[labelScope].lastDecl,
+            'mappedName' : ctx.stm.getNewLabel(),
             'expecting' : False ,
             'lineno' : p.lexer.lineno,
-            'statementType' : None,
-            'prevGotos': []
+            'statementType' : None
         }
     else: 
-        if stm.labels[p[1]]['expecting'] == False:
+        if ctx.stm.labels[p[1]]['expecting'] == False:
             # Redeclaration of label - Error
-            raise LogicalError(f"{p.lexer.lineno}: Label declared earlier at {stm.labels[p[1]]['lineno']}.")
+            raise LogicalError(f"{p.lexer.lineno}: Label declared earlier at {ctx.stm.labels[p[1]]['lineno']}.")
         else:
             # Expecting = True; 
-            # Analyse previous gotos (if any), and set expecting to False
-            for goto in stm.labels[p[1]]['prevGotos']:
-                gotoScopeTab, gotoLineno = goto
-                if not isValidGoto(stm, labelScopeTab, gotoScopeTab, checkNoSkipVar=True):
-                    raise LogicalError(f"{p.lexer.lineno}: Invalid placement of Goto at {gotoLineno} - Goto statement outside of a Block can't jump inside a Block and variable declarations can't be skipped.")
-            stm.labels[p[1]]['scopeTab'] = labelScopeTab
-            stm.labels[p[1]]['expecting'] = False
-            stm.labels[p[1]]['scopeTab'] = labelScopeTab
-            stm.labels[p[1]]['lineno'] = p.lexer.lineno
-    stm.currentLabel = p[1]
+            # Previous gotos are checked at the end of the function
+            ctx.stm.labels[p[1]]['scope'] = labelScope
+            ctx.stm.labels[p[1]]['declSeq'] = ctx.stm.symTable[labelScope].lastDecl
+            ctx.stm.labels[p[1]]['expecting'] = False
+            ctx.stm.labels[p[1]]['lineno'] = p.lexer.lineno
+    ctx.stm.currentLabel = p[1]
     p[0] = p[1]
 
 ###################################################################################
@@ -1880,6 +2018,7 @@ def p_ExpressionStmt(p):
     """
     ExpressionStmt : Expr
     """
+    ctx = p.lexer.context
     # Check if builtin function definitions are added in STM
     builtInFuncsToAvoid = [
         'append',
@@ -1891,10 +2030,10 @@ def p_ExpressionStmt(p):
         'new',
         'real'
     ]
-    if hasattr(stm, 'builtInFuncs') and isinstance(p[1], FuncCallNode):
+    if hasattr(ctx.stm, 'builtInFuncs') and isinstance(p[1], FuncCallNode):
         funcName =  p[1].children[0].children[0]
-        if funcName in builtInFuncsToAvoid and funcName not in stm.functions:
-            funcReturnType = stm.builtInFuncs[funcName]['return']
+        if funcName in builtInFuncsToAvoid and funcName not in ctx.stm.functions:
+            funcReturnType = ctx.stm.builtInFuncs[funcName]['return']
             raise ValueNotUsedError(f"{p.lexer.lineno}: Value of type {funcReturnType} is not used.")
     p[0] = p[1]
 
@@ -1906,16 +2045,17 @@ def p_IncDecStmt(p):
     IncDecStmt :  Expr INC
                  | Expr DEC
     """
+    ctx = p.lexer.context
     if p[1].isAddressable == False:
         raise LogicalError(f"{p.lexer.lineno}: Expression is not addressable.")
-    if not isBasicNumeric(stm, p[1].dataType):
+    if not isBasicNumeric(ctx.stm, p[1].dataType):
         raise LogicalError(f"{p.lexer.lineno}: Non-numeric type can't be incremented or decremented.")
     if p[2] == '++':
         p[0] = IncNode(p[1])
-        p[0].code.append(f"{p[1].place} = {p[1].place} + 1")
+        p[0].code.append(tac.binOp(p[1].place, p[1].place, '+', 1))
     else:
         p[0] = DecNode(p[1])
-        p[0].code.append(f"{p[1].place} = {p[1].place} - 1")
+        p[0].code.append(tac.binOp(p[1].place, p[1].place, '-', 1))
 
 ###################################################################################
 ### Assignment Statements
@@ -1924,6 +2064,7 @@ def p_Assignment(p):
     """
     Assignment : ASSIGNMENT ExpressionList assign_op ExpressionList
     """
+    ctx = p.lexer.context
     if len(p[2]) != len(p[4]):
         if len(p[4]) == 1 and isinstance(p[4][0], FuncCallNode):
             pass
@@ -1941,7 +2082,7 @@ def p_Assignment(p):
                 dt_return = p[length][i].dataType
             else: 
                 func_name = p[length][i].children[0].label
-                dt_return = stm.functions[func_name]["return"]
+                dt_return = ctx.stm.functions[func_name]["return"]
             expression_dt.extend(dt_return)
             if len(dt_return) == 0:
                 raise TypeError(f"{p.lexer.lineno}: Function does not return anything!")
@@ -1981,15 +2122,15 @@ def p_Assignment(p):
     if count_1 == 0:
         for i in range(len(p[2])):
             if p[3] == '=':
-                p[0].code.append(f"{p[2][i].place} = {p[length][i].place}")
+                p[0].code.append(tac.assign(p[2][i].place, p[length][i].place))
             else:
-                p[0].code.append(f"{p[2][i].place} = {p[2][i].place} {p[3][0]}({expression_dt[i]['name']}) {p[length][i].place}")
+                p[0].code.append(tac.binOp(p[2][i].place, p[2][i].place, p[3][0], p[length][i].place, expression_dt[i]['name']))
     else:
         for i in range(len(p[2])):
             if p[3] == '=': 
-                p[0].code.append(f"{p[2][i].place} = {p[length][0].place[i]}")
+                p[0].code.append(tac.assign(p[2][i].place, p[length][0].place[i]))
             else:
-                p[0].code.append(f"{p[2][i].place} = {p[2][i].place} {p[3][0]}({expression_dt[i]['name']}) {p[length][0].place[i]}")
+                p[0].code.append(tac.binOp(p[2][i].place, p[2][i].place, p[3][0], p[length][0].place[i], expression_dt[i]['name']))
 
     # for i, (key, val) in enumerate(zip(p[1], p[3])):
     #     if p[2] == '=':
@@ -2033,6 +2174,7 @@ def p_ShortVarDecl(p):
     """
     ShortVarDecl : IdentifierList DEFINE ExpressionList
     """
+    ctx = p.lexer.context
     length = len(p) - 1
 
     count_0 = 0
@@ -2046,7 +2188,7 @@ def p_ShortVarDecl(p):
                 dt_return = p[length][i].dataType
             else:
                 func_name = p[length][i].children[0].label
-                dt_return = stm.functions[func_name]["return"]
+                dt_return = ctx.stm.functions[func_name]["return"]
             expression_datatypes.extend(dt_return)
             if len(dt_return) == 0:
                 raise TypeError(f"{p.lexer.lineno}: Function does not return anything!")
@@ -2084,25 +2226,25 @@ def p_ShortVarDecl(p):
     for i, ident in enumerate(p[1]):
 
         # Check redeclaration for identifier list
-        latest_scope = stm.getScope(ident.label)
-        if latest_scope == stm.id or ident.label in stm.functions:
+        latest_scope = ctx.stm.getScope(ident.label)
+        if latest_scope == ctx.stm.id or ident.label in ctx.stm.functions:
             raise NameError(f'{p.lexer.lineno}: Redeclaration of identifier: ' + ident.label)
         
         # Add to symbol table
         dt = return_values[i]
-        stm.add(ident.label, {'dataType': dt, 'isConst' : False})
+        ctx.stm.add(ident.label, {'dataType': dt, 'isConst' : False})
         p[1][i].dataType = dt
 
 
     if count_1 == 0:
         for i in range(len(p[1])):
-            p[0].code.append(f"{stm.id}_{p[1][i].label} = {p[length][i].place}")
-            stm.symTable[stm.id].updateAttr(p[1][i].label, {'tmp': f"{stm.id}_{p[1][i].label}"})
+            p[0].code.append(tac.assign(f"{ctx.stm.id}_{p[1][i].label}", p[length][i].place))
+            ctx.stm.symTable[ctx.stm.id].updateAttr(p[1][i].label, {'tmp': f"{ctx.stm.id}_{p[1][i].label}"})
 
     else:
         for i in range(len(p[1])):
-            p[0].code.append(f"{stm.id}_{p[1][i].label} = {p[length][0].place[i]}")
-            stm.symTable[stm.id].updateAttr(p[1][i].label, {'tmp': f"{stm.id}_{p[1][i].label}"})
+            p[0].code.append(tac.assign(f"{ctx.stm.id}_{p[1][i].label}", p[length][0].place[i]))
+            ctx.stm.symTable[ctx.stm.id].updateAttr(p[1][i].label, {'tmp': f"{ctx.stm.id}_{p[1][i].label}"})
 
 ###################################################################################
 ### Goto Statements
@@ -2112,41 +2254,24 @@ def p_GotoStmt(p):
     """
     GotoStmt :  GOTO JumpLabel
     """
-    gotoScopeTab = deepcopy(stm.symTable[stm.getCurrentScope()])
-    if p[2] in stm.labels:
-        # Label has been seen before
-        if stm.labels[p[2]]['expecting']:
-            # Currently not seen the labeled statement
-            # Label has been created earlier by previous goto
-            stm.labels[p[2]]['prevGotos'].append(
-                (gotoScopeTab, p.lexer.lineno)
-            )
-        else:
-            # Label already declared before (backward jump)
-            # Check parent condition
-            if not isValidGoto(stm, stm.labels[p[2]]['scopeTab'], gotoScopeTab):
-                raise LogicalError(f"{p.lexer.lineno}: Invalid placement of goto wrt label at {stm.labels[p[2]]['lineno']} - Goto statement outside of a Block can't jump inside a block.")
-            # No need to append gotos as semantic analysis is complete
-    else:
+    ctx = p.lexer.context
+    # Only the position of the goto is recorded, it is checked against its
+    # label at the end of the function
+    forward = p[2] not in ctx.stm.labels or ctx.stm.labels[p[2]]['expecting']
+    ctx.stm.gotos.append((p[2], ctx.stm.getCurrentScope(), ctx.stm.declSeq, p.lexer.lineno, forward))
+    if p[2] not in ctx.stm.labels:
         # Label not declared before; expecting label; (forward jump)
-        # Semantic analysis to be done when corresponding Label is parsed
-        # at the labeled stmt non-terminal
-
-        # Will shallow copy work or do we need deepcopy?
         # Label is created for the first time from goto
-        stm.labels[p[2]] = {
-            'scopeTab': None,
-            'mappedName' : stm.getNewLabel(),
+        ctx.stm.labels[p[2]] = {
+            'scope': None,
+            'declSeq': None,
+            'mappedName' : ctx.stm.getNewLabel(),
             'expecting' : True ,
             'lineno' : None,
-            'statementType' : None,
-            'prevGotos': [
-                (gotoScopeTab, p.lexer.lineno)
-            ]
+            'statementType' : None
         }
-            
     p[0] = GotoNode(p[2])
-    p[0].code.append(f"goto {stm.labels[p[2]]['mappedName']}")
+    p[0].code.append(tac.goto(ctx.stm.labels[p[2]]['mappedName']))
 
 ###################################################################################
 ### Return Statements
@@ -2157,14 +2282,15 @@ def p_ReturnStmt(p):
     ReturnStmt : RETURN ExpressionList
                 | RETURN
     """
+    ctx = p.lexer.context
     # This case should never arise
-    if stm.currentReturnType is None:
+    if ctx.stm.currentReturnType is None:
         raise LogicalError(f"{p.lexer.lineno}: Return statement outside of a function.")
     if len(p) == 2:
-        if stm.currentReturnType:
+        if ctx.stm.currentReturnType:
             raise LogicalError(f"{p.lexer.lineno}: Current function doesn't return nothing.")
         p[0] = ReturnNode([])
-        p[0].code.append("return")
+        p[0].code.append(tac.ret())
     else:
         returnvalues = []
         for expr in p[2]:
@@ -2172,17 +2298,17 @@ def p_ReturnStmt(p):
                 returnvalues.extend(expr.dataType)
             else:
                 returnvalues.append(expr.dataType)
-        # print(len(stm.currentReturnType.dataType), len(returnvalues))
-        if len(stm.currentReturnType.dataType) != len(returnvalues):
+        # print(len(ctx.stm.currentReturnType.dataType), len(returnvalues))
+        if len(ctx.stm.currentReturnType.dataType) != len(returnvalues):
             raise LogicalError(f"{p.lexer.lineno}: Different number of return values.")
-        for returnDataType, ExprNodedt in zip(stm.currentReturnType.dataType, returnvalues):
+        for returnDataType, ExprNodedt in zip(ctx.stm.currentReturnType.dataType, returnvalues):
             if returnDataType != ExprNodedt:
                 raise LogicalError(f"{p.lexer.lineno}: Return type of current function :{returnDataType} and the return statement {ExprNodedt} doesn't match.")
         p[0] = ReturnNode(p[2])
         for expr in p[2]:
-            p[0].code.append(f"retparams {expr.place}")
-        p[0].code.append("return")
-    stm.symTable[stm.id].okReturn = True
+            p[0].code.append(tac.retParams(expr.place))
+        p[0].code.append(tac.ret([expr.place for expr in p[2]]))
+    ctx.stm.symTable[ctx.stm.id].okReturn = True
 
 ###################################################################################
 ### Break Statements
@@ -2193,29 +2319,30 @@ def p_BreakStmt(p):
     BreakStmt : BREAK 
               | BREAK JumpLabel
     """
-    if len(stm.forStack) == 0 and len(stm.switchStack) == 0:
+    ctx = p.lexer.context
+    if len(ctx.stm.forStack) == 0 and len(ctx.stm.switchStack) == 0:
         raise LogicalError(f"{p.lexer.lineno}: Break can only be used inside for loops and switch statements.")
     if len(p) == 2:
         p[0] = BreakNode()
-        if len(stm.forStack) == 0:
-            p[0].code.append(f"goto end_switch_{stm.switchStack[-1]}")
-        elif len(stm.switchStack) == 0:
-            p[0].code.append(f"goto end_for_{stm.forStack[-1]}")
-        elif stm.forStack[-1] < stm.switchStack[-1]:
-            p[0].code.append(f"goto end_switch_{stm.switchStack[-1]}")
+        if len(ctx.stm.forStack) == 0:
+            p[0].code.append(tac.goto(f"end_switch_{ctx.stm.switchStack[-1]}"))
+        elif len(ctx.stm.switchStack) == 0:
+            p[0].code.append(tac.goto(f"end_for_{ctx.stm.forStack[-1]}"))
+        elif ctx.stm.forStack[-1] < ctx.stm.switchStack[-1]:
+            p[0].code.append(tac.goto(f"end_switch_{ctx.stm.switchStack[-1]}"))
         else:
-            p[0].code.append(f"goto end_for_{stm.forStack[-1]}")
+            p[0].code.append(tac.goto(f"end_for_{ctx.stm.forStack[-1]}"))
     else:
-        if p[2] not in stm.labels:
+        if p[2] not in ctx.stm.labels:
             raise LogicalError(f"{p.lexer.lineno}: Label for the break statement must have been declared beforehand.")
-        if not stm.labels[p[2]]['statementType'] or stm.labels[p[2]]['statementType'] not in ['FOR', 'SWITCH']:
+        if not ctx.stm.labels[p[2]]['statementType'] or ctx.stm.labels[p[2]]['statementType'] not in ['FOR', 'SWITCH']:
             raise LogicalError(f"{p.lexer.lineno}: Label used with break statement must be used on a for loop statement or switch node statement.")
         p[0] = BreakNode(p[2])
-        lineno = stm.labels[p[2]]['lineno']
-        if lineno in stm.forStack:
-            p[0].code.append(f"goto end_for_{stm.labels[p[2]]['lineno']}")
+        lineno = ctx.stm.labels[p[2]]['lineno']
+        if lineno in ctx.stm.forStack:
+            p[0].code.append(tac.goto(f"end_for_{ctx.stm.labels[p[2]]['lineno']}"))
         else:
-            p[0].code.append(f"goto end_switch_{stm.labels[p[2]]['lineno']}")
+            p[0].code.append(tac.goto(f"end_switch_{ctx.stm.labels[p[2]]['lineno']}"))
 
 ###################################################################################
 ### Continue Statements
@@ -2226,18 +2353,19 @@ def p_ContinueStmt(p):
     ContinueStmt :  CONTINUE
                  |  CONTINUE JumpLabel
     """
-    if len(stm.forStack) == 0:
+    ctx = p.lexer.context
+    if len(ctx.stm.forStack) == 0:
         raise LogicalError(f"{p.lexer.lineno}: Continue can only be called inside a for loop.")
     if len(p) == 2:
         p[0] = ContinueNode()
-        p[0].code.append(f"goto poststmt_for_{stm.forStack[-1]}")
+        p[0].code.append(tac.goto(f"poststmt_for_{ctx.stm.forStack[-1]}"))
     else:
-        if p[2] not in stm.labels:
+        if p[2] not in ctx.stm.labels:
             raise LogicalError(f"{p.lexer.lineno}: Label for the continue statement must have been declared beforehand.")
-        if not stm.labels[p[2]]['statementType'] or stm.labels[p[2]]['statementType'] not in ['FOR']:
+        if not ctx.stm.labels[p[2]]['statementType'] or ctx.stm.labels[p[2]]['statementType'] not in ['FOR']:
             raise LogicalError(f"{p.lexer.lineno}: Label used with continue statement must be used on a for loop statement.")
         p[0] = ContinueNode(p[2])
-        p[0].code.append(f"goto poststmt_for_{stm.labels[p[2]]['lineno']}")
+        p[0].code.append(tac.goto(f"poststmt_for_{ctx.stm.labels[p[2]]['lineno']}"))
 
 ###################################################################################
 ### Fallthrough Statements
@@ -2265,14 +2393,16 @@ def p_BlockStart(p):
     """
     BlockStart : 
     """
-    stm.newScope()
+    ctx = p.lexer.context
+    ctx.stm.newScope()
     p[0] = []
 
 def p_BlockEnd(p):
     """
     BlockEnd : 
     """
-    stm.exitScope()
+    ctx = p.lexer.context
+    ctx.stm.exitScope()
     p[0] = []
 
 ###################################################################################
@@ -2284,22 +2414,23 @@ def p_IfStmt(p):
     IfStmt : IF BeginIf Expr BlockStart Block BlockEnd else_stmt EndIf
            | IF BeginIf SimpleStmt SEMICOLON Expr BlockStart Block BlockEnd else_stmt EndIf
     """
-    if p[len(p) - 2] and stm.symTable[stm.id].NotAllChildReturn == False:
-        stm.symTable[stm.id].okReturn = True
+    ctx = p.lexer.context
+    if p[len(p) - 2] and ctx.stm.symTable[ctx.stm.id].NotAllChildReturn == False:
+        ctx.stm.symTable[ctx.stm.id].okReturn = True
     else:
-        stm.symTable[stm.id].okReturn = False
-    stm.symTable[stm.id].NotAllChildReturn = True
-    stm.exitScope()
+        ctx.stm.symTable[ctx.stm.id].okReturn = False
+    ctx.stm.symTable[ctx.stm.id].NotAllChildReturn = True
+    ctx.stm.exitScope()
 
     if len(p) == 9:
         if p[3].dataType['baseType'] != 'bool' or p[3].dataType['level'] != 0:
             raise TypeError(f'{p.lexer.lineno}: Expression inside if-statement must be of bool type!') 
         else:
-            p[5].code.append(f"goto end_{p.lexer.lineno}")
-            p[5].code.append(f"else_{p.lexer.lineno}:")
-            p[3].code.append(f"if not {p[3].place} then goto else_{p.lexer.lineno}")
+            p[5].code.append(tac.goto(f"end_{p.lexer.lineno}"))
+            p[5].code.append(tac.label(f"else_{p.lexer.lineno}"))
+            p[3].code.append(tac.ifNot(p[3].place, f"else_{p.lexer.lineno}"))
             p[0] = IfNode(None, p[3], ThenNode(p[5]), p[7])
-            p[0].code.append(f"end_{p.lexer.lineno}:")
+            p[0].code.append(tac.label(f"end_{p.lexer.lineno}"))
     else:
         if p[5].dataType['baseType'] != 'bool' or p[5].dataType['level'] != 0:
             raise TypeError(f'{p.lexer.lineno}: Expression inside if-statement must be of bool type!') 
@@ -2309,21 +2440,22 @@ def p_BeginIf(p):
     """
     BeginIf : 
     """
-    stm.newScope()
+    ctx = p.lexer.context
+    ctx.stm.newScope()
 
 def p_EndIf(p):
     """
     EndIf :
     """
-    global curr_func_id
-    for symbol in stm.symTable[stm.id].localsymTable:
-        if symbol not in info_tables[curr_func_id]:
-            info_tables[curr_func_id][symbol] = {}
+    ctx = p.lexer.context
+    for symbol in ctx.stm.symTable[ctx.stm.id].localsymTable:
+        if symbol not in ctx.infoTables[ctx.currFuncId]:
+            ctx.infoTables[ctx.currFuncId][symbol] = {}
 
-        if stm.id not in info_tables[curr_func_id][symbol]:
-            info_tables[curr_func_id][symbol][stm.id] = {}
+        if ctx.stm.id not in ctx.infoTables[ctx.currFuncId][symbol]:
+            ctx.infoTables[ctx.currFuncId][symbol][ctx.stm.id] = {}
         
-        info_tables[curr_func_id][symbol][stm.id] = stm.symTable[stm.id].localsymTable[symbol]
+        ctx.infoTables[ctx.currFuncId][symbol][ctx.stm.id] = ctx.stm.symTable[ctx.stm.id].localsymTable[symbol]
 
 def p_else_stmt(p):
     """
@@ -2356,6 +2488,7 @@ def p_ExprSwitchStmt(p):
                      | SWITCH BeginSwitch SimpleStmt SEMICOLON LBRACE ExprCaseClauseMult EndSwitch RBRACE
                      | SWITCH LBRACE BeginSwitch ExprCaseClauseMult EndSwitch RBRACE
     """
+    ctx = p.lexer.context
     smtNode = None
     varNode = None
     casesNode = []
@@ -2376,7 +2509,7 @@ def p_ExprSwitchStmt(p):
     elif len(p) == 8:
         
         ## Check if dataType is supported
-        if p[2].dataType['level'] != 0 or not isOrdered(stm, p[2].dataType['name']):
+        if p[2].dataType['level'] != 0 or not isOrdered(ctx.stm, p[2].dataType['name']):
             raise TypeError(f"{p.lexer.lineno}: Unsupported type in switch condition!")
 
         ## Check if a case has been repeated
@@ -2408,7 +2541,7 @@ def p_ExprSwitchStmt(p):
             if isinstance(statement, FallthroughNode):
                 raise LogicalError(f"{p.lexer.lineno}: Fallthrough statement can't be used in the last case of the switch statement.")
     else:
-        if p[2].dataType['level'] != 0 or not isOrdered(stm, p[2].dataType['name']):
+        if p[2].dataType['level'] != 0 or not isOrdered(ctx.stm, p[2].dataType['name']):
             raise TypeError(f"{p.lexer.lineno}: Unsupported type in switch condition!")
 
         ## Check if a case has been repeated
@@ -2426,38 +2559,39 @@ def p_ExprSwitchStmt(p):
             if isinstance(statement, FallthroughNode):
                 raise LogicalError(f"{p.lexer.lineno}: Fallthrough statement can't be used in the last case of the switch statement.")
     
-    varNode.code.append(f"{stm.currentSwitchExpPlace} = {varNode.place}")
+    varNode.code.append(tac.assign(ctx.stm.currentSwitchExpPlace, varNode.place))
     p[0] = SwitchNode(smtNode, varNode, casesNode)
-    p[0].code.append(f"end_switch_{stm.switchStack[-1]}:")
-    stm.switchStack.pop()
-    stm.exitScope()
-    stm.currentSwitchExpPlace = None
-    stm.nextCase = 0
+    p[0].code.append(tac.label(f"end_switch_{ctx.stm.switchStack[-1]}"))
+    ctx.stm.switchStack.pop()
+    ctx.stm.exitScope()
+    ctx.stm.currentSwitchExpPlace = None
+    ctx.stm.nextCase = 0
 
 def p_BeginSwitch(p):
     """
     BeginSwitch : 
     """
-    if stm.currentLabel and stm.labels[stm.currentLabel]['lineno'] == p.lexer.lineno:
-        stm.labels[stm.currentLabel] = 'SWITCH'
-        stm.currentLabel = None
-    stm.newScope()
-    stm.switchStack.append(p.lexer.lineno)
-    stm.currentSwitchExpPlace = new_temp()
+    ctx = p.lexer.context
+    if ctx.stm.currentLabel and ctx.stm.labels[ctx.stm.currentLabel]['lineno'] == p.lexer.lineno:
+        ctx.stm.labels[ctx.stm.currentLabel] = 'SWITCH'
+        ctx.stm.currentLabel = None
+    ctx.stm.newScope()
+    ctx.stm.switchStack.append(p.lexer.lineno)
+    ctx.stm.currentSwitchExpPlace = ctx.newTemp()
 
 def p_EndSwitch(p):
     """
     EndSwitch : 
     """
-    global curr_func_id
-    for symbol in stm.symTable[stm.id].localsymTable:
-        if symbol not in info_tables[curr_func_id]:
-            info_tables[curr_func_id][symbol] = {}
+    ctx = p.lexer.context
+    for symbol in ctx.stm.symTable[ctx.stm.id].localsymTable:
+        if symbol not in ctx.infoTables[ctx.currFuncId]:
+            ctx.infoTables[ctx.currFuncId][symbol] = {}
 
-        if stm.id not in info_tables[curr_func_id][symbol]:
-            info_tables[curr_func_id][symbol][stm.id] = {}
+        if ctx.stm.id not in ctx.infoTables[ctx.currFuncId][symbol]:
+            ctx.infoTables[ctx.currFuncId][symbol][ctx.stm.id] = {}
         
-        info_tables[curr_func_id][symbol][stm.id] = stm.symTable[stm.id].localsymTable[symbol]
+        ctx.infoTables[ctx.currFuncId][symbol][ctx.stm.id] = ctx.stm.symTable[ctx.stm.id].localsymTable[symbol]
 
 def p_ExprCaseClauseMult(p):
     """
@@ -2474,17 +2608,18 @@ def p_ExprCaseClause(p):
     """
     ExprCaseClause : ExprSwitchCase COLON StatementList
     """
+    ctx = p.lexer.context
     if isinstance(p[1][0], CasesNode):
-        cond_res = new_temp()
+        cond_res = ctx.newTemp()
         code = []
-        code.append(f"{cond_res} = {stm.currentSwitchExpPlace} ==({p[1][0].dataType['name']}) {p[1][0].place}")
-        code.append(f"if not {cond_res} then goto case_{stm.nextCase}_{stm.switchStack[-1]}")
+        code.append(tac.binOp(cond_res, ctx.stm.currentSwitchExpPlace, '==', p[1][0].place, p[1][0].dataType['name']))
+        code.append(tac.ifNot(cond_res, f"case_{ctx.stm.nextCase}_{ctx.stm.switchStack[-1]}"))
         p[1].code.extend(code)
     else:
         # Default Node case
         pass
-    p[3].code.append(f"goto end_switch_{stm.switchStack[-1]}")
-    p[3].code.append(f"label case_{stm.nextCase}_{stm.switchStack[-1]}:")
+    p[3].code.append(tac.goto(f"end_switch_{ctx.stm.switchStack[-1]}"))
+    p[3].code.append(tac.label(f"label case_{ctx.stm.nextCase}_{ctx.stm.switchStack[-1]}"))
     p[0] = CasesNode(p[1], p[3])
     # print(p[0].code)
     
@@ -2493,8 +2628,9 @@ def p_ExprSwitchCase(p):
     ExprSwitchCase : CASE ExpressionList
                      | DEFAULT
     """
+    ctx = p.lexer.context
     if len(p) == 3:
-        stm.nextCase += 1
+        ctx.stm.nextCase += 1
         p[0] = NodeList([])
         if len(p[2]) > 1:
             raise SwitchCaseError("Complex expressions not allowed inside switch statement!")
@@ -2518,66 +2654,68 @@ def p_ForStmt(p):
             | FOR BeginFor RangeClause BlockStart Block BlockEnd EndFor
             | FOR BeginFor BlockStart Block BlockEnd EndFor
     """
+    ctx = p.lexer.context
     if len(p) == 7:
         p[0] = ForNode(None, p[4])
-        p[0].code = [f"begin_for_{stm.forStack[-1]}:"] + [f"poststmt_for_{stm.forStack[-1]}:"] + p[0].code + [f"goto begin_for_{stm.forStack[-1]}", f"end_for_{stm.forStack[-1]}:"]
+        p[0].code = [tac.label(f"begin_for_{ctx.stm.forStack[-1]}")] + [tac.label(f"poststmt_for_{ctx.stm.forStack[-1]}")] + p[0].code + [tac.goto(f"begin_for_{ctx.stm.forStack[-1]}"), tac.label(f"end_for_{ctx.stm.forStack[-1]}")]
     else:
         if isinstance(p[3], ForClauseNode) and p[3].children[0] is None and p[3].children[2] is None:
-            p[3].code = [f"begin_for_{stm.forStack[-1]}:"] + [f"poststmt_for_{stm.forStack[-1]}:"] + p[3].children[1].code + [f"if not {p[3].children[1].place} then goto end_for_{stm.forStack[-1]}"]
-            p[5].code.append(f"goto begin_for_{stm.forStack[-1]}")
-            p[5].code.append(f"end_for_{stm.forStack[-1]}:")
+            p[3].code = [tac.label(f"begin_for_{ctx.stm.forStack[-1]}")] + [tac.label(f"poststmt_for_{ctx.stm.forStack[-1]}")] + p[3].children[1].code + [tac.ifNot(p[3].children[1].place, f"end_for_{ctx.stm.forStack[-1]}")]
+            p[5].code.append(tac.goto(f"begin_for_{ctx.stm.forStack[-1]}"))
+            p[5].code.append(tac.label(f"end_for_{ctx.stm.forStack[-1]}"))
         elif isinstance(p[3], ForClauseNode):
             # initc = p[3][0]
             # condc = p[3][1]
             # postc = p[3][2]
-            temp = p[3].children[0].code + [f"begin_for_{stm.forStack[-1]}:"] + p[3].children[1].code
-            p[3].code = temp + [f"if not {p[3].children[1].place} then goto end_for_{stm.forStack[-1]}"]
+            temp = p[3].children[0].code + [tac.label(f"begin_for_{ctx.stm.forStack[-1]}")] + p[3].children[1].code
+            p[3].code = temp + [tac.ifNot(p[3].children[1].place, f"end_for_{ctx.stm.forStack[-1]}")]
             p[5].code.extend(p[3].children[2].code)
-            p[5].code.append(f"goto begin_for_{stm.forStack[-1]}")
-            p[5].code.append(f"end_for_{stm.forStack[-1]}:")
+            p[5].code.append(tac.goto(f"begin_for_{ctx.stm.forStack[-1]}"))
+            p[5].code.append(tac.label(f"end_for_{ctx.stm.forStack[-1]}"))
         else:
             if p[3].children[2].dataType['name'] == 'map':
                 pass
             else:
                 code = []
                 idx = p[3].children[0].place
-                code.append(f"{idx} = {idx} + 1")
+                code.append(tac.binOp(idx, idx, '+', 1))
                 elemptr = p[3].vartemp
                 elem = p[3].children[1].place
                 size = p[3].children[1].dataType['size']
-                code.append(f"{elemptr}.pointer = {elemptr}.pointer + {size}")
-                code.append(f"{elem} = *{elemptr}")
-                code.append(f"goto begin_for_{stm.forStack[-1]}")
-                code.append(f"end_for_{stm.forStack[-1]}")
+                code.append(tac.binOp(f"{elemptr}.pointer", f"{elemptr}.pointer", '+', size))
+                code.append(tac.assign(elem, f"*{elemptr}"))
+                code.append(tac.goto(f"begin_for_{ctx.stm.forStack[-1]}"))
+                code.append(tac.label(f"end_for_{ctx.stm.forStack[-1]}"))
                 p[5].code.extend(code)
         p[0] = ForNode(p[3], p[5])
     
-    stm.forStack.pop()
-    stm.exitScope()
+    ctx.stm.forStack.pop()
+    ctx.stm.exitScope()
 
 def p_BeginFor(p):
     """
     BeginFor : 
     """
-    if stm.currentLabel and stm.labels[stm.currentLabel]['lineno'] == p.lexer.lineno:
-        stm.labels[stm.currentLabel]['statementType'] = 'FOR'
-        stm.currentLabel = None
-    stm.newScope()
-    stm.forStack.append(p.lexer.lineno)
+    ctx = p.lexer.context
+    if ctx.stm.currentLabel and ctx.stm.labels[ctx.stm.currentLabel]['lineno'] == p.lexer.lineno:
+        ctx.stm.labels[ctx.stm.currentLabel]['statementType'] = 'FOR'
+        ctx.stm.currentLabel = None
+    ctx.stm.newScope()
+    ctx.stm.forStack.append(p.lexer.lineno)
 
 def p_EndFor(p):
     """
     EndFor : 
     """
-    global curr_func_id
-    for symbol in stm.symTable[stm.id].localsymTable:
-        if symbol not in info_tables[curr_func_id]:
-            info_tables[curr_func_id][symbol] = {}
+    ctx = p.lexer.context
+    for symbol in ctx.stm.symTable[ctx.stm.id].localsymTable:
+        if symbol not in ctx.infoTables[ctx.currFuncId]:
+            ctx.infoTables[ctx.currFuncId][symbol] = {}
 
-        if stm.id not in info_tables[curr_func_id][symbol]:
-            info_tables[curr_func_id][symbol][stm.id] = {}
+        if ctx.stm.id not in ctx.infoTables[ctx.currFuncId][symbol]:
+            ctx.infoTables[ctx.currFuncId][symbol][ctx.stm.id] = {}
         
-        info_tables[curr_func_id][symbol][stm.id] = stm.symTable[stm.id].localsymTable[symbol]
+        ctx.infoTables[ctx.currFuncId][symbol][ctx.stm.id] = ctx.stm.symTable[ctx.stm.id].localsymTable[symbol]
     
 def p_Condition(p):
     """
@@ -2594,6 +2732,7 @@ def p_ForClause(p):
     ForClause : InitStmt SEMICOLON Condition SEMICOLON PostStmt
                 | InitStmt SEMICOLON SEMICOLON PostStmt
     """
+    ctx = p.lexer.context
     if len(p) == 6:
         p[0] = ForClauseNode(p[1], p[3].children[1], p[5])
     else:
@@ -2604,8 +2743,8 @@ def p_ForClause(p):
             'size' : 4
         }
         trueNode = ExprNode(dt, label='true', operator=None, isConst=True, isAddressable=False, val='true')
-        trueNode.place = new_temp()
-        trueNode.code.append(f"{trueNode.place} = true")
+        trueNode.place = ctx.newTemp()
+        trueNode.code.append(tac.assign(trueNode.place, 'true'))
         # Absence of condition is equivalent to a FOR true statement
         p[0] = ForClauseNode(p[1], trueNode, p[4])
 
@@ -2619,9 +2758,10 @@ def p_PostStmt(p):
     """
     PostStmt :   SimpleStmt
     """
+    ctx = p.lexer.context
     if isinstance(p[1], ExprNode) and p[1].label == 'DEFINE':
         raise LogicalError("Short Variable Declaration not allowed in post statement of for loop.")
-    temp = [f"poststmt_for_{stm.forStack[-1]}:"]
+    temp = Code([tac.label(f"poststmt_for_{ctx.stm.forStack[-1]}")])
     p[0] = p[1]
     temp.extend(p[0].code)
     p[0].code = temp
@@ -2633,6 +2773,7 @@ def p_RangeClause(p):
     """
     RangeClause : RangeList RANGE Expr
     """
+    ctx = p.lexer.context
     rangeExprType = []
     if p[3].dataType['name'] in ['array', 'slice']:
         rangeExprType.append(constructDataType('int')) 
@@ -2666,40 +2807,40 @@ def p_RangeClause(p):
     for idx, var in enumerate(p[1]):
         if isinstance(var, IdentNode):
             # ShortVarDecl
-            # If shortvaldecl statement, insert into stm
-            var.dataType = deepcopy(rangeExprType[idx])
-            stm.add(var.label, {'dataType' : rangeExprType[idx], 'isConst' : False})
+            # If shortvaldecl statement, insert into ctx.stm
+            var.dataType = internType(rangeExprType[idx])
+            ctx.stm.add(var.label, {'dataType' : var.dataType, 'isConst' : False})
         elif isinstance(var, ExprNode):
             # Assignment
             # If assignment statement check for types
             if var.label != '_':
-                lastDeclaredEntry = stm.get(var.label)
+                lastDeclaredEntry = ctx.stm.get(var.label)
                 if lastDeclaredEntry != -1:
                     if lastDeclaredEntry['dataType'] != rangeExprType[idx]:
                         raise TypeError(f"{p.lexer.lineno}: Type of {var.label} does't match with {rangeExprType[idx]['name']}.")
             else:
-                var.dataType = deepcopy(rangeExprType[idx])
-                stm.add(var.label, {'dataType' : rangeExprType[idx], 'isConst' : False})
+                var.dataType = internType(rangeExprType[idx])
+                ctx.stm.add(var.label, {'dataType' : var.dataType, 'isConst' : False})
 
     p[0] = ForRangeNode(p[1], p[3])
 
-    code = []
-    idx = new_temp()
-    elemptr = var_new_temp()
-    elem = new_temp()
+    code = Code()
+    idx = ctx.newTemp()
+    elemptr = ctx.varNewTemp()
+    elem = ctx.newTemp()
     p[1][0].place = idx
-    scopeid = stm.getScope(p[1][0].label)
-    stm.symTable[scopeid].localsymTable[p[1][0].label]['tmp'] = idx
+    scopeid = ctx.stm.getScope(p[1][0].label)
+    ctx.stm.symTable[scopeid].localsymTable[p[1][0].label]['tmp'] = idx
     p[1][1].place = elem
-    scopeid = stm.getScope(p[1][1].label)
-    stm.symTable[scopeid].localsymTable[p[1][1].label]['tmp'] = elem
-    code.append(f"{idx} = 0")
-    code.append(f"{elemptr}.pointer = {p[3].place}.pointer")
-    code.append(f"{elem} = *{elemptr}.pointer")
-    code.append(f"begin_for_{stm.forStack[-1]}:")
-    cond_res = new_temp()
-    code.append(f"{cond_res} = {idx} <(int) {elemptr}.length")
-    code.append(f"if not {cond_res} then goto end_for_{stm.forStack[-1]}")
+    scopeid = ctx.stm.getScope(p[1][1].label)
+    ctx.stm.symTable[scopeid].localsymTable[p[1][1].label]['tmp'] = elem
+    code.append(tac.assign(idx, 0))
+    code.append(tac.assign(f"{elemptr}.pointer", f"{p[3].place}.pointer"))
+    code.append(tac.assign(elem, f"*{elemptr}.pointer"))
+    code.append(tac.label(f"begin_for_{ctx.stm.forStack[-1]}"))
+    cond_res = ctx.newTemp()
+    code.append(tac.binOp(cond_res, idx, '<', f"{elemptr}.length", 'int'))
+    code.append(tac.ifNot(cond_res, f"end_for_{ctx.stm.forStack[-1]}"))
     p[0].code = code
     p[0].vartemp = elemptr
 
@@ -2728,7 +2869,7 @@ def p_RangeList(p):
 ###################################################################################
 
 def p_error(p):
-    print("Syntax Error: ", p)
+    print("Syntax Error: ", p, file=sys.stderr)
 
 ###################################################################################
 #####################                                        ######################
@@ -2736,21 +2877,59 @@ def p_error(p):
 #####################                                        ######################
 ###################################################################################
 
-def genAutomaton(parser):
-    path_to_root = os.environ.get('PATH_TO_ROOT')
-    milestone = os.environ.get('MILESTONE')
-    if path_to_root is not None:
-        with open(path_to_root + "/src/Milestone" + str(milestone) + "/action.txt", "w") as f:
-            for key, val in parser.action.items():
-                f.writelines(f'{key} : {val}\n')
-
-        with open(path_to_root + "/src/Milestone" + str(milestone) + "/goto.txt", "w") as f:
-            for key, val in parser.goto.items():
-                f.writelines(f'{key} : {val}\n')
-
-def parse(parser, lexer, source_code):
-    # Trying to handle input
-    return parser.parse(source_code, lexer = lexer)
+# LALR tables are cached here and rebuilt whenever the grammar signature changes
+parsetab = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parsetab.pickle')
+
+def genAutomaton(parser, folder=os.path.dirname(os.path.abspath(__file__))):
+    # action.txt and goto.txt of the LALR automaton, for gen_automaton.py
+    with open(os.path.join(folder, "action.txt"), "w") as f:
+        for key, val in parser.action.items():
+            f.writelines(f'{key} : {val}\n')
+
+    with open(os.path.join(folder, "goto.txt"), "w") as f:
+        for key, val in parser.goto.items():
+            f.writelines(f'{key} : {val}\n')
+
+# The lexer and parser are built once per process and shared by every package
+# compiled in it; see getParser()
+_lexer = None
+_parser = None
+_parserLock = threading.Lock()
+
+def getParser():
+    global _lexer, _parser
+    with _parserLock:
+        if _parser is None:
+            _lexer = lex.lex()
+            _parser, _ = yacc.yacc(picklefile=parsetab)
+    return _parser, _lexer
+
+def parse(ctx, source_code):
+    # Each parse gets its own lexer state (input, position, lineno) cloned from
+    # the shared lexer so that imports can be compiled from inside a parse.
+    # The lexer carries the context to the grammar actions; the parser's own
+    # state is per context so that compilations can run on threads
+    with passTiming(ctx, 'tables'):
+        parser, lexer = getParser()
+    if ctx.parser is None:
+        ctx.parser = copy(parser)
+        if ctx.passTimer is not None:
+            ctx.parser.productions = ctx.passTimer.timedProductions(parser.productions)
+    lexer = lexer.clone()
+    if not isinstance(source_code, str):
+        lexer.input_stream(source_code)
+    elif ctx.tokenBuffer:
+        with passTiming(ctx, 'lex'):
+            lexer = lex.TokenBuffer(lexer, source_code)
+    else:
+        lexer.input(source_code)
+    if ctx.passTimer is not None:
+        ctx.passTimer.timedLexer(lexer)
+    lexer.context = ctx
+    if ctx.cancelEvent is not None:
+        lexer.checkpoint = ctx.checkCancelled
+    with passTiming(ctx, 'parse'):
+        return ctx.parser.parse(lexer = lexer)
 
 def writeOutput(parser_out, output_file):
     if parser_out is None:
@@ -2765,13 +2944,13 @@ def df(root, level):
         for child in root.children:
             df(child, level+1)
 
-def create_sym_tables(path_to_folder):
+def create_sym_tables(ctx, path_to_folder):
     if not os.path.exists(path_to_folder):
         os.mkdir(path_to_folder)
 
-    for key in info_tables:
+    for key in ctx.infoTables:
         filename = os.path.join(path_to_folder, key) + ".csv"
-        info = info_tables[key]
+        info = ctx.infoTables[key]
         dict = []
         i = 0
         for item in info:
@@ -2790,25 +2969,52 @@ def create_sym_tables(path_to_folder):
 
             writer.writerows(dict)
     
-def buildAndCompile(input_file):
-    global target_folder
-
-    target_folder = os.path.dirname(os.path.join(os.getcwd(),input_file))
-    source_code = None
+def compilePackage(ctx, input_file, source_code=None):
+    # source_code: contents to compile in place of those of input_file
+    ctx.targetFolder = os.path.dirname(os.path.join(os.getcwd(),input_file))
+    if source_code is None and ctx.streamInput:
+        source_code = lex.read_chunks(input_file)
+    elif source_code is None:
+        with open(input_file, 'r') as f:
+            source_code = f.read()
+    return parse(ctx, source_code)
+
+def lexFile(ctx, input_file, source_code=None):
+    # Tokens of the Go file at input_file (or of source_code in its place)
+    with passTiming(ctx, 'tables'):
+        _, lexer = getParser()
+    lexer = lexer.clone()
+    lexer.lineno = 1
+    if source_code is None:
+        with open(input_file, 'r') as f:
+            source_code = f.read()
+    lexer.input(source_code)
+    if ctx.passTimer is not None:
+        ctx.passTimer.timedLexer(lexer)
+    return list(iter(lexer.token, None))
+
+def buildAndCompile(input_file, ctx=None, source_code=None):
+    # AST (with its 3AC) and symbol table of the Go file at input_file, or of
+    # source_code in its place.  Writes the .output and .symTables debug
+    # artifacts if the context asks for them
+    if ctx is None:
+        ctx = CompilationContext(debug={'ast', 'symtables'})
     path_to_source_code = input_file
     output_file = path_to_source_code[:-2] + "output"
-    with open(path_to_source_code, 'r') as f:
-        source_code = f.read()
-    lexer = lex.lex()
-    parser, _ = yacc.yacc()
-    genAutomaton(parser)
-    parser_out = parse(parser, lexer, source_code)
+    ctx.importChain.append(os.path.realpath(path_to_source_code))
+    parser_out = compilePackage(ctx, path_to_source_code, source_code)
+    ctx.importChain.pop()
+    if parser_out is None:
+        raise ValueError("Invalid output from parser.")
     # df(parser_out, 0)
-    writeOutput(parser_out, output_file)
-    create_sym_tables(os.path.join(os.getcwd(), path_to_source_code[:-2]) + "symTables")
-    print("Writing 3AC")
-    return parser_out, stm
+    with passTiming(ctx, 'output'):
+        if 'ast' in ctx.debug:
+            writeOutput(parser_out, output_file)
+        if 'symtables' in ctx.debug:
+            create_sym_tables(ctx, os.path.join(os.getcwd(), path_to_source_code[:-2]) + "symTables")
+    if driverTrace.info:
+        driverTrace.log('info', "Writing 3AC")
+    return parser_out, ctx.stm
 
 if __name__ == '__main__':
     buildAndCompile(sys.argv[1])
-    
@@ -0,0 +1,85 @@
+import os, sys, hashlib, pickle, threading
+
+## Compiled package cache
+##
+## An imported package is stored with its symbol table (the SymTableMaker kept
+## in stm.pkgs), its 3AC, the symbol table dumps of its functions and the
+## number of temporaries it used.  Entries are content addressed: the key is
+## the hash of the package source together with the hash of the compiler
+## itself, and an entry remembers the source hashes of every package it
+## imported, so editing the compiler, the package or any of its imports
+## invalidates it.
+
+## Modules whose contents make up the compiler version
+compilerFiles = ['lexer.py', 'parser.py', 'scope.py', 'utils.py', 'tac.py', 'context.py', 'pkgcache.py', 'ply/lex.py', 'ply/yacc.py']
+
+_compilerHash = None
+# (path, mtime, size) -> source hash
+_sourceHashes = {}
+
+def compilerHash():
+    global _compilerHash
+    if _compilerHash is None:
+        h = hashlib.sha256(sys.version.encode())
+        root = os.path.dirname(os.path.realpath(__file__))
+        for name in compilerFiles:
+            with open(os.path.join(root, name), 'rb') as f:
+                h.update(f.read())
+        _compilerHash = h.hexdigest()
+    return _compilerHash
+
+def sourceHash(path):
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_mtime_ns, st.st_size)
+    if key not in _sourceHashes:
+        with open(path, 'rb') as f:
+            _sourceHashes[key] = hashlib.sha256(f.read()).hexdigest()
+    return _sourceHashes[key]
+
+def defaultFolder():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'go-mips', 'packages')
+
+class PackageCache:
+    def __init__(self, folder=None):
+        self.folder = folder or defaultFolder()
+        self.hits = 0
+        self.misses = 0
+
+    def entryPath(self, path):
+        key = hashlib.sha256((compilerHash() + sourceHash(path)).encode()).hexdigest()
+        return os.path.join(self.folder, key[:2], key + '.pkg')
+
+    def load(self, path):
+        # Returns the stored entry, or None if there is none or it is stale
+        try:
+            with open(self.entryPath(path), 'rb') as f:
+                entry = pickle.load(f)
+            for dep, depHash in entry['deps']:
+                if sourceHash(dep) != depHash:
+                    entry = None
+                    break
+        except FileNotFoundError:
+            entry = None
+        except Exception:
+            # Unreadable or truncated entry, it is rewritten on store
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def store(self, path, entry):
+        # entry: a compiled unit, see parser.compileUnit; failing to write
+        # the cache never fails the compilation
+        entryPath = self.entryPath(path)
+        tmpPath = f"{entryPath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(entryPath), exist_ok=True)
+            with open(tmpPath, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpPath, entryPath)
+        except (OSError, pickle.PicklingError, RecursionError):
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
@@ -39,10 +39,26 @@ import types
 import copy
 import os
 import inspect
+import array
+import codecs
+import io
+import mmap
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
 
 # Assumed length of tab
 TABLENGTH = 4
 
+# Go automatic semicolon insertion: a newline (or the end of the input) that
+# directly follows one of these tokens is returned as a SEMICOLON token
+SEMICOLON_TRIGGERS = frozenset([
+    'IDENT', 'FLOAT', 'INT', 'IMAG', 'RUNE', 'STRING', 'BREAK', 'CONTINUE',
+    'FALLTHROUGH', 'RETURN', 'INC', 'DEC', 'RPAREN', 'RBRACK', 'RBRACE',
+])
+
 # This tuple contains acceptable string types
 StringTypes = (str, bytes)
 
@@ -58,6 +74,8 @@ class LexError(Exception):
 
 # Token class.  This class is used to represent the tokens produced.
 class LexToken(object):
+    __slots__ = ('type', 'value', 'lineno', 'lexpos', 'lexcol', 'lexer', 'endlineno', 'endlexpos')
+
     def __repr__(self):
         return f'LexToken({self.type},{self.value!r},{self.lineno},{self.lexcol},{self.lexpos})'
 
@@ -110,12 +128,15 @@ class Lexer:
         self.lexstateignore = {}      # Dictionary of ignored characters for each state
         self.lexstateerrorf = {}      # Dictionary of error functions for each state
         self.lexstateeoff = {}        # Dictionary of eof functions for each state
+        self.lexstatefast = {}        # Dictionary of single-character dispatch tables for each state
         self.lexreflags = 0           # Optional re compile flags
         self.lexdata = None           # Actual input data (as a string)
         self.lexpos = 0               # Current position in input text
         self.lexlen = 0               # Length of the input text
         self.lexerrorf = None         # Error rule (if any)
         self.lexeoff = None           # EOF rule (if any)
+        self.lexfast = {}             # Maps a first character to the literal rules (text, type)
+                                      # that are the only rules able to match at that character
         self.lextokens = None         # List of valid tokens
         self.lexignore = ''           # Ignored characters
         self.lexliterals = ''         # Literal characters that can be passed through
@@ -123,6 +144,11 @@ class Lexer:
         self.lineno = 1               # Current line number
         self.lexcol = 1               # Column number of current token
         self.prevtok = None           # Previous token
+        self.lexbase = 0              # Offset of lexdata[0] in the whole input (streamed input)
+        self.lexstream = None         # Iterator over the remaining input chunks (streamed input)
+        self.lexpending = ''          # Text read from lexstream after the last complete line
+        self.lexdelimiters = {}       # Multi-line token delimiters: opener -> closer
+        self.lexwait = {}             # First char -> [(opener, closer)] checked while streaming
 
     def clone(self, object=None):
         c = copy.copy(self)
@@ -159,6 +185,74 @@ class Lexer:
         self.lexpos = 0
         self.lexcol = 1
         self.lexlen = len(s)
+        self.prevtok = None
+        self.lexbase = 0
+        self.lexstream = None
+        self.lexwait = {}
+
+    # ------------------------------------------------------------
+    # input_stream() - Lex from an iterable of text chunks
+    #
+    # Only a window of complete lines is held in lexdata.  When the
+    # window is used up it is replaced by the next lines of input.
+    # A token that can span lines must open with one of the
+    # lexer's multi-line delimiters; when one is seen the window is
+    # extended up to its closer before the token is matched.
+    # ------------------------------------------------------------
+    def input_stream(self, chunks):
+        self.input('')
+        self.lexstream = iter(chunks)
+        self.lexpending = ''
+        self.lexwait = {}
+        for opener, closer in self.lexdelimiters.items():
+            self.lexwait.setdefault(opener[0], []).append((opener, closer))
+        self.readlines()
+
+    # ------------------------------------------------------------
+    # readlines() - Append the next complete lines of a streamed input
+    # to lexdata.  Returns False once the stream is exhausted.
+    # ------------------------------------------------------------
+    def readlines(self):
+        if self.lexstream is None:
+            return False
+        parts = [self.lexpending]
+        for chunk in self.lexstream:
+            nl = chunk.rfind('\n')
+            if nl >= 0:
+                parts.append(chunk[:nl+1])
+                self.lexpending = chunk[nl+1:]
+                break
+            parts.append(chunk)
+        else:
+            self.lexstream = None
+            self.lexpending = ''
+        text = ''.join(parts)
+        self.lexdata += text
+        self.lexlen = len(self.lexdata)
+        return len(text) > 0
+
+    # ------------------------------------------------------------
+    # refill() - Replace a used up window of a streamed input
+    # ------------------------------------------------------------
+    def refill(self, lexpos, lexcol):
+        self.lexbase += lexpos
+        self.lexdata = ''
+        self.lexpos = 0
+        self.lexcol = lexcol
+        return self.readlines()
+
+    # ------------------------------------------------------------
+    # complete() - Make sure that a multi-line token starting at
+    # lexpos is entirely inside the window
+    # ------------------------------------------------------------
+    def complete(self, lexpos):
+        for opener, closer in self.lexwait[self.lexdata[lexpos]]:
+            if self.lexdata.startswith(opener, lexpos):
+                start = lexpos + len(opener)
+                while self.lexdata.find(closer, start) < 0:
+                    start = max(start, self.lexlen - len(closer) + 1)
+                    if not self.readlines():
+                        break
 
     # ------------------------------------------------------------
     # begin() - Changes the lexing state
@@ -171,6 +265,7 @@ class Lexer:
         self.lexignore = self.lexstateignore.get(state, '')
         self.lexerrorf = self.lexstateerrorf.get(state, None)
         self.lexeoff = self.lexstateeoff.get(state, None)
+        self.lexfast = self.lexstatefast.get(state, {})
         self.lexstate = state
 
     # ------------------------------------------------------------
@@ -207,40 +302,53 @@ class Lexer:
     # ------------------------------------------------------------
     def token(self):
         # Make local copies of frequently referenced attributes
-        if self.lexdata[-1] != "\n":
-            self.lexdata = self.lexdata + "\n"
-            self.lexlen += 1
         lexpos    = self.lexpos
         lexlen    = self.lexlen
         lexcol    = self.lexcol
         lexignore = self.lexignore
+        lexfast   = self.lexfast
+        lexwait   = self.lexwait
+        lexbase   = self.lexbase
         lexdata   = self.lexdata
 
         while lexpos < lexlen:
-            to_semicolon = False
             # This code provides some short-circuit code for whitespace, tabs, and other ignored characters
-            if lexdata[lexpos] in lexignore:
-                if lexdata[lexpos] == '\n':
-                    if self.prevtok  != None and self.prevtok.type in ["IDENT", "FLOAT", "INT", "IMAG", "RUNE", "STRING", "BREAK", "CONTINUE", "FALLTHROUGH", "RETURN", "INC", "DEC", "RPAREN", "RBRACK", "RBRACE"]:
-                        self.lexdata = lexdata[:lexpos] + ';' + lexdata[lexpos:]
-                        lexlen += 1
-                        self.lexlen += 1
-                        lexdata = self.lexdata
-                        to_semicolon = True
-                    else:
-                        lexcol = 1
-                        self.lineno += 1
-
-                        
-                elif lexdata[lexpos] == '\t':
+            c = lexdata[lexpos]
+            if c in lexignore:
+                if c == '\n':
+                    if self.prevtok is not None and self.prevtok.type in SEMICOLON_TRIGGERS:
+                        # The newline itself is left for the next call to consume
+                        return self.semicolon(lexpos, lexcol)
+                    lexcol = 1
+                    self.lineno += 1
+                elif c == '\t':
                     lexcol += TABLENGTH
                     # lexcol -= (lexcol%TABLENGTH)
                 else:
                     lexcol += 1
-                
-                if not to_semicolon:
-                    lexpos += 1
-                    continue
+                lexpos += 1
+                continue
+
+            if c in lexwait:
+                self.complete(lexpos)
+                lexdata = self.lexdata
+                lexlen  = self.lexlen
+
+            # Operators and punctuation: no other rule can start with c, so the
+            # first literal (in master regex order) that matches is the token
+            if c in lexfast:
+                for text, toktype in lexfast[c]:
+                    if lexdata.startswith(text, lexpos):
+                        tok = LexToken()
+                        tok.value = text
+                        tok.type = toktype
+                        tok.lineno = self.lineno
+                        tok.lexpos = lexbase + lexpos
+                        tok.lexcol = lexcol
+                        self.lexcol = lexcol + len(text)
+                        self.lexpos = lexpos + len(text)
+                        self.prevtok = tok
+                        return tok
 
             # Look for a regular expression match
             for lexre, lexindexfunc in self.lexre:
@@ -252,7 +360,7 @@ class Lexer:
                 tok = LexToken()
                 tok.value = m.group()
                 tok.lineno = self.lineno
-                tok.lexpos = lexpos
+                tok.lexpos = lexbase + lexpos
                 tok.lexcol = lexcol
 
                 lexcol += len(m.group())
@@ -297,7 +405,7 @@ class Lexer:
                     tok.value = lexdata[lexpos]
                     tok.lineno = self.lineno
                     tok.type = tok.value
-                    tok.lexpos = lexpos
+                    tok.lexpos = lexbase + lexpos
                     self.lexpos = lexpos + 1
                     self.prevtok = tok
                     return tok
@@ -309,7 +417,7 @@ class Lexer:
                     tok.lineno = self.lineno
                     tok.type = 'error'
                     tok.lexer = self
-                    tok.lexpos = lexpos
+                    tok.lexpos = lexbase + lexpos
                     self.lexpos = lexpos
                     newtok = self.lexerrorf(tok)
                     if lexpos == self.lexpos:
@@ -326,12 +434,22 @@ class Lexer:
                 raise LexError(f"Illegal character {lexdata[lexpos]!r} at index {lexpos}",
                                lexdata[lexpos:])
 
+        # Move on to the next window of a streamed input
+        if self.lexstream is not None:
+            if self.refill(lexpos, lexcol):
+                return self.token()
+            lexpos = 0
+
+        # A final line without a trailing newline still ends its statement
+        if self.prevtok is not None and self.prevtok.type in SEMICOLON_TRIGGERS:
+            return self.semicolon(lexpos, lexcol)
+
         if self.lexeoff:
             tok = LexToken()
             tok.type = 'eof'
             tok.value = ''
             tok.lineno = self.lineno
-            tok.lexpos = lexpos
+            tok.lexpos = lexbase + lexpos
             tok.lexer = self
             self.lexpos = lexpos
             newtok = self.lexeoff(tok)
@@ -343,6 +461,22 @@ class Lexer:
             raise RuntimeError('No input string given with input()')
         return None
 
+    # ------------------------------------------------------------
+    # semicolon() - Return an automatically inserted SEMICOLON token
+    # at lexpos.  The input buffer itself is never modified.
+    # ------------------------------------------------------------
+    def semicolon(self, lexpos, lexcol):
+        tok = LexToken()
+        tok.type = 'SEMICOLON'
+        tok.value = ';'
+        tok.lineno = self.lineno
+        tok.lexpos = self.lexbase + lexpos
+        tok.lexcol = lexcol
+        self.lexpos = lexpos
+        self.lexcol = lexcol + 1
+        self.prevtok = tok
+        return tok
+
     # Iterator interface
     def __iter__(self):
         return self
@@ -353,6 +487,120 @@ class Lexer:
             raise StopIteration
         return t
 
+# -----------------------------------------------------------------------------
+#                           === Token Buffer ===
+#
+# TokenBuffer lexes a whole input up front and keeps the tokens in parallel
+# arrays (type id, start/end offset, line, column) rather than as one object
+# per token.  Token objects are only created as the parser asks for them, with
+# values sliced out of the input; the few tokens whose value is not simply
+# their source text (e.g. inserted semicolons) are kept in a side table.
+#
+# A TokenBuffer provides token(), lineno and lexpos, so it can be handed to
+# the parser in place of a Lexer.  lineno follows the lexer it was built
+# from: after a token has been returned it is the line the lexer was on
+# right after producing that token.
+# -----------------------------------------------------------------------------
+
+class TokenBuffer(object):
+    def __init__(self, lexer, data):
+        self.lexdata   = data
+        self.typenames = []                # Token type names, indexed by type id
+        self.types     = array.array('H')  # Type id of each token
+        self.starts    = array.array('I')  # Start offset of each token in lexdata
+        self.ends      = array.array('I')  # End offset of each token in lexdata
+        self.lines     = array.array('I')  # Line number of each token
+        self.cols      = array.array('I')  # Column number of each token
+        self.values    = {}                # Token index -> value, if not lexdata[start:end]
+        self.linesafter = {}               # Token index -> lexer line after it, if not its own line
+
+        typeids = {}
+        lexer.input(data)
+        tok = lexer.token()
+        while tok is not None:
+            i = len(self.types)
+            typeid = typeids.get(tok.type)
+            if typeid is None:
+                typeid = typeids[tok.type] = len(self.typenames)
+                self.typenames.append(tok.type)
+            end = max(lexer.lexpos, tok.lexpos)
+            self.types.append(typeid)
+            self.starts.append(tok.lexpos)
+            self.ends.append(end)
+            self.lines.append(tok.lineno)
+            self.cols.append(getattr(tok, 'lexcol', 0))
+            if tok.value != data[tok.lexpos:end]:
+                self.values[i] = tok.value
+            if lexer.lineno != tok.lineno:
+                self.linesafter[i] = lexer.lineno
+            tok = lexer.token()
+
+        self.endlineno = lexer.lineno
+        self.ntokens = len(self.types)
+        self.pos = 0
+        self.lineno = 1
+        self.lexpos = 0
+
+    def __len__(self):
+        return self.ntokens
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.ntokens:
+            raise IndexError('token index out of range')
+        tok = LexToken()
+        tok.type = self.typenames[self.types[i]]
+        value = self.values.get(i)
+        if value is None:
+            value = self.lexdata[self.starts[i]:self.ends[i]]
+        tok.value = value
+        tok.lineno = self.lines[i]
+        tok.lexpos = self.starts[i]
+        tok.lexcol = self.cols[i]
+        return tok
+
+    # Return the next token, or None at the end of the input
+    def token(self):
+        i = self.pos
+        if i >= self.ntokens:
+            self.lineno = self.endlineno
+            self.lexpos = len(self.lexdata)
+            return None
+        self.pos = i + 1
+        self.lineno = self.linesafter.get(i, self.lines[i])
+        self.lexpos = self.ends[i]
+        return self[i]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        t = self.token()
+        if t is None:
+            raise StopIteration
+        return t
+
+# -----------------------------------------------------------------------------
+# read_chunks()
+#
+# Memory-maps a source file and yields its text in chunks of about chunksize
+# bytes, for use with Lexer.input_stream().  The text is decoded
+# incrementally, so multi-byte characters split across chunks are handled, and
+# newlines are translated the same way as a file opened in text mode.
+# -----------------------------------------------------------------------------
+
+def read_chunks(filename, chunksize=1 << 20, encoding='utf-8'):
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                for start in range(0, len(m), chunksize):
+                    text = decoder.decode(m[start:start + chunksize])
+                    if text:
+                        yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
 # -----------------------------------------------------------------------------
 #                           ==== Lex Builder ===
 #
@@ -417,6 +665,126 @@ def _form_master_re(relist, reflags, ldict, toknames):
         rlist, rre, rnames = _form_master_re(relist[m:], reflags, ldict, toknames)
         return (llist+rlist), (lre+rre), (lnames+rnames)
 
+# -----------------------------------------------------------------------------
+# _first_chars()
+#
+# Over-approximates the set of ASCII characters that a match of the given
+# regular expression can begin with.  Returns None if the expression can
+# match the empty string, in which case it may match anywhere.
+# -----------------------------------------------------------------------------
+
+_ascii_chars = frozenset(map(chr, range(128)))
+
+_category_chars = {
+    sre_parse.CATEGORY_DIGIT: frozenset('0123456789'),
+    sre_parse.CATEGORY_SPACE: frozenset(' \t\n\r\f\v'),
+    sre_parse.CATEGORY_WORD:  frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_'),
+}
+
+def _set_first(items):
+    chars = set()
+    negate = False
+    for op, av in items:
+        if op is sre_parse.NEGATE:
+            negate = True
+        elif op is sre_parse.LITERAL:
+            chars.add(chr(av))
+        elif op is sre_parse.RANGE:
+            chars.update(map(chr, range(av[0], min(av[1], 127) + 1)))
+        elif op is sre_parse.CATEGORY and av in _category_chars:
+            chars |= _category_chars[av]
+        else:
+            return set(_ascii_chars)
+    if negate:
+        return set(_ascii_chars - chars)
+    return chars
+
+def _seq_first(items):
+    first = set()
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            first.add(chr(av))
+            return first, False
+        elif op is sre_parse.IN:
+            first |= _set_first(av)
+            return first, False
+        elif op in (sre_parse.NOT_LITERAL, sre_parse.ANY):
+            first |= _ascii_chars
+            return first, False
+        elif op is sre_parse.AT:
+            continue
+        elif op is sre_parse.SUBPATTERN:
+            f, nullable = _seq_first(av[-1])
+        elif op is sre_parse.BRANCH:
+            f, nullable = set(), False
+            for branch in av[1]:
+                bf, bnullable = _seq_first(branch)
+                f |= bf
+                nullable = nullable or bnullable
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            f, nullable = _seq_first(av[2])
+            nullable = nullable or av[0] == 0
+        else:
+            f, nullable = _ascii_chars, True
+        first |= f
+        if not nullable:
+            return first, False
+    return first, True
+
+def _first_chars(regex, reflags):
+    try:
+        first, nullable = _seq_first(sre_parse.parse(regex, reflags))
+    except Exception:
+        return None
+    return None if nullable else first
+
+# Returns the text matched by regex if it only matches a single fixed string
+def _literal_text(regex, reflags):
+    try:
+        items = list(sre_parse.parse(regex, reflags))
+    except Exception:
+        return None
+    if not items or any(op is not sre_parse.LITERAL for op, av in items):
+        return None
+    return ''.join(chr(av) for op, av in items)
+
+# -----------------------------------------------------------------------------
+# _form_fast_dispatch()
+#
+# Builds the single-character dispatch table used by Lexer.token() for
+# operators and punctuation.  A character gets an entry only when it starts
+# one or more literal string rules and cannot start any other rule, so the
+# table always picks the same token as the master regular expression.
+# -----------------------------------------------------------------------------
+
+def _form_fast_dispatch(funcsym, strsym, reflags, toknames):
+    if reflags & re.IGNORECASE:
+        return {}
+
+    blocked = set()
+    literals = []
+    for fname, f in funcsym:
+        first = _first_chars(_get_regex(f), reflags)
+        if first is None:
+            return {}
+        blocked |= first
+
+    for name, r in strsym:
+        text = _literal_text(r, reflags)
+        if text is None or name.find('ignore_') > 0:
+            first = _first_chars(r, reflags)
+            if first is None:
+                return {}
+            blocked |= first
+        else:
+            literals.append((text, toknames[name]))
+
+    dispatch = {}
+    for text, tokname in literals:
+        if text[0] not in blocked:
+            dispatch.setdefault(text[0], []).append((text, tokname))
+    return dispatch
+
 # -----------------------------------------------------------------------------
 # def _statetoken(s,names)
 #
@@ -853,8 +1221,17 @@ def lex(*, module=None, object=None, debug=False,
             lexobj.lexstateretext[state].extend(lexobj.lexstateretext['INITIAL'])
             lexobj.lexstaterenames[state].extend(lexobj.lexstaterenames['INITIAL'])
 
+    # Operator fast path.  Inclusive states share INITIAL's rules, so only
+    # INITIAL gets a table
+    lexobj.lexstatefast['INITIAL'] = _form_fast_dispatch(linfo.funcsym['INITIAL'], linfo.strsym['INITIAL'],
+                                                        reflags, linfo.toknames)
+
+    # Tokens that may span lines when the input is streamed
+    lexobj.lexdelimiters = dict(ldict.get('multiline_delimiters', {}))
+
     lexobj.lexstateinfo = stateinfo
     lexobj.lexre = lexobj.lexstatere['INITIAL']
+    lexobj.lexfast = lexobj.lexstatefast['INITIAL']
     lexobj.lexretext = lexobj.lexstateretext['INITIAL']
     lexobj.lexreflags = reflags
 
@@ -64,7 +64,12 @@
 import re
 import types
 import sys
+import os
 import inspect
+import pickle
+import tempfile
+
+__tabversion__ = '3.10'
 
 #-----------------------------------------------------------------------------
 #                     === User configurable parameters ===
@@ -116,6 +121,10 @@ class NullLogger(object):
 class YaccError(Exception):
     pass
 
+# Exception raised for a cached table file written by a different version of yacc
+class VersionError(YaccError):
+    pass
+
 # Format the result message that the parser produces when running in debug mode.
 def format_result(r):
     repr_str = repr(r)
@@ -154,6 +163,8 @@ def format_stack_entry(r):
 #        .endlexpos  = Ending lex position (optional, set automatically)
 
 class YaccSymbol:
+    __slots__ = ('type', 'value', 'lineno', 'endlineno', 'lexpos', 'endlexpos')
+
     def __str__(self):
         return self.type
 
@@ -271,6 +282,18 @@ class LRParser:
     # character index.
 
     def parse(self, input=None, lexer=None, debug=False, tracking=False):
+        # parse() may be re-entered from inside a grammar rule (for instance to
+        # compile an imported package with the same parser object).  The outer
+        # parse keeps its stacks in locals, but errok()/restart() and the token
+        # function go through self, so put those back once the inner parse ends.
+        outer = self.__dict__.get('statestack'), self.__dict__.get('symstack'), self.__dict__.get('token')
+        try:
+            return self._parse(input, lexer, debug, tracking)
+        finally:
+            if outer[0] is not None:
+                self.statestack, self.symstack, self.token = outer
+
+    def _parse(self, input=None, lexer=None, debug=False, tracking=False):
         # If debugging has been specified as a flag, turn it into a logging object
         if isinstance(debug, int) and debug:
             debug = PlyLogger(sys.stderr)
@@ -296,6 +319,10 @@ class LRParser:
         pslice.lexer = lexer
         pslice.parser = self
 
+        # A lexer may carry a checkpoint function called before every
+        # reduction, which can stop the parse by raising
+        checkpoint = getattr(lexer, 'checkpoint', None)
+
         # If input was supplied, pass to lexer
         if input is not None:
             lexer.input(input)
@@ -366,6 +393,8 @@ class LRParser:
 
                 if t < 0:
                     # reduce a symbol on the stack, emit a production
+                    if checkpoint is not None:
+                        checkpoint()
                     p = prod[-t]
                     pname = p.name
                     plen  = p.len
@@ -683,6 +712,35 @@ class Production(object):
         if self.func:
             self.callable = pdict[self.func]
 
+# -----------------------------------------------------------------------------
+# class MiniProduction
+#
+# This class is a stripped down version of Production that's used when
+# the parser is loaded from a cached table. It contains only the
+# information needed to execute reductions.
+# -----------------------------------------------------------------------------
+
+class MiniProduction(object):
+    def __init__(self, str, name, len, func, file, line):
+        self.name     = name
+        self.len      = len
+        self.func     = func
+        self.callable = None
+        self.file     = file
+        self.line     = line
+        self.str      = str
+
+    def __str__(self):
+        return self.str
+
+    def __repr__(self):
+        return 'MiniProduction(%s)' % self.str
+
+    # Bind the production function name to a callable
+    def bind(self, pdict):
+        if self.func:
+            self.callable = pdict[self.func]
+
 # -----------------------------------------------------------------------------
 # class LRItem
 #
@@ -1303,13 +1361,50 @@ class LALRError(YaccError):
 
 
 # -----------------------------------------------------------------------------
-#                             == LRTable ==
+#                            == LRTable ==
+#
+# This basic class represents a basic table of LR parsing information.
+# Methods for generating the tables are not defined here.  They are defined
+# in the derived class LRGeneratedTable.
+# -----------------------------------------------------------------------------
+
+class LRTable(object):
+    def __init__(self):
+        self.lr_action = None
+        self.lr_goto = None
+        self.lr_productions = None
+
+    # Load the parsing tables from a pickle file written by pickle_table().
+    # Returns the grammar signature the tables were generated for.
+    def read_pickle(self, filename):
+        with open(filename, 'rb') as in_f:
+            tabversion = pickle.load(in_f)
+            if tabversion != __tabversion__:
+                raise VersionError('yacc table file version is out of date')
+            signature      = pickle.load(in_f)
+            self.lr_action = pickle.load(in_f)
+            self.lr_goto   = pickle.load(in_f)
+            productions    = pickle.load(in_f)
+
+        self.lr_productions = []
+        for p in productions:
+            self.lr_productions.append(MiniProduction(*p))
+
+        return signature
+
+    # Bind all production function names to callable objects in pdict
+    def bind_callables(self, pdict):
+        for p in self.lr_productions:
+            p.bind(pdict)
+
+# -----------------------------------------------------------------------------
+#                             == LRGeneratedTable ==
 #
 # This class implements the LR table generation algorithm.  There are no
-# public methods.
+# public methods except for pickle_table()
 # -----------------------------------------------------------------------------
 
-class LRTable:
+class LRGeneratedTable(LRTable):
     def __init__(self, grammar, log=None):
         self.grammar = grammar
 
@@ -1341,11 +1436,6 @@ class LRTable:
         self.grammar.compute_follow()
         self.lr_parse_table()
 
-    # Bind all production function names to callable objects in pdict
-    def bind_callables(self, pdict):
-        for p in self.lr_productions:
-            p.bind(pdict)
-
     # Compute the LR(0) closure operation on I, where I is a set of LR(0) items.
 
     def lr0_closure(self, I):
@@ -1923,6 +2013,37 @@ class LRTable:
             goto[st] = st_goto
             st += 1
 
+    # -----------------------------------------------------------------------------
+    # pickle_table()
+    #
+    # This function pickles the LR parsing tables to a supplied file object. The
+    # file is written to a temporary name first and then renamed into place so
+    # that a concurrent reader never sees a partially written table.
+    # -----------------------------------------------------------------------------
+
+    def pickle_table(self, filename, signature=''):
+        outdir = os.path.dirname(os.path.abspath(filename))
+        fd, tmpname = tempfile.mkstemp(dir=outdir, prefix='.parsetab-')
+        try:
+            with os.fdopen(fd, 'wb') as outf:
+                pickle.dump(__tabversion__, outf, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(signature, outf, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self.lr_action, outf, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self.lr_goto, outf, pickle.HIGHEST_PROTOCOL)
+
+                outp = []
+                for p in self.lr_productions:
+                    if p.func:
+                        outp.append((p.str, p.name, p.len, p.func, os.path.basename(p.file), p.line))
+                    else:
+                        outp.append((str(p), p.name, p.len, None, None, None))
+                pickle.dump(outp, outf, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname, filename)
+        except BaseException:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+
 # -----------------------------------------------------------------------------
 #                            === INTROSPECTION ===
 #
@@ -2271,7 +2392,7 @@ class ParserReflect(object):
 
 def yacc(*, debug=yaccdebug, module=None, start=None,
          check_recursion=True, optimize=False, debugfile=debug_file,
-         debuglog=None, errorlog=None):
+         debuglog=None, errorlog=None, picklefile=None):
 
     # Reference to the parsing method of the last built parser
     global parse
@@ -2304,6 +2425,24 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
     if pinfo.error:
         raise YaccError('Unable to build parser')
 
+    # Check signature against table files (if any).  A table loaded from the
+    # cache carries no Grammar object, so None is returned in its place.
+    signature = pinfo.signature()
+
+    if picklefile and os.path.exists(picklefile):
+        try:
+            lr = LRTable()
+            read_signature = lr.read_pickle(picklefile)
+            if optimize or (read_signature == signature):
+                lr.bind_callables(pinfo.pdict)
+                parser = LRParser(lr, pinfo.error_func)
+                parse = parser.parse
+                return parser, None
+        except VersionError as e:
+            errorlog.warning(str(e))
+        except Exception as e:
+            errorlog.warning('There was a problem loading the table file: %r', e)
+
     if debuglog is None:
         if debug:
             try:
@@ -2432,7 +2571,7 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
         raise YaccError('Unable to build parser')
 
     # Run the LRTable on the grammar
-    lr = LRTable(grammar, debuglog)
+    lr = LRGeneratedTable(grammar, debuglog)
 
     if debug:
         num_sr = len(lr.sr_conflicts)
@@ -2475,6 +2614,13 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
                 errorlog.warning('Rule (%s) is never reduced', rejected)
                 warned_never.append(rejected)
 
+    # Write the table file if requested
+    if picklefile:
+        try:
+            lr.pickle_table(picklefile, signature)
+        except IOError as e:
+            errorlog.warning("Couldn't create %r. %s" % (picklefile, e))
+
     # Build the parser
     lr.bind_callables(pinfo.pdict)
     parser = LRParser(lr, pinfo.error_func)
@@ -0,0 +1,253 @@
+import sys, gc, time, types, resource, tracemalloc
+from scope import Node, Code, TypeDesc
+from copy import copy
+from contextlib import contextmanager, nullcontext
+
+## Pass timing
+##
+## Where the time of a compilation goes (compiler.py --time-passes): the wall
+## time, the number of runs and the memory high-water mark of every pass, and
+## the reductions and time of every grammar action.  Times are exclusive: a
+## pass that runs inside another (the lexer inside the parse, the parse of an
+## imported package inside the grammar action of its import) is taken out of
+## the enclosing one, so that the passes add up to the compilation.  The
+## tables pass is the loading of the LALR tables, once per process.
+##
+## A compilation is timed if its context has a PassTimer (ctx.passTimer).
+## The lexer and the grammar actions are wrapped only then, so untimed
+## compilations pay one test per pass.  With memory=True (compiler.py
+## --mem-report, tracemalloc must be tracing) the timer also records the peak
+## of the memory allocated by Python during every pass.
+
+passes = ('tables', 'lex', 'parse', 'actions', '3ac', 'codegen', 'output')
+
+def maxRss():
+    # High-water mark of the process's resident memory, in KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class PassTimer:
+    def __init__(self, memory=False):
+        self.memory = memory
+        # Pass -> wall time (s), runs and memory high-water mark (KB) at the
+        # end of its runs, and with memory the peak of the traced memory (KB)
+        # while it ran
+        self.passes = {name: {'wall': 0.0, 'calls': 0, 'peakRssKb': 0} for name in passes}
+        if memory:
+            for entry in self.passes.values():
+                entry['peakTracedKb'] = 0
+        # Grammar action (p_* function) -> reductions and wall time (s)
+        self.rules = {}
+        # Running passes, innermost last: [pass, action or None, start, time
+        # of the passes run inside, peak traced memory (bytes) before the
+        # latest reset of the peak]
+        self.frames = []
+        # Outputs of the stages of the compilation by stage (see
+        # batch.compileStage), for the memory report
+        self.results = {}
+        self.start = time.perf_counter()
+
+    def enter(self, name, rule=None):
+        if self.memory:
+            # The peak is reset for every pass; the enclosing pass keeps the
+            # peak so far
+            if self.frames:
+                frame = self.frames[-1]
+                frame[4] = max(frame[4], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.frames.append([name, rule, time.perf_counter(), 0.0, 0])
+
+    def exit(self):
+        name, rule, start, inner, peak = self.frames.pop()
+        elapsed = time.perf_counter() - start
+        if self.frames:
+            self.frames[-1][3] += elapsed
+        own = elapsed - inner
+        entry = self.passes[name]
+        entry['wall'] += own
+        entry['calls'] += 1
+        entry['peakRssKb'] = max(entry['peakRssKb'], maxRss())
+        if self.memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            entry['peakTracedKb'] = max(entry['peakTracedKb'], peak // 1024)
+            if self.frames:
+                self.frames[-1][4] = max(self.frames[-1][4], peak)
+        if rule is not None:
+            counts = self.rules.get(rule)
+            if counts is None:
+                counts = self.rules[rule] = {'reduces': 0, 'wall': 0.0}
+            counts['reduces'] += 1
+            counts['wall'] += own
+
+    @contextmanager
+    def timing(self, name):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def timedLexer(self, lexer):
+        # lexer with its tokens timed as the lex pass
+        token = lexer.token
+        def timedToken():
+            self.enter('lex')
+            try:
+                return token()
+            finally:
+                self.exit()
+        lexer.token = timedToken
+        return lexer
+
+    def timedProductions(self, productions):
+        # Copy of the productions of an LR parser with their actions timed
+        timed = []
+        for prod in productions:
+            prod = copy(prod)
+            if prod.callable is not None:
+                prod.callable = self.timedAction(prod.callable)
+            timed.append(prod)
+        return timed
+
+    def timedAction(self, action):
+        name = action.__name__
+        def timed(p):
+            self.enter('actions', name)
+            try:
+                action(p)
+            finally:
+                self.exit()
+        return timed
+
+    def report(self):
+        # The timings so far as a JSON-able dict; "other" is the time of the
+        # compilation outside of the passes
+        total = time.perf_counter() - self.start
+        report = {'total': {'wall': round(total, 6), 'peakRssKb': maxRss()}, 'passes': {}, 'rules': {}}
+        for name, entry in self.passes.items():
+            report['passes'][name] = dict(entry, wall=round(entry['wall'], 6))
+        report['passes']['other'] = {'wall': round(total - sum(entry['wall'] for entry in self.passes.values()), 6)}
+        for name, counts in sorted(self.rules.items()):
+            report['rules'][name] = dict(counts, wall=round(counts['wall'], 6))
+        return report
+
+def passTiming(ctx, name):
+    # Context manager timing the pass name of ctx's compilation, if it is
+    # timed
+    if ctx.passTimer is None:
+        return nullcontext()
+    return ctx.passTimer.timing(name)
+
+## Memory report
+##
+## What the structures of a compilation take (compiler.py --mem-report): the
+## AST by node class, the symbol tables by structure, and the 3AC and the
+## assembly.  Every object is counted once, in the first of these it is found
+## in: the symbol tables, the compiled units of the imported packages, the
+## 3AC, the assembly, the AST, the 3AC ropes of the AST nodes and last the
+## interned types, which are shared by all of them.  Sizes are those of sys.getsizeof, so the memory
+## allocator's overhead is not in them; the traced totals are.
+
+# Objects that belong to the program, not to the compilation
+_opaque = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.CodeType)
+
+class _Footprint:
+    def __init__(self):
+        self.seen = set()
+        # Objects met on the way that are counted on their own
+        self.nodes = []
+        self.ropes = []
+        self.types = []
+
+    def size(self, *roots):
+        # Bytes of roots and of what they reference that isn't counted yet;
+        # AST nodes, ropes and interned types found on the way are put aside
+        total = 0
+        stack = list(roots)
+        rootIds = set(map(id, roots))
+        while stack:
+            obj = stack.pop()
+            if id(obj) in self.seen or isinstance(obj, _opaque):
+                continue
+            if id(obj) not in rootIds:
+                if isinstance(obj, Node):
+                    self.nodes.append(obj)
+                    continue
+                if isinstance(obj, Code):
+                    self.ropes.append(obj)
+                    continue
+                if isinstance(obj, TypeDesc):
+                    self.types.append(obj)
+                    continue
+            self.seen.add(id(obj))
+            total += sys.getsizeof(obj)
+            stack.extend(gc.get_referents(obj))
+        return total
+
+def footprint(ctx, results):
+    # Bytes of the structures of ctx's compilation, whose stage outputs are
+    # results (see PassTimer.results)
+    fp = _Footprint()
+    stm = ctx.stm
+    symbolTables = {
+        'scopes': fp.size(*[scope.localsymTable for scope in stm.symTable.values()]),
+        'typeDefs': fp.size(*[scope.typeDefs for scope in stm.symTable.values()]),
+        'functions': fp.size(stm.functions),
+        'bindings': fp.size(stm.bindings, stm.typeBindings),
+        'infoTables': fp.size(ctx.infoTables),
+    }
+    # before the rest of the symbol table maker, which links to the tables of
+    # the packages
+    packages = fp.size(ctx.packages)
+    symbolTables['other'] = fp.size(stm, *stm.symTable.values())
+
+    code = {'instrs': fp.size(results.get('3ac', ()))}
+    asm = fp.size(results.get('asm', ()))
+
+    ast = {}
+    if 'ast' in results:
+        fp.nodes.append(results['ast'])
+    while fp.nodes:
+        node = fp.nodes.pop()
+        if id(node) in fp.seen:
+            continue
+        counts = ast.setdefault(type(node).__name__, {'count': 0, 'bytes': 0})
+        counts['count'] += 1
+        counts['bytes'] += fp.size(node)
+    code['ropes'] = 0
+    while fp.ropes:
+        code['ropes'] += fp.size(fp.ropes.pop())
+    symbolTables['types'] = 0
+    while fp.types:
+        symbolTables['types'] += fp.size(fp.types.pop())
+
+    return {
+        'ast': dict(sorted(ast.items())),
+        'astBytes': sum(counts['bytes'] for counts in ast.values()),
+        'symbolTables': symbolTables,
+        'symbolTableBytes': sum(symbolTables.values()),
+        '3ac': code,
+        '3acBytes': sum(code.values()),
+        'asm': asm,
+        'packages': packages,
+    }
+
+def memoryReport(ctx, top=10):
+    # Memory of ctx's compilation, timed with a PassTimer(memory=True), as a
+    # JSON-able dict: the high-water marks of the process and the peaks of
+    # the traced memory during every pass, the footprint of its structures
+    # and the top lines of the compiler allocating the memory still in use
+    timer = ctx.passTimer
+    traced, peak = tracemalloc.get_traced_memory()
+    # Not the memory of the report and of the timer itself
+    sites = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                                       tracemalloc.Filter(False, __file__)])
+    return {
+        'total': {'peakRssKb': maxRss(), 'tracedKb': traced // 1024,
+                  'peakTracedKb': max([peak] + [entry['peakTracedKb'] * 1024 for entry in timer.passes.values()]) // 1024},
+        'passes': {name: {'peakRssKb': entry['peakRssKb'], 'peakTracedKb': entry['peakTracedKb']}
+                   for name, entry in timer.passes.items()},
+        'footprint': footprint(ctx, timer.results),
+        'topAllocations': [{'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                            'kb': stat.size // 1024, 'blocks': stat.count}
+                           for stat in sites.statistics('lineno')[:top]],
+    }
@@ -0,0 +1,352 @@
+import tac
+
+## Register allocation
+##
+## The temporaries (temp_N) of a function's 3AC get their registers before
+## the function is generated.  Liveness is computed on the basic blocks of the
+## function; the live interval of a temporary is the span of the 3AC from its
+## first to its last live point, loops included.  Linear scan walks the
+## intervals by start and gives each a free register; when there is none, the
+## interval next used farthest away (the new one or an active one) is spilled
+## to a slot of the function's frame for the whole of its life.  Slots are
+## shared by spilled intervals that don't overlap.  At -O2 the registers are
+## given by graph coloring instead (see below).
+
+def names(operand, kind=tac.TEMP):
+    # The temporary operand reads or writes (or the name of kind)
+    return (operand.name,) if operand.kind == kind else ()
+
+def instrTemps(code, i, kind=tac.TEMP):
+    # (defs, uses): the temporaries (or the names of kind) instruction i of
+    # code writes and reads
+    instr = code[i]
+    op = instr.op
+    defs, uses = set(), set()
+    if op in tac.valueOps:
+        if instr.dest.kind == kind and instr.dest.isPlain():
+            defs.add(instr.dest.name)
+        else:
+            uses.update(names(instr.dest, kind))
+        for arg in instr.args:
+            uses.update(names(arg, kind))
+    elif op in (tac.PARAMS, tac.RETPARAMS, tac.IFNOT):
+        uses.update(names(instr.args[0], kind))
+    elif op in (tac.CALL, tac.RETURN):
+        # The parameters past the fourth are pushed at the call, and the
+        # return values are read at the return
+        for value in instr.values:
+            uses.update(names(value, kind))
+    return defs, uses
+
+class Interval:
+    def __init__(self, temp):
+        self.temp = temp
+        self.start = None
+        self.end = None
+        # Positions of the reads, in order
+        self.uses = []
+        self.reg = None
+        self.slot = None
+
+    def cover(self, pos):
+        if self.start is None or pos < self.start:
+            self.start = pos
+        if self.end is None or pos > self.end:
+            self.end = pos
+
+    def nextUse(self, pos):
+        # Position of the first read at or after pos; infinite if the interval
+        # is only live (around a loop) from there
+        for use in self.uses:
+            if use >= pos:
+                return use
+        return float('inf')
+
+    def __repr__(self):
+        where = self.reg if self.reg else f'slot {self.slot}'
+        return f"{self.temp} [{self.start}, {self.end}] {where}"
+
+def functionEnd(code, first):
+    # Position of the FUNC_END of the function whose FUNC is at first
+    for i in range(first + 1, len(code)):
+        if code[i].op == tac.FUNC_END:
+            return i
+    return len(code) - 1
+
+def basicBlocks(code, first, last):
+    # Blocks of the body first..last as (start, end) pairs and the successors
+    # of each, by block index
+    leaders = {first}
+    labels = {}
+    for i in range(first, last + 1):
+        op = code[i].op
+        if op == tac.LABEL:
+            leaders.add(i)
+            labels[code[i].name] = i
+        elif op in (tac.GOTO, tac.IFNOT, tac.RETURN) and i < last:
+            leaders.add(i + 1)
+    starts = sorted(leaders)
+    blocks = [(start, (starts[k + 1] if k + 1 < len(starts) else last + 1) - 1) for k, start in enumerate(starts)]
+    index = {start: k for k, start in enumerate(starts)}
+
+    successors = []
+    for k, (start, end) in enumerate(blocks):
+        instr = code[end]
+        succ = []
+        if instr.op == tac.GOTO:
+            target = labels.get(instr.name)
+            if target is not None:
+                succ.append(index[target])
+        elif instr.op not in (tac.RETURN, tac.FUNC_END):
+            if instr.op == tac.IFNOT:
+                target = labels.get(instr.name)
+                if target is not None:
+                    succ.append(index[target])
+            if k + 1 < len(blocks):
+                succ.append(k + 1)
+        successors.append(succ)
+    return blocks, successors
+
+def liveness(code, first, last, kind=tac.TEMP):
+    # (defs, uses) of every instruction of the body first..last and the
+    # temporaries (or the names of kind) live after it, by position
+    defsUses = {i: instrTemps(code, i, kind) for i in range(first, last + 1)}
+    blocks, successors = basicBlocks(code, first, last)
+
+    # Upward exposed reads and writes of every block
+    gen, kill = [], []
+    for start, end in blocks:
+        g, k = set(), set()
+        for i in range(start, end + 1):
+            defs, uses = defsUses[i]
+            g |= uses - k
+            k |= defs
+        gen.append(g)
+        kill.append(k)
+
+    liveIn = [set() for _ in blocks]
+    liveOut = [set() for _ in blocks]
+    changed = True
+    while changed:
+        changed = False
+        for k in range(len(blocks) - 1, -1, -1):
+            out = set()
+            for succ in successors[k]:
+                out |= liveIn[succ]
+            new = gen[k] | (out - kill[k])
+            if out != liveOut[k] or new != liveIn[k]:
+                liveOut[k], liveIn[k] = out, new
+                changed = True
+
+    liveAfter = {}
+    for k, (start, end) in enumerate(blocks):
+        live = set(liveOut[k])
+        for i in range(end, start - 1, -1):
+            liveAfter[i] = frozenset(live)
+            defs, uses = defsUses[i]
+            live = (live - defs) | uses
+    return defsUses, liveAfter
+
+def liveIntervals(defsUses, liveAfter):
+    # Live interval of every temporary, by name
+    intervals = {}
+    for i in sorted(defsUses):
+        defs, uses = defsUses[i]
+        for temp in liveAfter[i] | defs | uses:
+            if temp not in intervals:
+                intervals[temp] = Interval(temp)
+            intervals[temp].cover(i)
+        for temp in uses:
+            intervals[temp].uses.append(i)
+    return intervals
+
+def loopDepths(code, first, last):
+    # Loop nesting depth of every position of the body first..last: a jump
+    # back to a label closes a loop from the label to the jump
+    labels = {}
+    depths = dict.fromkeys(range(first, last + 1), 0)
+    for i in range(first, last + 1):
+        instr = code[i]
+        if instr.op == tac.LABEL:
+            labels[instr.name] = i
+        elif instr.op in (tac.GOTO, tac.IFNOT):
+            header = labels.get(instr.name)
+            if header is not None:
+                for pos in range(header, i + 1):
+                    depths[pos] += 1
+    return depths
+
+class Allocation:
+    def __init__(self, intervals):
+        self.intervals = intervals
+        # Frame slots the spilled temporaries take
+        self.slots = 0
+        # Copies between temporaries coalesced away
+        self.coalesced = 0
+        # Position -> temporaries live after the instruction
+        self.liveAfter = {}
+
+    def spilled(self):
+        return [iv for iv in self.intervals.values() if iv.reg is None]
+
+    def registers(self):
+        return sorted({iv.reg for iv in self.intervals.values() if iv.reg})
+
+def assignSlots(allocation, spilled, conflict):
+    # Frame slots of the spilled intervals, shared by those that don't
+    # conflict, in order of start
+    slots = []
+    for iv in sorted(spilled, key=lambda iv: (iv.start, iv.temp)):
+        for slot, holders in enumerate(slots):
+            if not any(conflict(iv, other) for other in holders):
+                break
+        else:
+            slot = len(slots)
+            slots.append([])
+        iv.slot = slot
+        slots[slot].append(iv)
+    allocation.slots = len(slots)
+    return allocation
+
+def linearScan(intervals, registers):
+    # Give the intervals the registers (in order of preference) or spill
+    # slots
+    free = list(registers)
+    active = []
+    spilled = []
+    for cur in sorted(intervals.values(), key=lambda iv: (iv.start, iv.end)):
+        # The intervals over before this one starts give back their register;
+        # one that ends where this one starts is still read there
+        for iv in [iv for iv in active if iv.end < cur.start]:
+            active.remove(iv)
+            free.append(iv.reg)
+        if free:
+            free.sort(key=registers.index)
+            cur.reg = free.pop(0)
+            active.append(cur)
+            continue
+        # The interval read next farthest away goes to memory; the new one
+        # is compared on its first read
+        victim = max(active, key=lambda iv: iv.nextUse(cur.start))
+        if victim.nextUse(cur.start) > cur.nextUse(cur.start + 1):
+            cur.reg, victim.reg = victim.reg, None
+            active.remove(victim)
+            active.append(cur)
+            spilled.append(victim)
+        else:
+            spilled.append(cur)
+
+    def overlap(a, b):
+        return a.start <= b.end and b.start <= a.end
+    return assignSlots(Allocation(intervals), spilled, overlap)
+
+## Graph coloring (Chaitin/Briggs), codegen at -O2
+##
+## Two temporaries interfere if one is written where the other is live after
+## the instruction, or is read by it: the code generator may write the result
+## before it has read all the operands.  The copies a = b between temporaries
+## are coalesced when that can't make the graph harder to color (Briggs: the
+## merged node has fewer than K neighbours of degree K or more).  Simplify
+## removes nodes of degree < K; when there is none, the node of least spill
+## cost per neighbour is removed as a spill candidate, and only spilled if
+## there is no color left for it when the nodes are put back (optimistic
+## coloring).  The spill cost of a temporary is its reads and writes weighted
+## by 10 to the loop depth.  Spilled temporaries are loaded and stored
+## through the scratch registers, so no rebuild is needed after spilling.
+
+def graphColoring(code, first, last, registers):
+    defsUses, liveAfter = liveness(code, first, last)
+    intervals = liveIntervals(defsUses, liveAfter)
+    depths = loopDepths(code, first, last)
+    K = len(registers)
+
+    adj = {temp: set() for temp in intervals}
+    cost = dict.fromkeys(intervals, 0)
+    moves = []
+    for i in sorted(defsUses):
+        defs, uses = defsUses[i]
+        instr = code[i]
+        source = None
+        if instr.op == tac.ASSIGN and defs and instr.args[0].isPlain() and instr.args[0].name in intervals:
+            source = instr.args[0].name
+            moves.append((instr.dest.name, source, 10 ** depths[i]))
+        for d in defs:
+            for temp in liveAfter[i] | uses:
+                if temp != d and temp != source:
+                    adj[d].add(temp)
+                    adj[temp].add(d)
+        for temp in defs | uses:
+            cost[temp] += 10 ** depths[i]
+
+    # Coalescing; alias maps a coalesced temporary to the node it went into
+    alias = {}
+    def node(temp):
+        while temp in alias:
+            temp = alias[temp]
+        return temp
+    for dest, source, weight in sorted(moves, key=lambda move: -move[2]):
+        a, b = node(dest), node(source)
+        if a == b or b in adj[a]:
+            continue
+        if sum(1 for n in adj[a] | adj[b] if len(adj[n]) >= K) >= K:
+            continue
+        for n in adj.pop(b):
+            adj[n].discard(b)
+            adj[n].add(a)
+            adj[a].add(n)
+        cost[a] += cost.pop(b)
+        alias[b] = a
+
+    # Simplify, nodes in order of start for the same choices every time
+    order = {temp: (iv.start, iv.temp) for temp, iv in intervals.items()}
+    degree = {n: len(adj[n]) for n in adj}
+    remaining = sorted(adj, key=order.get)
+    stack = []
+    while remaining:
+        low = [n for n in remaining if degree[n] < K]
+        n = low[0] if low else min(remaining, key=lambda n: cost[n] / max(degree[n], 1))
+        remaining.remove(n)
+        stack.append(n)
+        for m in adj[n]:
+            degree[m] -= 1
+
+    # Select
+    colors = {}
+    spilled = set()
+    while stack:
+        n = stack.pop()
+        used = {colors[m] for m in adj[n] if m in colors}
+        free = [reg for reg in registers if reg not in used]
+        if free:
+            colors[n] = free[0]
+        else:
+            spilled.add(n)
+
+    for temp, iv in intervals.items():
+        iv.reg = colors.get(node(temp))
+    allocation = Allocation(intervals)
+    allocation.coalesced = len(alias)
+    allocation.liveAfter = liveAfter
+
+    # Coalesced temporaries that are spilled share a slot
+    members = {}
+    for temp in intervals:
+        members.setdefault(node(temp), []).append(intervals[temp])
+    def conflict(a, b):
+        return b.temp in adj[a.temp]
+    assignSlots(allocation, [intervals[n] for n in spilled], conflict)
+    for n in spilled:
+        for iv in members[n]:
+            iv.slot = intervals[n].slot
+    return allocation
+
+def allocate(code, first, registers, coloring=False):
+    # Allocation of the temporaries of the function whose FUNC is at first:
+    # linear scan, or graph coloring
+    last = functionEnd(code, first)
+    if coloring:
+        return graphColoring(code, first + 1, last, registers)
+    defsUses, liveAfter = liveness(code, first + 1, last)
+    allocation = linearScan(liveIntervals(defsUses, liveAfter), registers)
+    allocation.liveAfter = liveAfter
+    return allocation
@@ -1,30 +1,20 @@
-from copy import deepcopy
+import weakref
+from copy import copy
 from distutils.log import Log
 from typing import List
+import tac
+from tracing import scopeTrace
 
 basicTypes = ['int', 'byte', 'int8', 'int16', 'int32', 'int64', 'float32', 'float64', 'uint8', 'uint16', 'uint32', 'uint64', 'string', 'rune', 'bool']
 basicNumericTypes = ['int', 'byte', 'int8', 'int16', 'int32', 'int64', 'float32', 'float64', 'uint8', 'uint16', 'uint32', 'uint64', 'rune']
 basicTypeSizes = {'int':4, 'float': 4, 'string': 12, 'rune': 4, 'byte': 4, 'int8': 1, 'int16': 2, 'int32': 4, 'int64': 8, 'uint8': 1, 'uint16': 2, 'uint32': 4, 'uint64': 8, 'float32': 4, 'float64': 8, 'bool': 4}
 compositeTypes = ['struct', 'array', 'slice', 'map']
+## Every scope sees the same basic types, so they share one set
+basicTypeSet = frozenset(basicTypes)
 
 builtinFunctions = ["__syscall"]
 
-curr_temp = 0
-curr_var_temp = 0
-    
-def new_temp(isFunc=False):
-    global curr_temp
-    temp = curr_temp
-    curr_temp += 1
-    return "temp_" +str(temp)
-
-def var_new_temp():
-    global curr_var_temp
-    var_temp = curr_var_temp 
-    curr_var_temp += 1
-    return "var_temp_" + str(var_temp)
-
-def zeroLit(stm, dataType):
+def zeroLit(ctx, stm, dataType):
     if dataType in basicTypes:
         dt = LitNode({'name' : dataType, 'baseType' : dataType, 'level' : 0, 'size': basicTypeSizes[dataType]}, label=None, isConst=True, val=None)
         if dataType == "string" or dataType == "Rune":
@@ -40,7 +30,7 @@ def zeroLit(stm, dataType):
         # return LitNode('0', dataType, isConst=True, val=0)
     else:
         if dataType['name'] == 'struct':
-            return CompositeLitNode(stm, dataType, NodeList([zeroLit(stm, dt) for dt in dataType["keyTypes"].values()]))
+            return CompositeLitNode(ctx, stm, dataType, NodeList([zeroLit(ctx, stm, dt) for dt in dataType["keyTypes"].values()]))
 
 class ScopeTableError(Exception):
     pass
@@ -54,17 +44,109 @@ class SwitchCaseError(Exception):
 class LogicalError(Exception):
     pass
 
+## Type descriptors
+## Types are dicts ({'name', 'baseType', 'level', 'size', ...}) while a Type
+## node is building them. Once a type goes into the symbol table it is
+## interned: equal types become one shared, read-only TypeDesc. Lookups can
+## then hand it out without copying, and two interned types are equal exactly
+## when they are the same object.
+class TypeDesc(dict):
+    __slots__ = ('__weakref__',)
+
+    def _readOnly(self, *args, **kwargs):
+        raise TypeError("Type descriptors are immutable, use updateType")
+
+    __setitem__ = __delitem__ = __ior__ = _readOnly
+    clear = pop = popitem = setdefault = update = _readOnly
+
+    def __eq__(self, other):
+        if isinstance(other, TypeDesc):
+            return self is other
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = object.__hash__
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (internType, (dict(self),))
+
+## Struct fields are laid out in declaration order, so the order of these maps
+## is part of the type
+orderedTypeFields = ('keyTypes', 'offset')
+
+## The table holds its types weakly: a type is only needed while some symbol
+## table, cached package or other type refers to it, and the compile server
+## would otherwise keep every type of every compile it has run
+typeTable = weakref.WeakValueDictionary()
+
+def _typeKey(value):
+    if isinstance(value, list):
+        return ('list', tuple(_typeKey(x) for x in value))
+    return value
+
+def _consType(items, ordered):
+    key = tuple((k, _typeKey(v)) for k, v in items)
+    if not ordered:
+        key = tuple(sorted(key, key=lambda item: item[0]))
+    key = (ordered, key)
+
+    desc = typeTable.get(key)
+    if desc is None:
+        # setdefault so that compilations on other threads interning the same
+        # type at the same time get the same descriptor
+        desc = typeTable.setdefault(key, TypeDesc(items))
+    return desc
+
+def _internFields(fields):
+    if not isinstance(fields, dict) or isinstance(fields, TypeDesc):
+        return fields
+    return _consType([(key, internType(value)) for key, value in fields.items()], True)
+
+def internType(dt):
+    if isinstance(dt, list):
+        return [internType(x) for x in dt]
+    if not isinstance(dt, dict) or isinstance(dt, TypeDesc):
+        return dt
+    items = [(key, _internFields(value) if key in orderedTypeFields else internType(value)) for key, value in dt.items()]
+    return _consType(items, False)
+
+def updateType(dt, **fields):
+    # Types are shared, so a changed type is a new one
+    return internType({**dt, **fields})
+
+## Basic types are interned up front, in the field order the parser writes them,
+## and kept for good
+basicTypeDescs = [internType({'name': basicType, 'baseType': basicType, 'level': 0, 'size': basicTypeSizes[basicType]}) for basicType in basicTypes]
+
+def internEntry(info):
+    # Copy of a symbol table entry with its types interned
+    entry = dict(info)
+    for field in ('dataType', 'params', 'return'):
+        if field in entry:
+            entry[field] = internType(entry[field])
+    return entry
+
 class scope:
     def __init__(self, currentScopeId, parentScope=None):
         self.localsymTable = {}
         self.id = currentScopeId
         self.parentScope = parentScope
-        self.avlTypes = basicTypes.copy()
+        self.avlTypes = basicTypeSet
         self.typeDefs = {}
         self.offset=0
         self.negoffset=-8
         self.okReturn = False
         self.NotAllChildReturn = False
+        # Sequence number of the latest declaration made in this scope
+        self.lastDecl = 0
 
     def insert(self, id, info, isarg=False):
         if not isarg:
@@ -108,21 +190,33 @@ class SymTableMaker:
         self.stack : List[scope] = [0]
         self.id = 0
         self.nextId = 1
+        # Innermost-last ids of the open scopes declaring each name, so that
+        # lookups don't walk the scope stack
+        self.bindings = {}
+        self.typeBindings = {}
         self.currentReturnType = None
         # self.forDepth = 0
         # self.switchDepth = 0
+        # Labels and gotos of the function being parsed.  Positions are
+        # recorded as (scope id, declaration sequence number) and the gotos
+        # are checked against their labels when the function ends
         self.labels = {}
         # self.labels: dict[str] -> dict[]
         # self.labels[label] = {
-        # 'scopeTab' : _ , 
-        # 'mappedName' : _, 
-        # 'expecting' : _, 
+        # 'scope' : _ ,
+        # 'declSeq' : _ ,
+        # 'mappedName' : _,
+        # 'expecting' : _,
         # 'lineno' : _
-        # 'prevGotos' : [
-        #  (scopeTab, lineno), (scopeTab, lineno) ...
-        # ]}
+        # 'statementType' : _
+        # }
+        self.gotos = []
+        # self.gotos: [(label, scope, declSeq, lineno, forward), ...]
+        self.declSeq = 0
         self.currentLabel = None
         self.pkgs = {}
+        # Function name -> alias of the first imported package defining it
+        self.pkgFunctions = {}
         self.nextLabel = 0
         self.forStack = []
         self.switchStack = []
@@ -132,12 +226,20 @@ class SymTableMaker:
         self.addTypeCastFunctions()
 
     def addFunction(self, label, info):
-        self.functions[label] = deepcopy(info)
+        self.functions[label] = internEntry(info)
         self.newScope()
         self.functions[label]['scope'] = self.id
     
     def addType(self, type, typeObj):
-        self.symTable[self.id].addType(type, deepcopy(typeObj))
+        if type not in self.symTable[self.id].typeDefs:
+            self.typeBindings.setdefault(type, []).append(self.id)
+        self.symTable[self.id].addType(type, internType(typeObj))
+
+    def addPackage(self, alias, pkg):
+        self.pkgs[alias] = pkg
+        if pkg is not None:
+            for ident in pkg.functions:
+                self.pkgFunctions.setdefault(ident, alias)
 
     def newScope(self):
         self.symTable[self.nextId] = scope(self.nextId, parentScope = self.id)
@@ -152,59 +254,71 @@ class SymTableMaker:
         if self.symTable[self.id].okReturn == False:
             if len(self.stack) >= 2:
                 self.symTable[self.stack[-2]].NotAllChildReturn = True
+        self._unbind(self.bindings, self.symTable[self.id].localsymTable)
+        self._unbind(self.typeBindings, self.symTable[self.id].typeDefs)
         self.stack.pop()
         self.id = self.stack[-1]
+
+    def _unbind(self, bindings, names):
+        for name in names:
+            scopes = bindings[name]
+            scopes.pop()
+            if not scopes:
+                del bindings[name]
     
     def add(self, ident, info, isarg=False):
-        self.symTable[self.id].insert(ident, deepcopy(info), isarg)
+        if ident not in self.symTable[self.id].localsymTable:
+            self.bindings.setdefault(ident, []).append(self.id)
+        self.declSeq += 1
+        self.symTable[self.id].lastDecl = self.declSeq
+        self.symTable[self.id].insert(ident, internEntry(info), isarg)
 
     def get(self, ident, scope=None):
+        # Entries are returned as stored, their types are shared; callers
+        # must not modify them
         if scope is None:
             if ident in self.functions:
-                return deepcopy(self.functions[ident])
-            else:
-                for key in self.pkgs:
-                    if ident in self.pkgs[key].functions:
-                        return deepcopy(self.pkgs[key].functions[ident]) 
+                return self.functions[ident]
+            elif ident in self.pkgFunctions:
+                return self.pkgs[self.pkgFunctions[ident]].functions[ident]
             scope = self.getScope(ident)
             if scope == -1:
                 raise Exception("Ident not found in symbol table")
-            return deepcopy(self.symTable[scope].getinfo(ident))
+            return self.symTable[scope].getinfo(ident)
         else:
-            return deepcopy(self.symTable[scope].getinfo(ident))
+            return self.symTable[scope].getinfo(ident)
 
     def findType(self, type):
         if isinstance(type, dict):
             type = type['name']
-        i = len(self.stack) - 1
-        while i >= 0:
-            j = self.stack[i]
-            if type in self.symTable[j].avlTypes:
-                return ElementaryType(dataType={'name':type, 'baseType': type, 'level': 0})
-            if type in self.symTable[j].typeDefs:
-                return deepcopy(self.symTable[j].typeDefs[type])
-            else:
-                i -= 1
-            
+        # Basic types are visible in every scope, so they win over typedefs
+        if type in basicTypeSet:
+            return ElementaryType(dataType={'name':type, 'baseType': type, 'level': 0})
+        scopes = self.typeBindings.get(type)
+        if scopes:
+            # Type nodes are copied so callers can relabel them; their
+            # dataType is an interned TypeDesc and is shared
+            return copy(self.symTable[scopes[-1]].typeDefs[type])
         return -1
     
     def getScope(self, ident):
-        i = len(self.stack) - 1
         if ident in self.functions:
             return 0
-        while i >= 0:
-            if ident in self.symTable[self.stack[i]].localsymTable:
-                break
-            else:
-                i -= 1
-
-        if i == -1:
-            return i
-        else:
-            return self.stack[i]
+        scopes = self.bindings.get(ident)
+        if scopes:
+            return scopes[-1]
+        return -1
     
     def getCurrentScope(self):
         return self.stack[-1]
+
+    def isAncestor(self, ancestor, id):
+        # True if scope ancestor encloses (or is) scope id
+        while id != ancestor:
+            if id == 0:
+                return False
+            id = self.symTable[id].parentScope
+        return True
     
     def getNewLabel(self):
         self.nextLabel += 1
@@ -214,22 +328,88 @@ class SymTableMaker:
         for type1 in basicNumericTypes:
             dt = {'baseType': type1, 'name': type1, 'level': 0, 'size': basicTypeSizes[type1]}
             info = {"params": [], "return": [dt], "dataType": {'name': 'func', 'baseType': 'func', 'level': 0}}
-            self.functions[type1] = deepcopy(info)  
+            self.functions[type1] = internEntry(info)
 
         type1 = 'string'
         dt = {'baseType': type1, 'name': type1, 'level': 0, 'size': basicTypeSizes[type1]}
         info = {"params": [], "return": [dt], "dataType": {'name': 'func', 'baseType': 'func', 'level': 0}}
-        self.functions[type1] = deepcopy(info)           
+        self.functions[type1] = internEntry(info)
     
     def addBuiltInFuncs(self):
-        print("TODO: Add builtin function definitions by parsing or by hard coding")
+        # TODO: Add builtin function definitions by parsing or by hard coding
+        pass
+
+## 3AC buffer
+## Append-only rope of 3AC instructions. Extending a Code with another one
+## shares the other's instructions instead of copying them, so a node picks up
+## its children's code in O(1) per child. The rope is flattened into a list
+## once, after the whole file has been parsed.
+class Code:
+    __slots__ = ('parts', 'length')
+
+    def __init__(self, instrs = ()):
+        # parts holds instructions (tac.Instr) and frozen segments (lists)
+        self.parts = list(instrs)
+        self.length = len(self.parts)
+
+    def freeze(self):
+        # Hand out the current parts as a segment nobody appends to again;
+        # later appends to self go to a fresh list on top of it
+        if len(self.parts) != 1 or not isinstance(self.parts[0], list):
+            self.parts = [self.parts]
+        return self.parts[0]
+
+    def append(self, instr):
+        self.parts.append(instr)
+        self.length += 1
+
+    def extend(self, instrs):
+        if isinstance(instrs, Code):
+            if instrs.length:
+                self.parts.append(instrs.freeze())
+                self.length += instrs.length
+        else:
+            for instr in instrs:
+                self.append(instr)
+
+    def __add__(self, other):
+        code = Code()
+        code.extend(self)
+        code.extend(other)
+        return code
+
+    def __radd__(self, other):
+        code = Code(other)
+        code.extend(self)
+        return code
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        # Segments nest as deep as the AST, so walk them without recursion
+        stack = [iter(self.parts)]
+        while stack:
+            for part in stack[-1]:
+                if isinstance(part, list):
+                    stack.append(iter(part))
+                    break
+                yield part
+            else:
+                stack.pop()
+
+    def flatten(self):
+        return list(self)
+
+    def __repr__(self):
+        return repr(self.flatten())
 
 ## AST Abstract Node Class
 class Node:
     def __init__(self, label = "Node"):
         self.children = []
         self.label = label
-        self.code = []
+        self.code = Code()
         self.place = None
         self.isConst = False
         self.isRef = False
@@ -315,7 +495,7 @@ class LitNode(Node):
 
 import utils
 class CompositeLitNode(Node):
-    def  __init__(self, stm, compositeLitType, elList):
+    def  __init__(self, ctx, stm, compositeLitType, elList):
         super().__init__()
         self.dataType = compositeLitType
         self.children = []
@@ -323,8 +503,8 @@ class CompositeLitNode(Node):
             raise NameError("Expected List of values")
 
         # Initialising var_temp variable in 3ac code
-        self.place = var_new_temp()
-        addr = new_temp()
+        self.place = ctx.varNewTemp()
+        addr = ctx.newTemp()
 
         if self.dataType['name'] == 'struct':
             hasKey = False
@@ -338,7 +518,7 @@ class CompositeLitNode(Node):
             if hasKey and hasNotKey:
                 raise NameError("all elements should have key or not have key")
             
-            self.code.append(f"new {self.place} {self.dataType['size']}")
+            self.code.append(tac.new(self.place, self.dataType['size']))
             if hasKey:
                 kv = {}
                 for el in elList:
@@ -352,12 +532,12 @@ class CompositeLitNode(Node):
                     if key in kv:
                         val = kv[key]
                     else:
-                        val = zeroLit(stm,t)
+                        val = zeroLit(ctx, stm, t)
 
                     if isinstance(val, ExprNode):
                         self.addChild(StructFieldNode(key, val))
-                        self.code.append(f'{addr} = {self.place}.addr + {self.dataType["offset"][key]}')
-                        self.code.append(f'* {addr} = {val.place}')
+                        self.code.append(tac.binOp(addr, f"{self.place}.addr", '+', self.dataType["offset"][key]))
+                        self.code.append(tac.assign(f"* {addr}", val.place))
                     else:
                         raise SyntaxError("Not changing literals to expressions properly")
             
@@ -371,8 +551,8 @@ class CompositeLitNode(Node):
                     
                     if isinstance(val, ExprNode):
                         self.addChild(StructFieldNode(key, val))
-                        self.code.append(f'{addr} = {self.place}.addr + {self.dataType["offset"][key]}')
-                        self.code.append(f'* {addr} = {val.place}')
+                        self.code.append(tac.binOp(addr, f"{self.place}.addr", '+', self.dataType["offset"][key]))
+                        self.code.append(tac.assign(f"* {addr}", val.place))
                     else:
                         raise SyntaxError("Not changing literals to expressions properly")
 
@@ -401,23 +581,23 @@ class CompositeLitNode(Node):
                 elSize = basicTypeSizes[self.dataType["baseType"]]
             else:
                 elSize = self.dataType["baseType"]["size"]
-            self.code.append(f"new {self.place} {elSize*self.dataType['length']}")
-            self.code.append(f'{addr} = {self.place}.addr')
+            self.code.append(tac.new(self.place, elSize*self.dataType['length']))
+            self.code.append(tac.assign(addr, f"{self.place}.addr"))
             for i in range(self.dataType['length']):
                 if not vis[i]:
-                    self.addChild(zeroLit(stm,self.dataType['baseType']))
-                    self.code.append(f'* {addr} = 0')
+                    self.addChild(zeroLit(ctx, stm, self.dataType['baseType']))
+                    self.code.append(tac.assign(f"* {addr}", 0))
                 else:
                     if isinstance(children[i], NodeList):
                         if isinstance(self.dataType['baseType'], str):
                             raise NameError("Normal literal should not be of type NodeList")
                         else:
-                            children[i] = CompositeLitNode(stm, self.dataType['baseType'], children[i])
+                            children[i] = CompositeLitNode(ctx, stm, self.dataType['baseType'], children[i])
                     
                     self.addChild(children[i])
-                    self.code.append(f'* {addr} = {children[i].place}')
+                    self.code.append(tac.assign(f"* {addr}", children[i].place))
                 
-                self.code.append(f'{addr} = {addr} + {elSize}')
+                self.code.append(tac.binOp(addr, addr, '+', elSize))
 
         elif self.dataType['name'] == 'slice':
             vis = []
@@ -441,34 +621,33 @@ class CompositeLitNode(Node):
                 if isinstance(el, ExprNode):
                     children[prevKey] = el
                 elif self.dataType['baseType'] in compositeTypes:
-                    children[prevKey] = CompositeLitNode(self.dataType['baseType'], el)
+                    children[prevKey] = CompositeLitNode(ctx, stm, self.dataType['baseType'], el)
                 else:
                     children[prevKey] = LitNode(el, self.dataType['baseType'])
 
-            self.dataType['length'] = len(children)
-            self.dataType['capacity'] = self.dataType['length']
+            self.dataType = updateType(self.dataType, length=len(children), capacity=len(children))
 
             if isinstance(self.dataType["baseType"], str):
                 elSize = basicTypeSizes[self.dataType["baseType"]]
             else:
                 elSize = self.dataType["baseType"]["size"]
-            self.code.append(f"new {self.place} {elSize*self.dataType['length']}")
-            self.code.append(f'{addr} = {self.place}.addr')
+            self.code.append(tac.new(self.place, elSize*self.dataType['length']))
+            self.code.append(tac.assign(addr, f"{self.place}.addr"))
             for i in range(self.dataType['length']):
                 if not vis[i]:
-                    self.addChild(zeroLit(stm,self.dataType['baseType']))
-                    self.code.append(f'* {addr} = 0')
+                    self.addChild(zeroLit(ctx, stm, self.dataType['baseType']))
+                    self.code.append(tac.assign(f"* {addr}", 0))
                 else:
                     if isinstance(children[i], NodeList):
                         if isinstance(self.dataType['baseType'], str):
                             raise NameError("Normal literal should not be of type NodeList")
                         else:
-                            children[i] = CompositeLitNode(stm, self.dataType['baseType'], children[i])
+                            children[i] = CompositeLitNode(ctx, stm, self.dataType['baseType'], children[i])
                     
                     self.addChild(children[i])
-                    self.code.append(f'* {addr} = {children[i].place}')
+                    self.code.append(tac.assign(f"* {addr}", children[i].place))
                 
-                self.code.append(f'{addr} = {addr} + {elSize}')
+                self.code.append(tac.binOp(addr, addr, '+', elSize))
 
         # TODO add map comoposite
         elif self.dataType['name'] == 'map':
@@ -672,7 +851,8 @@ class BuiltinFuncNode(FuncCallNode):
             else:
                 temp.append(expr)
 
-        print(args)
+        if scopeTrace.debug:
+            scopeTrace.log('debug', "Builtin %s arguments %s", name.label, args)
         args = temp
         super().__init__(name, args)
         self.isAddressable = False
@@ -686,10 +866,11 @@ class BuiltinFuncNode(FuncCallNode):
 
             self.place = f"__syscall"
             for arg in args[1:]:
-                self.code.append(f"params {arg.place}")
-            code.append(f'call #syscall_{args[0].val}')
+                self.code.append(tac.params(arg.place))
+            code.append(tac.call(f'#syscall_{args[0].val}', [arg.place for arg in args[1:]]))
             
-            print(args[0].val)
+            if scopeTrace.debug:
+                scopeTrace.log('debug', "Syscall %s", args[0].val)
             if args[0].val == 11:
                 if len(args) != 2:
                     raise Exception("Incorrect number of arguments")
@@ -885,7 +1066,7 @@ class ForRangeNode(Node):
 ### TYPE Class
 class Type:
     def __init__(self, dataType = {}):
-        self.code = []
+        self.code = Code()
         self.children = []
         self.dataType = dataType
     
@@ -1026,7 +1207,7 @@ class FuncParamType(Type):
 ## Exceptions
 class ValueNotUsedError(Exception):
     def __init__(self, message):
-        super().__init__()
+        super().__init__(message)
         self.message = message
 
     def __str__(self):
@@ -1034,7 +1215,7 @@ class ValueNotUsedError(Exception):
 
 class LogicalError(Exception):
     def __init__(self, message):
-        super().__init__()
+        super().__init__(message)
         self.message = message
 
     def __str__(self):
@@ -1042,7 +1223,7 @@ class LogicalError(Exception):
 
 class NodeList(list):
     def __init__(self, *args):
-        self.code = []
+        self.code = Code()
         if len(args) > 0:
             super(NodeList, self).__init__(args[0])
             for elem in args[0]:
@@ -1063,6 +1244,12 @@ class NodeList(list):
                 if child and hasattr(child, "code"):
                     self.code.extend(child.code)
 
+    def concat(self, x):
+        # Same as extend() for a NodeList whose code is exactly its elements'
+        # code, but takes that code as one segment instead of per element
+        super().extend(x)
+        self.code.extend(x.code)
+
     def __dict__(self):
         return {'children' : super().__dict__, 'code': self.code}
 
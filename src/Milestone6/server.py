@@ -0,0 +1,267 @@
+import os, sys, json, time, stat, socket, asyncio, argparse, threading
+from concurrent.futures import ThreadPoolExecutor
+import parser, pkgcache, tracing
+from batch import compileFile, compileStage, stageText
+from context import CompilationContext, CompileCancelled
+from pkgcache import PackageCache
+from client import defaultSocket, stages
+
+## Compile server
+##
+## A long running compiler that keeps the parser tables and the compiled units
+## of imported packages loaded between compilations.  Clients connect to a
+## Unix domain socket and exchange JSON messages, one per line:
+##
+##   {"op": "compile", "id": 1, "path": "/abs/main.go", "stage": "asm"}
+##       compiles path like compiler.py does, writing the outputs next to it;
+##       with "source" the given contents are compiled in place of the file
+##       and nothing is written.  stage is one of batch.stages, "asm" by
+##       default; "debug" lists debug artifacts to write as well (see
+##       batch.debugArtifacts); a "timeout" in seconds overrides the server's
+##       --timeout; "annotate": true comments the assembly; "opt": 2
+##       allocates registers by graph coloring (compiler.py -O)
+##   {"op": "cancel", "id": 1}     stops request 1 of this connection
+##   {"op": "status", "id": 2}     requests served, running and waiting
+##   {"op": "shutdown", "id": 3}   stops the server
+##
+## Every request gets one response with the same id:
+##
+##   {"id": 1, "ok": true, "output": "...", "timing": {"queued": ms, "compile": ms, "total": ms}}
+##   {"id": 1, "ok": false, "error": "TypeError: 12: ...", "cancelled": false, "timing": {...}}
+##
+## A connection can have many requests in flight and responses come back as
+## they finish.  At most --jobs compilations run at a time, the others wait
+## their turn.  Compilations run on threads, each with its own
+## CompilationContext; a cancelled or timed out compilation stops at the next
+## reduction of its parse (see CompilationContext.cancelEvent).
+
+class RequestError(Exception):
+    pass
+
+class ServerError(Exception):
+    pass
+
+def claimSocket(path):
+    # Removes the socket a server that is gone left at path.  Anything else
+    # at path, a file or the socket of a running server, is not ours to take
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ServerError(f"{path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    raise ServerError(f"Server already running on {path}")
+
+def socketId(path):
+    # Identity of the file at path, None if there is none
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+class CompileServer:
+    def __init__(self, socketPath, jobs=1, pkgCache=None, timeout=None):
+        self.socketPath = socketPath
+        self.jobs = jobs
+        self.pkgCache = pkgCache
+        # Seconds a compilation may run, None for no limit
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(jobs)
+        self.slots = None
+        self.stopped = None
+        # path -> (source hash, compiled unit) of the packages imported so far
+        self.units = {}
+        self.unitsLock = threading.Lock()
+        self.served = 0
+        self.running = 0
+        self.waiting = 0
+
+    def freshUnits(self):
+        # The compiled units whose package and imported packages haven't
+        # changed since they were compiled
+        fresh = {}
+        with self.unitsLock:
+            units = dict(self.units)
+        def isFresh(path):
+            if path not in fresh:
+                fresh[path] = False
+                try:
+                    sourceHash, entry = units[path]
+                    fresh[path] = pkgcache.sourceHash(path) == sourceHash and all(isFresh(dep) for dep, _ in entry['deps'])
+                except (KeyError, OSError):
+                    pass
+            return fresh[path]
+        return {path: units[path][1] for path in units if isFresh(path)}
+
+    def keepUnits(self, packages):
+        with self.unitsLock:
+            for path, entry in packages.items():
+                if path not in self.units or self.units[path][1] is not entry:
+                    try:
+                        self.units[path] = (pkgcache.sourceHash(path), entry)
+                    except OSError:
+                        pass
+
+    def compile(self, request, cancelEvent):
+        # Runs on a pool thread: the output of the request's stage
+        path = os.path.realpath(request['path'])
+        stage = request.get('stage', 'asm')
+        source = request.get('source')
+        ctx = CompilationContext(pkgCache=self.pkgCache, debug=set(request.get('debug', ())) - {'automaton'},
+                                 annotateAsm=bool(request.get('annotate', False)), optLevel=int(request.get('opt', 1)))
+        ctx.cancelEvent = cancelEvent
+        ctx.packages.update(self.freshUnits())
+        try:
+            if source is None:
+                output = compileFile(path, ctx, stage)
+            else:
+                output = compileStage(ctx, path, stage, source)
+        finally:
+            self.keepUnits(ctx.packages)
+        return stageText(stage, output)
+
+    async def runCompile(self, request, timing):
+        if not isinstance(request.get('path'), str):
+            raise RequestError("compile needs a path")
+        if request.get('stage', 'asm') not in stages:
+            raise RequestError(f"Unknown stage {request['stage']}, expected one of {', '.join(stages)}")
+        timeout = request.get('timeout', self.timeout)
+        start = time.perf_counter()
+        cancelEvent = threading.Event()
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            self.running += 1
+            timing['queued'] = (time.perf_counter() - start) * 1000
+            future = asyncio.get_running_loop().run_in_executor(self.pool, self.compile, request, cancelEvent)
+            try:
+                output = await asyncio.wait_for(asyncio.shield(future), timeout)
+            except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+                # Hold the slot until the compilation has noticed
+                cancelEvent.set()
+                await asyncio.wait([future])
+                future.exception()
+                if isinstance(e, asyncio.TimeoutError):
+                    raise CompileCancelled(f"Compilation timed out after {timeout} s")
+                raise
+        finally:
+            self.running -= 1
+            self.slots.release()
+            timing['total'] = (time.perf_counter() - start) * 1000
+            timing['compile'] = timing['total'] - timing['queued']
+        return output
+
+    async def handle(self, request, send):
+        # Run one request of a connection and send its response
+        response = {'id': request.get('id')}
+        timing = {}
+        op = request.get('op')
+        try:
+            if op == 'compile':
+                response['output'] = await self.runCompile(request, timing)
+            elif op == 'status':
+                response.update(served=self.served, running=self.running, waiting=self.waiting,
+                                jobs=self.jobs, units=len(self.units))
+            elif op != 'shutdown':
+                raise RequestError(f"Unknown op {op}")
+            response['ok'] = True
+        except asyncio.CancelledError:
+            response.update(ok=False, cancelled=True, error="Compilation cancelled")
+        except CompileCancelled as e:
+            response.update(ok=False, cancelled=True, error=str(e))
+        except Exception as e:
+            response.update(ok=False, cancelled=False, error=f"{type(e).__name__}: {e}")
+        if timing:
+            response['timing'] = {key: round(value, 3) for key, value in timing.items()}
+        self.served += 1
+        await send(response)
+        if op == 'shutdown':
+            self.stopped.set()
+
+    async def serveClient(self, reader, writer):
+        tasks = {}
+        lock = asyncio.Lock()
+        async def send(response):
+            async with lock:
+                try:
+                    writer.write(json.dumps(response).encode() + b'\n')
+                    await writer.drain()
+                except ConnectionError:
+                    pass
+
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request is not an object")
+                except ValueError as e:
+                    await send({'id': None, 'ok': False, 'error': f"Bad request: {e}"})
+                    continue
+                if request.get('op') == 'cancel':
+                    task = tasks.get(request.get('id'))
+                    if task is not None:
+                        task.cancel()
+                    continue
+                task = asyncio.create_task(self.handle(request, send))
+                tasks[request.get('id')] = task
+                task.add_done_callback(lambda task, id=request.get('id'): tasks.pop(id, None) if tasks.get(id) is task else None)
+        except (ConnectionError, asyncio.CancelledError):
+            # The client went away, or the server is stopping
+            pass
+        finally:
+            # The client is gone, stop what it asked for
+            for task in list(tasks.values()):
+                task.cancel()
+            writer.close()
+
+    async def serve(self):
+        self.slots = asyncio.Semaphore(self.jobs)
+        self.stopped = asyncio.Event()
+        claimSocket(self.socketPath)
+        server = await asyncio.start_unix_server(self.serveClient, path=self.socketPath, limit=1 << 26)
+        ownSocket = socketId(self.socketPath)
+        print(f"Listening on {self.socketPath}", file=sys.stderr)
+        try:
+            async with server:
+                await self.stopped.wait()
+        finally:
+            # Unless another server has taken the path since
+            if ownSocket is not None and socketId(self.socketPath) == ownSocket:
+                os.remove(self.socketPath)
+            self.pool.shutdown(cancel_futures=True)
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description="Compile server for Go sources, see client.py")
+    argparser.add_argument("--socket", default=defaultSocket(), help="path of the Unix domain socket (default: %(default)s)")
+    argparser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="compilations to run at a time")
+    argparser.add_argument("--trace", metavar="SPEC", default="", help="compiler traces to print on stderr, see compiler.py --trace")
+    argparser.add_argument("--timeout", type=float, help="seconds a compilation may run before it is cancelled")
+    argparser.add_argument("--pkg-cache", metavar="DIR", help="directory of the compiled package cache (default: ~/.cache/go-mips/packages)")
+    argparser.add_argument("--no-pkg-cache", action="store_true", help="compile imported packages from source without the package cache")
+    args = argparser.parse_args()
+
+    parser.getParser()
+    try:
+        tracing.configure(args.trace)
+    except ValueError as e:
+        argparser.error(str(e))
+    server = CompileServer(args.socket, args.jobs, None if args.no_pkg_cache else PackageCache(args.pkg_cache), args.timeout)
+    try:
+        asyncio.run(server.serve())
+    except ServerError as e:
+        sys.exit(f"server.py: {e}")
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,239 @@
+import sys
+
+## Three address code instructions
+##
+## The parser builds Instr records through the constructors below and the
+## backend dispatches on their opcode and reads their fields: dest and args
+## are the operands written and read (Operand), operator and type those of a
+## UNOP/BINOP, name the label, function, package or import path, and values
+## the parameters of a CALL or the values of a RETURN.  str() of an
+## instruction gives its text form, which is only used for printing
+## (_3ac.txt).
+
+## Opcodes
+ASSIGN = 0      # dest = a
+UNOP = 1        # dest = op a           dest = op(type) a
+BINOP = 2       # dest = a op b         dest = a op(type) b
+NEW = 3         # new dest size
+PARAMS = 4      # params a
+CALL = 5        # call f
+RETPARAMS = 6   # retparams a
+RETURN = 7      # return
+LABEL = 8       # name:
+GOTO = 9        # goto label
+IFNOT = 10      # if not cond then goto label
+FUNC = 11       # Func name
+FUNC_END = 12   # Func END
+PACKAGE = 13    # package name
+IMPORT = 14     # import path
+
+opNames = ['ASSIGN', 'UNOP', 'BINOP', 'NEW', 'PARAMS', 'CALL', 'RETPARAMS', 'RETURN',
+           'LABEL', 'GOTO', 'IFNOT', 'FUNC', 'FUNC_END', 'PACKAGE', 'IMPORT']
+
+## Opcodes that compute a value into dest
+valueOps = (ASSIGN, UNOP, BINOP)
+
+## Operand kinds
+TEMP = 0        # temp_N
+VAR_TEMP = 1    # var_temp_N, a composite value
+VAR = 2         # N_x, variable x of scope N
+ARG = 3         # arg_[f_-8], the parameter of f at offset -8
+RETVAL = 4      # retval_f_N, the Nth return value of the call of f
+SYSCALL = 5     # __syscall, the result of the last syscall
+INT = 6         # 5
+FLOAT = 7       # 2.5
+STRING = 8      # "a b", `a b`
+RUNE = 9        # 'a'
+NAME = 10       # anything else: true, false
+
+kindNames = ['TEMP', 'VAR_TEMP', 'VAR', 'ARG', 'RETVAL', 'SYSCALL', 'INT', 'FLOAT', 'STRING', 'RUNE', 'NAME']
+
+class Operand:
+    # An operand as the parser writes it, '* temp_3', '1_s.addr', taken
+    # apart: what it names (kind, name), whether it is the value it points
+    # to (deref) and the part of a composite it is (field: addr, length,
+    # capacity, ...).  For ARG and RETVAL, func and index are the function
+    # and the offset or the number of the return value
+    __slots__ = ('text', 'kind', 'name', 'deref', 'field', 'func', 'index')
+
+    def __init__(self, text):
+        # Names are interned so that equal names are the same object; the
+        # backend keys its register and location tables by them
+        self.text = sys.intern(text)
+        self.deref = False
+        self.field = self.func = self.index = None
+        rest = text
+        if rest.startswith('*') and len(rest) > 1:
+            # '* p', and '*p' of the range loops
+            self.deref = True
+            rest = rest[1:].lstrip(' ')
+        if rest[:1] in ('"', '`'):
+            self.kind = STRING
+        elif rest[:1] == "'":
+            self.kind = RUNE
+        elif rest.lstrip('-').isdigit():
+            self.kind = INT
+        elif rest.lstrip('-')[:1].isdigit() and '_' not in rest:
+            self.kind = FLOAT
+        else:
+            name, dot, field = rest.partition('.')
+            if name.startswith('temp_'):
+                self.kind = TEMP
+            elif name.startswith('var_temp_'):
+                self.kind = VAR_TEMP
+            elif name.startswith('arg_['):
+                self.kind = ARG
+                func, _, offset = name[5:-1].rpartition('_')
+                self.func, self.index = func, int(offset)
+            elif name.startswith('retval_'):
+                self.kind = RETVAL
+                func, _, number = name[7:].rpartition('_')
+                self.func, self.index = func, int(number)
+            elif name == '__syscall':
+                self.kind = SYSCALL
+            elif name[:1].isdigit():
+                self.kind = VAR
+            else:
+                self.kind = NAME
+            if self.kind != NAME:
+                rest = name
+                self.field = field if dot else None
+        self.name = sys.intern(rest)
+
+    def isPlain(self):
+        # Whether the operand is its name: no * and no field
+        return not self.deref and self.field is None
+
+    def pointer(self):
+        # The operand * self reads through: temp_3 for '* temp_3'
+        return Operand(self.text[1:].lstrip(' '))
+
+    def __eq__(self, other):
+        if isinstance(other, Operand):
+            return self.text == other.text
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"Operand({kindNames[self.kind]}, {self.text!r})"
+
+    def __reduce__(self):
+        return (operand, (self.text,))
+
+def operand(x):
+    if isinstance(x, Operand):
+        return x
+    return Operand(str(x))
+
+class Instr:
+    __slots__ = ('op', 'dest', 'args', 'operator', 'type', 'name', 'values')
+
+    def __init__(self, op, dest=None, args=(), operator=None, type=None, name=None, values=()):
+        self.op = op
+        self.dest = operand(dest) if dest is not None else None
+        self.args = tuple(operand(arg) for arg in args)
+        self.operator = operator
+        self.type = type
+        self.name = sys.intern(str(name)) if name is not None else None
+        self.values = tuple(operand(value) for value in values)
+
+    def typedOperator(self):
+        # Operator of a UNOP/BINOP as written in the text form: op(type)
+        if self.type is not None:
+            return f"{self.operator}({self.type})"
+        return self.operator
+
+    def __str__(self):
+        op = self.op
+        if op == ASSIGN:
+            return f"{self.dest} = {self.args[0]}"
+        elif op == UNOP:
+            return f"{self.dest} = {self.typedOperator()} {self.args[0]}"
+        elif op == BINOP:
+            return f"{self.dest} = {self.args[0]} {self.typedOperator()} {self.args[1]}"
+        elif op == NEW:
+            return f"new {self.dest} {self.args[0]}"
+        elif op == PARAMS:
+            return f"params {self.args[0]}"
+        elif op == CALL:
+            return f"call {self.name}"
+        elif op == RETPARAMS:
+            return f"retparams {self.args[0]}"
+        elif op == RETURN:
+            return "return"
+        elif op == LABEL:
+            return f"{self.name}:"
+        elif op == GOTO:
+            return f"goto {self.name}"
+        elif op == IFNOT:
+            return f"if not {self.args[0]} then goto {self.name}"
+        elif op == FUNC:
+            return f"\nFunc {self.name}"
+        elif op == FUNC_END:
+            return "Func END\n"
+        elif op == PACKAGE:
+            return f"package {self.name}"
+        elif op == IMPORT:
+            return f"import {self.name}"
+
+    def __repr__(self):
+        return f"Instr({opNames[self.op]}, {str(self)!r})"
+
+    def __reduce__(self):
+        # Unpickled instructions (package cache) go through the constructor
+        # so that their names are interned again
+        return (Instr, (self.op, self.dest, self.args, self.operator, self.type, self.name, self.values))
+
+## Constructors
+
+def assign(dest, a):
+    return Instr(ASSIGN, dest, (a,))
+
+def unOp(dest, operator, a, type=None):
+    return Instr(UNOP, dest, (a,), operator, type)
+
+def binOp(dest, a, operator, b, type=None):
+    return Instr(BINOP, dest, (a, b), operator, type)
+
+def new(dest, size):
+    return Instr(NEW, dest, (size,))
+
+def params(a):
+    return Instr(PARAMS, args=(a,))
+
+def call(func, params=()):
+    # params: the operands of the PARAMS instructions right before the call
+    return Instr(CALL, name=func, values=params)
+
+def retParams(a):
+    return Instr(RETPARAMS, args=(a,))
+
+def ret(values=()):
+    # values: the operands of the RETPARAMS instructions right before it
+    return Instr(RETURN, values=values)
+
+def label(name):
+    return Instr(LABEL, name=name)
+
+def goto(name):
+    return Instr(GOTO, name=name)
+
+def ifNot(cond, name):
+    return Instr(IFNOT, args=(cond,), name=name)
+
+def func(name):
+    return Instr(FUNC, name=name)
+
+def funcEnd():
+    return Instr(FUNC_END)
+
+def package(name):
+    return Instr(PACKAGE, name=name)
+
+def importPath(path):
+    return Instr(IMPORT, name=path)
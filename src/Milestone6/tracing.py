@@ -0,0 +1,68 @@
+import sys
+
+## Tracing
+##
+## Diagnostics of the compiler itself, by category and level, off unless
+## asked for (compiler.py --trace).  Every category has a Tracer whose level
+## attributes (debug, info, warn) say whether messages of that level are on,
+## and call sites test the attribute before building the message:
+##
+##     if codegenTrace.debug:
+##         codegenTrace.log('debug', "Requested to shift: %s", regList)
+##
+## so a disabled trace costs one attribute test and formats nothing.  Messages
+## go to stderr, never to the compiler's output.
+
+levels = ('debug', 'info', 'warn')
+
+class Tracer:
+    def __init__(self, category):
+        self.category = category
+        self.debug = self.info = self.warn = False
+
+    def setLevel(self, level):
+        # Turn on messages of level and above; None turns the category off
+        rank = levels.index(level) if level is not None else len(levels)
+        for i, name in enumerate(levels):
+            setattr(self, name, i >= rank)
+
+    def log(self, level, message, *args):
+        if args:
+            message = message % args
+        print(f"[{self.category}:{level}] {message}", file=stream)
+
+# Where messages go
+stream = sys.stderr
+
+tracers = {}
+
+def tracer(category):
+    if category not in tracers:
+        tracers[category] = Tracer(category)
+    return tracers[category]
+
+def configure(spec):
+    # spec: comma separated category[:level] items, "all" for every
+    # category; the level defaults to debug.  e.g. "codegen:info,parser"
+    for item in spec.split(','):
+        if not item:
+            continue
+        category, _, level = item.partition(':')
+        level = level or 'debug'
+        if level not in levels:
+            raise ValueError(f"Unknown trace level {level}, expected one of {', '.join(levels)}")
+        if category == 'all':
+            for t in tracers.values():
+                t.setLevel(level)
+        elif category in tracers:
+            tracers[category].setLevel(level)
+        else:
+            raise ValueError(f"Unknown trace category {category}, expected one of {', '.join(sorted(tracers))}, all")
+
+## Categories
+# parser: grammar actions; scope: symbol tables and AST nodes; codegen: MIPS
+# generation and register allocation; driver: compilation steps
+parserTrace = tracer('parser')
+scopeTrace = tracer('scope')
+codegenTrace = tracer('codegen')
+driverTrace = tracer('driver')
@@ -36,17 +36,35 @@ import os
 
 LIBPATH = os.path.dirname(os.path.realpath(__file__)) + "/lib"
 
-def getPath(filename, target_folder):
-    for root, dirs, files in os.walk(LIBPATH):
-        if filename in files:
-            return os.path.join(root, filename)
+# Folder -> {file name: path} of the Go sources under it, first match of a
+# top down walk; built the first time a folder is searched and walked again
+# when it misses or is out of date (a long running process outlives files)
+moduleIndex = {}
+
+def indexFolder(folder, refresh=False):
+    if refresh or folder not in moduleIndex:
+        index = {}
+        for root, dirs, files in os.walk(folder):
+            for filename in files:
+                if filename.endswith('.go'):
+                    index.setdefault(filename, os.path.join(root, filename))
+        moduleIndex[folder] = index
+    return moduleIndex[folder]
 
-    for root, dirs, files in os.walk(target_folder):
-        if filename in files:
-            return os.path.join(root, filename)
+def getPath(filename, target_folder):
+    for refresh in (False, True):
+        for folder in (LIBPATH, target_folder):
+            path = indexFolder(folder, refresh).get(filename)
+            if path is not None and os.path.exists(path):
+                return path
     
     raise NameError(f"Invalid import: {filename}")
 
+def importCycleError(chain, lineno):
+    # chain: paths of the importing files, ending with the one imported again
+    files = " imports ".join(os.path.basename(path) for path in chain)
+    return NameError(f"{lineno}: Import cycle not allowed: {files}")
+
 def getBaseType(stm, dt):
     curr = dt
 
@@ -129,7 +147,7 @@ def checkBinOp(stm, dt1, dt2, binop, firstchar):
         else:
             return False
 
-    if dt1 == None or dt2 == None or dt1 not in stm.symTable[stm.id].avlTypes or dt2 not in stm.symTable[stm.id].avlTypes:
+    if not isinstance(dt1, str) or not isinstance(dt2, str) or dt1 not in stm.symTable[stm.id].avlTypes or dt2 not in stm.symTable[stm.id].avlTypes:
         return False
 
     if binop == '+' or binop == '-' or binop == '*' or binop == '/':
@@ -241,7 +259,7 @@ def checkUnOp(stm, dt, unOp, flag):
         else:
             return False
 
-    if dt == None or dt not in stm.symTable[stm.id].avlTypes:
+    if not isinstance(dt, str) or dt not in stm.symTable[stm.id].avlTypes:
         return False
 
     if unOp == '+' or unOp == '-':
@@ -476,37 +494,15 @@ def Operate(operator, operand1, operand2, lineno, dt2):
 #         parts = float.split('+')
 #         return (float(parts[0]), float(parts[1].strip('i')))
 
-def checkAncestor(stm : SymTableMaker, lid, gid, noSkipVar=False):
-    flag = False
-    # Check if scope id of goto scope symbol table is 
-    # an ancestor of label scope symbol table
-    while True:
-        if lid == gid:
-            if noSkipVar:
-                if len(stm.symTable[lid].localsymTable) > len(stm.symTable[gid].localsymTable):
-                    return False
-                if len(stm.symTable[lid].avlTypes) < len(stm.symTable[gid].avlTypes):
-                    return False
-                if len(stm.symTable[lid].typeDefs) < len(stm.symTable[gid].typeDefs):
-                    return False
-            flag = True
-            break
-        if lid == 0:
-            break
-        else:
-            lid = stm.symTable[lid].parentScope
-    if not flag:
+def isValidGoto(stm : SymTableMaker, label, goto):
+    # label is an entry of stm.labels, goto an entry of stm.gotos
+    _, gotoScope, gotoSeq, _, _ = goto
+    # Goto can't jump into a block: the label's scope must enclose the goto
+    if not stm.isAncestor(label['scope'], gotoScope):
         return False
-    else:
-        return True    
-
-def isValidGoto(stm : SymTableMaker, labelST : scope, gotoST : scope, checkNoSkipVar=False):
-    if checkNoSkipVar:
-        return checkAncestor(stm, gotoST.id, labelST.id, checkNoSkipVar)
-    else:
-        # Check logic whether it can happen that goto is an ancestor of label scope
-        # Opposite case considered here
-        return checkAncestor(stm, gotoST.id, labelST.id)
+    # Variables declared in the label's scope after the goto would be
+    # skipped; backward jumps never satisfy this
+    return label['declSeq'] <= gotoSeq
 
 def constructDataType(baseType):
     return {
@@ -0,0 +1,592 @@
+import os, sys, time, tempfile, argparse
+
+basepath = os.environ.get("ROOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+srcpath = os.path.join(basepath, "src", "Milestone6")
+sys.path.insert(0, srcpath)
+
+def timeit(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), sum(times) / len(times)
+
+def report(name, best, mean, extra=""):
+    print(f"{name:<28} best {best * 1000:9.2f} ms   mean {mean * 1000:9.2f} ms   {extra}")
+
+###################################################################################
+## Parser construction: LALR tables built from the grammar vs loaded from cache
+
+def bench_startup(args):
+    import parser as goparser
+    import ply.yacc as yacc
+
+    fd, picklefile = tempfile.mkstemp(suffix=".pickle")
+    os.close(fd)
+
+    def cold():
+        if os.path.exists(picklefile):
+            os.remove(picklefile)
+        yacc.yacc(module=goparser, picklefile=picklefile)
+
+    def warm():
+        yacc.yacc(module=goparser, picklefile=picklefile)
+
+    try:
+        report("yacc (cold, no cache)", *timeit(cold, args.repeat))
+        report("yacc (warm, cached)", *timeit(warm, args.repeat), f"table file {os.path.getsize(picklefile)} bytes")
+    finally:
+        os.remove(picklefile)
+
+###################################################################################
+## Lexer throughput on generated sources of growing size
+
+go_function = """
+// function number {n}
+func compute_{n}(a int, b float32) (int, float32) {{
+    var x int = a * {n} + 0x1f
+    y := b / 2.5e-1
+    /* block comment */
+    for i := 0; i < a; i++ {{
+        if x >= i && !(y != 1.0) {{
+            x += i << 2
+        }} else {{
+            x--
+        }}
+    }}
+    s := "string literal {n}"
+    r := 'r'
+    return x, y
+}}
+"""
+
+def generate_source(size):
+    parts = ["package main\n"]
+    total, n = 0, 0
+    while total < size:
+        part = go_function.format(n=n)
+        parts.append(part)
+        total += len(part)
+        n += 1
+    return "".join(parts)
+
+def bench_lexer(args):
+    import parser as goparser
+    _, golexer = goparser.getParser()
+
+    for size in args.sizes:
+        source = generate_source(int(size * 1024 * 1024))
+        ntokens = 0
+        def run():
+            nonlocal ntokens
+            lexer = golexer.clone()
+            lexer.input(source)
+            ntokens = sum(1 for _ in lexer)
+        best, mean = timeit(run, args.repeat)
+        report(f"lex {size:g} MB", best, mean, f"{ntokens} tokens  {ntokens / best / 1e6:.2f} Mtok/s  {best / size * 1000:.1f} ms/MB")
+
+###################################################################################
+## Memory per token: token objects vs the array-backed token buffer
+
+class DictToken:
+    # A token with a per-instance __dict__, as LexToken was before __slots__
+    pass
+
+def bench_tokens(args):
+    import tracemalloc
+    import parser as goparser
+    import ply.lex as lex
+    _, golexer = goparser.getParser()
+
+    def measure(build):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        held = build()
+        elapsed = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        return held, size, elapsed
+
+    def dict_tokens(source):
+        lexer = golexer.clone()
+        lexer.input(source)
+        held = []
+        for tok in lexer:
+            t = DictToken()
+            t.type, t.value, t.lineno, t.lexpos, t.lexcol = tok.type, tok.value, tok.lineno, tok.lexpos, tok.lexcol
+            held.append(t)
+        return held
+
+    def slot_tokens(source):
+        lexer = golexer.clone()
+        lexer.input(source)
+        return list(lexer)
+
+    def token_buffer(source):
+        return lex.TokenBuffer(golexer.clone(), source)
+
+    for size in args.sizes:
+        source = generate_source(int(size * 1024 * 1024))
+        for name, build in (("dict tokens", dict_tokens), ("slotted tokens", slot_tokens), ("token buffer", token_buffer)):
+            held, nbytes, elapsed = measure(lambda: build(source))
+            print(f"{name:<16} {size:g} MB   {len(held):8d} tokens   {nbytes / len(held):7.1f} bytes/token   {elapsed * 1000:9.2f} ms")
+            del held
+
+###################################################################################
+## Peak memory while lexing a file: read into one string vs mmap + streaming
+
+def bench_stream(args):
+    import tracemalloc
+    import parser as goparser
+    import ply.lex as lex
+    _, golexer = goparser.getParser()
+
+    def from_string(path):
+        lexer = golexer.clone()
+        with open(path) as f:
+            lexer.input(f.read())
+        return sum(1 for _ in lexer)
+
+    def from_stream(path):
+        lexer = golexer.clone()
+        lexer.input_stream(lex.read_chunks(path, args.chunk_size))
+        return sum(1 for _ in lexer)
+
+    for size in args.sizes:
+        fd, path = tempfile.mkstemp(suffix=".go")
+        with os.fdopen(fd, "w") as f:
+            f.write(generate_source(int(size * 1024 * 1024)))
+        try:
+            for name, run in (("read + lex", from_string), ("mmap + stream", from_stream)):
+                tracemalloc.start()
+                start = time.perf_counter()
+                ntokens = run(path)
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{name:<16} {size:g} MB   {ntokens:8d} tokens   peak {peak / 1024:9.1f} KB   {elapsed * 1000:9.2f} ms")
+        finally:
+            os.remove(path)
+
+###################################################################################
+## 3AC accumulation on deeply nested programs
+
+def generate_nested(depth):
+    lines = ["package main", "", "func main() {", "    var x int = 0"]
+    # Not indented, so that lexing whitespace does not grow with the depth
+    for d in range(depth):
+        lines.append(f"if x < {d + 1} {{")
+        lines.append(f"y{d} := x * 2 + {d}")
+        lines.append(f"assign x = x + y{d}")
+    lines.extend("}" * depth)
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+def parse_source(source):
+    import contextlib
+    import parser as goparser
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        # Every compile starts from a fresh context
+        return goparser.parse(goparser.CompilationContext(), source)
+
+def bench_nesting(args):
+    import tracemalloc
+    compile = parse_source
+
+    for depth in args.depths:
+        source = generate_nested(depth)
+        ninstr = 0
+        def run():
+            nonlocal ninstr
+            ninstr = len(list(compile(source).code))
+        best, mean = timeit(run, args.repeat)
+
+        # Memory still held by the AST once parsing is done: every ancestor
+        # holding its own copy of the code below it shows up here
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        ast = compile(source)
+        held = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del ast
+        report(f"nesting depth {depth}", best, mean, f"{ninstr} instructions  AST holds {held / 1024:9.1f} KB  {held / ninstr:7.1f} bytes/instruction")
+
+###################################################################################
+## Front end: parsing and semantic analysis of the test programs, in process
+
+class Timeout(Exception):
+    pass
+
+def bench_frontend(args):
+    import signal, tracemalloc
+
+    def alarm(signum, frame):
+        raise Timeout()
+    signal.signal(signal.SIGALRM, alarm)
+
+    files = args.files or sorted(os.path.join(basepath, "tests", d, f) for d in ("Milestone6", "final_tests", "Milestone5")
+                                 for f in os.listdir(os.path.join(basepath, "tests", d)) if f.endswith(".go"))
+    total_best = total_peak = 0
+    for path in files:
+        with open(path) as f:
+            source = f.read()
+        signal.alarm(10)
+        try:
+            parse_source(source)
+        except Exception:
+            # Programs the front end rejects (or never finishes) are not timed
+            continue
+        finally:
+            signal.alarm(0)
+        best, mean = timeit(lambda: parse_source(source), args.repeat)
+
+        tracemalloc.start()
+        parse_source(source)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        total_best += best
+        total_peak += peak
+        name = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+        report(name, best, mean, f"peak {peak / 1024:9.1f} KB")
+    print(f"{'total':<28} best {total_best * 1000:9.2f} ms   peak {total_peak / 1024:9.1f} KB")
+
+###################################################################################
+## Imported packages: compiled from source vs loaded from the package cache
+
+def bench_imports(args):
+    import contextlib, shutil
+    import parser as goparser
+    from pkgcache import PackageCache
+
+    files = args.files or [os.path.join(srcpath, "lib", "fmt.go")]
+    cachedir = tempfile.mkdtemp()
+    def load(cache, path):
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            goparser.importPackage(goparser.CompilationContext(pkgCache=cache), path)
+    try:
+        cache = PackageCache(cachedir)
+        for path in files:
+            name = os.path.basename(path)
+            report(f"{name} source", *timeit(lambda: load(None, path), args.repeat))
+            load(cache, path)
+            report(f"{name} cached", *timeit(lambda: load(cache, path), args.repeat))
+    finally:
+        shutil.rmtree(cachedir)
+
+def generate_packages(folder, count, funcs):
+    # count independent packages of funcs functions each and a main file
+    # importing all of them
+    for i in range(count):
+        lines = [f"package pkg{i}", ""]
+        for f in range(funcs):
+            lines += [f"func F{f}(a int) int {{", "    b := a * 2 + 1", "    if b > 10 {", "        b = b - 10", "    }",
+                      "    __syscall(1, b)", "    return b", "}", ""]
+        with open(os.path.join(folder, f"pkg{i}.go"), "w") as f:
+            f.write("\n".join(lines))
+    lines = ["package main", ""] + [f'import "pkg{i}"' for i in range(count)] + ["", "func main() {", "}", ""]
+    with open(os.path.join(folder, "main.go"), "w") as f:
+        f.write("\n".join(lines))
+    return os.path.join(folder, "main.go")
+
+def bench_packages(args):
+    import subprocess, shutil
+    workdir = tempfile.mkdtemp()
+    try:
+        main = generate_packages(workdir, args.packages, 60)
+        for jobs in sorted({1, args.jobs}):
+            def run():
+                subprocess.run([sys.executable, "compiler.py", main, "--no-pkg-cache", "-j", str(jobs)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            report(f"{args.packages} packages -j {jobs}", *timeit(run, args.repeat))
+    finally:
+        shutil.rmtree(workdir)
+
+###################################################################################
+## End to end: one compiler process per file, as bin/tester runs them
+
+def bench_compile(args):
+    import subprocess, shutil
+    files = args.files or [os.path.join(basepath, "tests", "final_tests", f"test{i}.go") for i in (1, 2, 4, 5, 8)]
+    workdir = tempfile.mkdtemp()
+    try:
+        for path in files:
+            target = shutil.copy(path, workdir)
+            def run():
+                subprocess.run([sys.executable, "compiler.py", target], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            report(os.path.basename(path), *timeit(run, args.repeat))
+    finally:
+        shutil.rmtree(workdir)
+
+###################################################################################
+## Batch: the same files compiled one process each vs in one batch process
+
+def bench_batch(args):
+    import subprocess, shutil
+    files = args.files or [os.path.join(basepath, "tests", "final_tests", f"test{i}.go") for i in (1, 2, 4, 5, 8)]
+    workdir = tempfile.mkdtemp()
+    try:
+        targets = [shutil.copy(path, workdir) for path in files]
+        def separate():
+            for target in targets:
+                subprocess.run([sys.executable, "compiler.py", target], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        def batch(jobs):
+            subprocess.run([sys.executable, "compiler.py", workdir, "-j", str(jobs)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for name, run in [("process per file", separate)] + [(f"batch -j {jobs}", lambda jobs=jobs: batch(jobs)) for jobs in sorted({1, args.jobs})]:
+            best, mean = timeit(run, args.repeat)
+            report(name, best, mean, f"{len(targets) / best:7.1f} files/sec")
+    finally:
+        shutil.rmtree(workdir)
+
+###################################################################################
+## Compile server: a client per file against a running server vs compiler.py
+
+def bench_server(args):
+    import subprocess, shutil
+    files = args.files or [os.path.join(basepath, "tests", "final_tests", f"test{i}.go") for i in (1, 2, 4, 5, 8)]
+    workdir = tempfile.mkdtemp()
+    sock = os.path.join(workdir, "server.sock")
+    server = subprocess.Popen([sys.executable, "server.py", "--socket", sock, "-j", "1"], stderr=subprocess.DEVNULL)
+    try:
+        while not os.path.exists(sock):
+            time.sleep(0.05)
+        targets = [shutil.copy(path, workdir) for path in files]
+        for target in targets:
+            def direct():
+                subprocess.run([sys.executable, "compiler.py", target], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            def client():
+                subprocess.run([sys.executable, "client.py", "--socket", sock, target], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            name = os.path.basename(target)
+            report(f"{name} compiler.py", *timeit(direct, args.repeat))
+            report(f"{name} client.py", *timeit(client, args.repeat))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir)
+
+###################################################################################
+## Stages and debug artifacts: the corpus compiled in process to each stage,
+## and to assembly with every debug artifact written as before --emit/--debug
+
+def bench_emit(args):
+    import contextlib, glob, shutil
+    import parser as goparser
+    from batch import compileFile, stages, debugArtifacts
+    from context import CompilationContext
+
+    files = args.files or sorted(glob.glob(os.path.join(basepath, "tests", "Milestone6", "*.go")) +
+                                 glob.glob(os.path.join(basepath, "tests", "final_tests", "*.go")))
+    workdir = tempfile.mkdtemp()
+    try:
+        targets = [shutil.copy(path, workdir) for path in files]
+        goparser.getParser()
+        def run(emit, debug):
+            with contextlib.redirect_stdout(open(os.devnull, "w")):
+                for target in targets:
+                    try:
+                        compileFile(target, CompilationContext(pkgCache=None, debug=debug), emit)
+                    except Exception:
+                        pass
+        for emit in stages:
+            report(f"--emit {emit}", *timeit(lambda: run(emit, ()), args.repeat))
+        debug = set(debugArtifacts) - {'automaton'}
+        report("--emit asm --debug all", *timeit(lambda: run('asm', debug), args.repeat), f"{len(targets)} files")
+    finally:
+        shutil.rmtree(workdir)
+
+def bench_trace(args):
+    import contextlib, glob, shutil
+    import parser as goparser
+    import tracing
+    from batch import compileFile
+    from context import CompilationContext
+
+    files = args.files or sorted(glob.glob(os.path.join(basepath, "tests", "Milestone6", "*.go")) +
+                                 glob.glob(os.path.join(basepath, "tests", "final_tests", "*.go")))
+    workdir = tempfile.mkdtemp()
+    try:
+        targets = [shutil.copy(path, workdir) for path in files]
+        goparser.getParser()
+        def run(annotate):
+            # Syntax errors of the failing tests go to stderr
+            with contextlib.redirect_stderr(open(os.devnull, "w")):
+                for target in targets:
+                    try:
+                        compileFile(target, CompilationContext(pkgCache=None, annotateAsm=annotate))
+                    except Exception:
+                        pass
+        def size():
+            return sum(os.path.getsize(os.path.splitext(t)[0] + ".s") for t in targets
+                       if os.path.exists(os.path.splitext(t)[0] + ".s"))
+        report("default", *timeit(lambda: run(False), args.repeat), f"{size()} bytes of asm")
+        report("--annotate-asm", *timeit(lambda: run(True), args.repeat), f"{size()} bytes of asm")
+        tracing.stream = open(os.devnull, "w")
+        tracing.configure("all")
+        report("--trace all (to devnull)", *timeit(lambda: run(False), args.repeat))
+        tracing.configure("all:warn")
+    finally:
+        shutil.rmtree(workdir)
+
+def bench_passes(args):
+    import contextlib, glob, shutil
+    import parser as goparser
+    from batch import compileFile
+    from context import CompilationContext
+    from profiling import PassTimer, passes
+
+    files = args.files or sorted(glob.glob(os.path.join(basepath, "tests", "Milestone6", "*.go")) +
+                                 glob.glob(os.path.join(basepath, "tests", "final_tests", "*.go")))
+    workdir = tempfile.mkdtemp()
+    try:
+        targets = [shutil.copy(path, workdir) for path in files]
+        goparser.getParser()
+        totals = dict.fromkeys(passes, 0.0)
+        def run(timed):
+            with contextlib.redirect_stderr(open(os.devnull, "w")):
+                for target in targets:
+                    ctx = CompilationContext(pkgCache=None)
+                    if timed:
+                        ctx.passTimer = PassTimer()
+                    try:
+                        compileFile(target, ctx)
+                    except Exception:
+                        pass
+                    if timed:
+                        for name in passes:
+                            totals[name] += ctx.passTimer.passes[name]['wall']
+        report("untimed", *timeit(lambda: run(False), args.repeat))
+        report("--time-passes", *timeit(lambda: run(True), args.repeat), f"{len(targets)} files")
+        for name in passes:
+            print(f"  {name:<10} {totals[name] * 1000 / args.repeat:8.2f} ms")
+    finally:
+        shutil.rmtree(workdir)
+
+###################################################################################
+## Register allocation: spills and reloads of the test programs and of a loop
+## over an expression too deep for the registers, and what they execute on
+## the simulator (mipsim.py), at -O1 (linear scan) and -O2 (graph coloring)
+
+def generate_pressure(depth):
+    expr = "i"
+    for k in range(depth, 0, -1):
+        expr = f"{k} + ({expr})" if k % 2 else f"{k} * ({expr})"
+    return f"""package main
+
+import "fmt"
+
+func main() {{
+	x := 0
+	for i := 0; i < 50; i++ {{
+		assign x = x + ({expr})
+	}}
+	fmt.Print_int(x)
+}}
+"""
+
+def bench_regalloc(args):
+    import contextlib, shutil
+    import parser as goparser
+    from batch import compileStage
+    from context import CompilationContext
+    from mipsim import simulate
+
+    files = args.files or [os.path.join(basepath, "tests", "final_tests", f"test{i}.go") for i in (1, 2, 4, 5, 8)] + \
+                          [os.path.join(basepath, "tests", "Milestone6", f"test{i}.go") for i in (8, 10)]
+    workdir = tempfile.mkdtemp()
+    try:
+        targets = {}
+        for path in files:
+            name = f"{os.path.basename(os.path.dirname(path))}/{os.path.basename(path)}"
+            targets[name] = shutil.copy(path, os.path.join(workdir, name.replace("/", "-")))
+        targets["pressure loop"] = os.path.join(workdir, "pressure.go")
+        with open(targets["pressure loop"], "w") as f:
+            f.write(generate_pressure(20))
+        goparser.getParser()
+        for name, target in targets.items():
+            for level in (1, 2):
+                ctx = None
+                def run():
+                    nonlocal ctx
+                    ctx = CompilationContext(pkgCache=None, optLevel=level)
+                    with contextlib.redirect_stderr(open(os.devnull, "w")):
+                        return compileStage(ctx, target)
+                best, mean = timeit(run, args.repeat)
+                stats = ctx.regallocStats.values()
+                _, machine = simulate("\n".join(run()), "5")
+                report(f"{name} -O{level}", best, mean,
+                       f"{sum(s['spilled'] for s in stats)} spilled, {sum(s['coalesced'] for s in stats)} coalesced, "
+                       f"{sum(s['spills'] for s in stats)} stores, {sum(s['reloads'] for s in stats)} reloads; "
+                       f"runs {machine.steps} instructions, {machine.loads} loads, {machine.stores} stores")
+    finally:
+        shutil.rmtree(workdir)
+
+###################################################################################
+## Calls: memory operations the recursive test programs execute per call on
+## the simulator (mipsim.py)
+
+def bench_calls(args):
+    import contextlib, shutil
+    import parser as goparser
+    from batch import compileStage
+    from context import CompilationContext
+    from mipsim import simulate
+
+    files = args.files or [os.path.join(basepath, "tests", "final_tests", "test1.go"),
+                           os.path.join(basepath, "tests", "final_tests", "test4.go"),
+                           os.path.join(basepath, "tests", "Milestone6", "test10.go")]
+    workdir = tempfile.mkdtemp()
+    try:
+        goparser.getParser()
+        for path in files:
+            name = f"{os.path.basename(os.path.dirname(path))}/{os.path.basename(path)}"
+            target = shutil.copy(path, os.path.join(workdir, name.replace("/", "-")))
+            with contextlib.redirect_stderr(open(os.devnull, "w")):
+                asm = compileStage(CompilationContext(pkgCache=None), target)
+            machine = None
+            def run():
+                nonlocal machine
+                _, machine = simulate("\n".join(asm), "5")
+            best, mean = timeit(run, args.repeat)
+            memory = machine.loads + machine.stores
+            report(name, best, mean, f"{machine.calls} calls, {machine.steps} instructions, {memory} loads and stores, "
+                                      f"{memory / max(machine.calls, 1):.1f} per call")
+    finally:
+        shutil.rmtree(workdir)
+
+benchmarks = {
+    "startup": bench_startup,
+    "lexer": bench_lexer,
+    "tokens": bench_tokens,
+    "stream": bench_stream,
+    "nesting": bench_nesting,
+    "frontend": bench_frontend,
+    "imports": bench_imports,
+    "packages": bench_packages,
+    "compile": bench_compile,
+    "batch": bench_batch,
+    "server": bench_server,
+    "emit": bench_emit,
+    "trace": bench_trace,
+    "passes": bench_passes,
+    "regalloc": bench_regalloc,
+    "calls": bench_calls,
+}
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Micro benchmarks for the Milestone6 compiler")
+    argparser.add_argument("bench", choices=sorted(benchmarks) + ["all"])
+    argparser.add_argument("--repeat", type=int, default=5)
+    argparser.add_argument("--sizes", type=float, nargs="+", default=[0.5, 1, 2, 4], help="Source sizes in MB (lexer benchmarks)")
+    argparser.add_argument("--depths", type=int, nargs="+", default=[100, 200, 400, 800], help="Block nesting depths (nesting benchmark)")
+    argparser.add_argument("--chunk-size", type=int, default=1 << 16, help="Bytes per mapped chunk (stream benchmark)")
+    argparser.add_argument("--packages", type=int, default=8, help="Imported packages (packages benchmark)")
+    argparser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Compiler processes (packages and batch benchmarks)")
+    argparser.add_argument("files", nargs="*", help="Go sources to compile (compile, batch, server, emit, frontend, imports, regalloc and calls benchmarks)")
+    args = argparser.parse_args()
+
+    os.chdir(srcpath)
+    for name in (sorted(benchmarks) if args.bench == "all" else [args.bench]):
+        print(f"== {name}")
+        benchmarks[name](args)
@@ -0,0 +1,12 @@
+package main
+
+import "fmt"
+
+func main() {
+	var x int = 2
+	goto inside
+	if x > 1 {
+	inside:
+		fmt.Print_int(x)
+	}
+}
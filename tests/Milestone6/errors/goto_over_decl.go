@@ -0,0 +1,11 @@
+package main
+
+import "fmt"
+
+func main() {
+	goto done
+	var x int = 3
+	fmt.Print_int(x)
+done:
+	fmt.Print_int(1)
+}
@@ -0,0 +1,280 @@
+import re, sys, argparse
+
+## MIPS simulator
+##
+## Runs the assembly the compiler generates, for checking what a program
+## prints and counting what it executes: instructions, loads, stores and
+## calls (jal).
+## Covers the integer instructions, pseudo instructions and syscalls (print
+## int, string and char, read int, sbrk and exit) the code generator emits,
+## with SPIM's memory layout.  Not a full MIPS: no floats, no delay slots.
+
+regNames = ['$zero', '$at', '$v0', '$v1', '$a0', '$a1', '$a2', '$a3'] + \
+           [f'$t{i}' for i in range(8)] + [f'$s{i}' for i in range(8)] + \
+           ['$t8', '$t9', '$k0', '$k1', '$gp', '$sp', '$fp', '$ra']
+regNumbers = {name: i for i, name in enumerate(regNames)}
+regNumbers.update({f'${i}': i for i in range(32)})
+regNumbers.update({'$0': 0, '$r31': 31, '$s8': 30})
+
+dataStart = 0x10010000
+heapStart = 0x10040000
+stackTop = 0x7fffeffc
+gpStart = 0x10008000
+
+# Operands are separated by commas or blanks; char literals may be blanks
+_operand = re.compile(r"'(?:\\.|[^'])*'|[^\s,]+")
+
+class SimError(Exception):
+    pass
+
+def s32(x):
+    x &= 0xffffffff
+    return x - (1 << 32) if x & 0x80000000 else x
+
+class Program:
+    def __init__(self, source):
+        self.memory = {}
+        self.labels = {}
+        self.text = []
+        segment = 'text'
+        address = dataStart
+        # The code generator writes rune literals as they are, so '\n' comes
+        # as a quote, a line break and a quote
+        source = re.sub(r"'\n'", r"'\\n'", source)
+        for line in source.splitlines():
+            line = line.split('#', 1)[0].strip()
+            while line:
+                match = re.match(r'([A-Za-z_.$][\w.$]*)\s*:', line)
+                if not match:
+                    break
+                name = match.group(1)
+                self.labels[name] = address if segment == 'data' else len(self.text)
+                line = line[match.end():].strip()
+            if not line:
+                continue
+            if line.startswith('.'):
+                directive, _, rest = line.replace('\t', ' ').partition(' ')
+                rest = rest.strip()
+                if directive in ('.data', '.text'):
+                    segment = directive[1:]
+                elif directive in ('.word', '.half', '.byte'):
+                    size = {'.word': 4, '.half': 2, '.byte': 1}[directive]
+                    address = (address + size - 1) // size * size
+                    for value in rest.split(','):
+                        self.store(address, int(value.strip(), 0), size)
+                        address += size
+                elif directive == '.asciiz':
+                    for byte in bytes(rest.strip()[1:-1], 'utf-8').decode('unicode_escape').encode('latin-1') + b'\0':
+                        self.memory[address] = byte
+                        address += 1
+                elif directive == '.space':
+                    address += int(rest, 0)
+                # .globl and the like say nothing to run
+                continue
+            op, *args = _operand.findall(line)
+            self.text.append((op, args, line))
+
+    def load(self, address, size, signed=True):
+        if address % size:
+            raise SimError(f"Unaligned load of {size} bytes at {address:#x}")
+        value = 0
+        for i in range(size):
+            value |= self.memory.get(address + i, 0) << (8 * i)
+        if signed and value & (1 << (8 * size - 1)):
+            value -= 1 << (8 * size)
+        return value
+
+    def store(self, address, value, size):
+        if address % size:
+            raise SimError(f"Unaligned store of {size} bytes at {address:#x}")
+        for i in range(size):
+            self.memory[address + i] = (value >> (8 * i)) & 0xff
+
+class Machine:
+    def __init__(self, program, stdin='', maxSteps=10_000_000):
+        self.program = program
+        self.regs = [0] * 32
+        self.regs[29] = stackTop
+        self.regs[28] = gpStart
+        self.hi = self.lo = 0
+        self.heap = heapStart
+        self.stdin = stdin.split()
+        self.output = []
+        self.maxSteps = maxSteps
+        # What was executed
+        self.steps = self.loads = self.stores = self.calls = 0
+
+    def reg(self, name):
+        if name not in regNumbers:
+            raise SimError(f"Not a register: {name}")
+        return regNumbers[name]
+
+    def get(self, name):
+        return self.regs[self.reg(name)]
+
+    def set(self, name, value):
+        number = self.reg(name)
+        if number:
+            self.regs[number] = s32(value)
+
+    def value(self, arg):
+        # Register or immediate operand
+        if arg.startswith('$'):
+            return self.get(arg)
+        if arg.startswith("'"):
+            return ord(arg[1:-1].encode().decode('unicode_escape'))
+        return int(arg, 0)
+
+    def address(self, arg):
+        match = re.fullmatch(r'(-?\w*)\((\$\w+)\)', arg)
+        if match:
+            return (int(match.group(1), 0) if match.group(1) else 0) + self.get(match.group(2))
+        if arg in self.program.labels:
+            return self.program.labels[arg]
+        raise SimError(f"Not an address: {arg}")
+
+    def target(self, label):
+        if label not in self.program.labels:
+            raise SimError(f"Unknown label {label}")
+        return self.program.labels[label]
+
+    def run(self, entry='main'):
+        pc = self.target(entry)
+        text = self.program.text
+        while True:
+            if not 0 <= pc < len(text):
+                raise SimError(f"Jumped out of the program to {pc}")
+            if self.steps >= self.maxSteps:
+                raise SimError(f"No exit after {self.maxSteps} instructions")
+            self.steps += 1
+            op, args, line = text[pc]
+            pc += 1
+            try:
+                jump = self.execute(op, args, pc)
+            except (SimError, ValueError, IndexError, ZeroDivisionError) as e:
+                raise SimError(f"{line}: {e}")
+            if jump is None:
+                continue
+            if jump == 'exit':
+                return ''.join(self.output)
+            pc = jump
+
+    def execute(self, op, args, pc):
+        a = args
+        if op in ('add', 'addu', 'addi', 'addiu'):
+            self.set(a[0], self.get(a[1]) + self.value(a[2]))
+        elif op in ('sub', 'subu', 'subi'):
+            self.set(a[0], self.value(a[1]) - self.value(a[2]))
+        elif op in ('and', 'andi'):
+            self.set(a[0], self.get(a[1]) & self.value(a[2]))
+        elif op in ('or', 'ori'):
+            self.set(a[0], self.get(a[1]) | self.value(a[2]))
+        elif op in ('xor', 'xori'):
+            self.set(a[0], self.get(a[1]) ^ self.value(a[2]))
+        elif op == 'nor':
+            self.set(a[0], ~(self.get(a[1]) | self.value(a[2])))
+        elif op in ('slt', 'slti'):
+            self.set(a[0], int(self.get(a[1]) < self.value(a[2])))
+        elif op in ('sllv', 'sll'):
+            self.set(a[0], self.get(a[1]) << (self.value(a[2]) & 31))
+        elif op in ('srav', 'sra'):
+            self.set(a[0], self.get(a[1]) >> (self.value(a[2]) & 31))
+        elif op == 'mult':
+            product = self.get(a[0]) * self.get(a[1])
+            self.lo, self.hi = s32(product), s32(product >> 32)
+        elif op == 'div':
+            x, y = self.get(a[0]), self.get(a[1])
+            quotient = abs(x) // abs(y) * (1 if (x < 0) == (y < 0) else -1)
+            self.lo, self.hi = s32(quotient), s32(x - quotient * y)
+        elif op == 'mflo':
+            self.set(a[0], self.lo)
+        elif op == 'mfhi':
+            self.set(a[0], self.hi)
+        elif op == 'li':
+            if a[1][0] == "'":
+                self.set(a[0], ord(a[1][1:-1].encode().decode('unicode_escape')))
+            else:
+                self.set(a[0], int(a[1], 0))
+        elif op == 'la':
+            self.set(a[0], self.address(a[1]))
+        elif op == 'move':
+            self.set(a[0], self.get(a[1]))
+        elif op in ('lw', 'lh', 'lb', 'lhu', 'lbu'):
+            size = {'w': 4, 'h': 2, 'b': 1}[op[1]]
+            self.loads += 1
+            self.set(a[0], self.program.load(self.address(a[1]), size, not op.endswith('u')))
+        elif op in ('sw', 'sh', 'sb'):
+            size = {'w': 4, 'h': 2, 'b': 1}[op[1]]
+            self.stores += 1
+            self.program.store(self.address(a[1]), self.get(a[0]), size)
+        elif op == 'j':
+            return self.target(a[0])
+        elif op == 'jal':
+            self.calls += 1
+            self.regs[31] = pc
+            return self.target(a[0])
+        elif op == 'jr':
+            return self.get(a[0])
+        elif op == 'beqz':
+            return self.target(a[1]) if self.get(a[0]) == 0 else None
+        elif op == 'bnez':
+            return self.target(a[1]) if self.get(a[0]) != 0 else None
+        elif op == 'beq':
+            return self.target(a[2]) if self.get(a[0]) == self.value(a[1]) else None
+        elif op == 'bne':
+            return self.target(a[2]) if self.get(a[0]) != self.value(a[1]) else None
+        elif op == 'syscall':
+            return self.syscall()
+        elif op == 'nop':
+            pass
+        else:
+            raise SimError(f"Unsupported instruction {op}")
+        return None
+
+    def syscall(self):
+        code = self.get('$v0')
+        if code == 1:
+            self.output.append(str(self.get('$a0')))
+        elif code == 4:
+            address = self.get('$a0')
+            while self.program.memory.get(address, 0):
+                self.output.append(chr(self.program.memory[address]))
+                address += 1
+        elif code == 5:
+            if not self.stdin:
+                raise SimError("read_int past the end of the input")
+            self.set('$v0', int(self.stdin.pop(0)))
+        elif code == 9:
+            self.set('$v0', self.heap)
+            self.heap += (self.get('$a0') + 3) // 4 * 4
+        elif code == 10:
+            return 'exit'
+        elif code == 11:
+            self.output.append(chr(self.get('$a0') & 0xff))
+        else:
+            raise SimError(f"Unsupported syscall {code}")
+        return None
+
+def simulate(source, stdin='', maxSteps=10_000_000):
+    # Output of the assembly source run on stdin, and the machine it ran on
+    # for its counts.  Raises SimError if it can't run it to the exit
+    machine = Machine(Program(source), stdin, maxSteps)
+    return machine.run(), machine
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Run the MIPS assembly the compiler generates")
+    argparser.add_argument("asm", help="assembly file")
+    argparser.add_argument("--stdin", default="", help="input of the program (integers)")
+    argparser.add_argument("--max-steps", type=int, default=10_000_000)
+    argparser.add_argument("--counts", action="store_true", help="print the executed instructions, loads, stores and calls on stderr")
+    args = argparser.parse_args()
+    with open(args.asm) as f:
+        source = f.read()
+    try:
+        output, machine = simulate(source, args.stdin, args.max_steps)
+    except SimError as e:
+        print(f"{args.asm}: {e}", file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.write(output)
+    if args.counts:
+        print(f"{machine.steps} instructions, {machine.loads} loads, {machine.stores} stores, {machine.calls} calls", file=sys.stderr)
@@ -0,0 +1,15 @@
+package main
+
+import "fmt"
+
+// k only calls Scan_int, through a pointer to its own local: it must set up
+// the frame the pointer points into
+func k(n int) int {
+	var v int
+	fmt.Scan_int(&v)
+	return v + n
+}
+
+func main() {
+	fmt.Print_int(k(5))
+}
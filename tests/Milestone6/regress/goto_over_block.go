@@ -0,0 +1,14 @@
+package main
+
+import "fmt"
+
+func main() {
+	var x int = 2
+	goto done
+	if x > 1 {
+		var y int = 3
+		fmt.Print_int(y)
+	}
+done:
+	fmt.Print_int(x)
+}
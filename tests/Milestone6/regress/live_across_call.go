@@ -0,0 +1,17 @@
+package main
+
+import "fmt"
+
+func sq(x int) int {
+	return x * x
+}
+
+// a * 3 and a are still needed after the calls to sq: they must survive
+// them in the registers the allocator gave them
+func f(a int, b int) int {
+	return a*3 + sq(b+sq(a)) + a
+}
+
+func main() {
+	fmt.Print_int(f(4, 5))
+}
@@ -0,0 +1,10 @@
+package strs
+
+import "fmt"
+
+// Temporaries of an imported package are renumbered after the importer's;
+// the text of its literals must not be
+func Hello() {
+	fmt.Print_string("temp_0 x")
+	fmt.Print_char('t')
+}
@@ -0,0 +1,17 @@
+package main
+
+import "fmt"
+
+// Both g and main nest deep enough to need more than the $t registers: the
+// $s registers main holds across the call to g must come back from it
+func g(i int) int {
+	return 1 + (2 * (3 + (4 * (5 + (6 * (7 + (8 * (9 + (10 * (i)))))))))) % 1000
+}
+
+func main() {
+	x := 0
+	for i := 0; i < 10; i++ {
+		assign x = x + (1 + (2 * (3 + (4 * (5 + (6 * (7 + (8 * (9 + (10 * (g(i)))))))))))) % 100000
+	}
+	fmt.Print_int(x)
+}
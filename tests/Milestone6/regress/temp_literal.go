@@ -0,0 +1,10 @@
+package main
+
+import "fmt"
+import "strs"
+
+func main() {
+	var x int = 1
+	fmt.Print_int(x + 2)
+	strs.Hello()
+}
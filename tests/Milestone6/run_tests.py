@@ -0,0 +1,180 @@
+import os, sys, shutil, tempfile, contextlib, argparse
+
+## Expected-output tests
+##
+## Compiles the test programs that run with both register allocators (-O 1
+## and -O 2), runs them on the simulator (mipsim.py) and checks what they
+## print, and checks the 3AC of the programs whose output the backend can't
+## produce yet.  regress/ holds small programs for what the compiler has got
+## wrong before: frames, registers live across calls, the $s registers, gotos
+## and the temporaries of imported packages, and errors/ programs it must
+## reject, with the error it must give.  The scenarios compile programs they
+## write to a folder, change and compile again in the same process, as the
+## compile server and batches do.
+
+basepath = os.environ.get("ROOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+srcpath = os.path.join(basepath, "src", "Milestone6")
+sys.path.insert(0, srcpath)
+
+# Program -> stdin and expected output
+tests = {
+    "Milestone5/test4.go": ("5", ""),
+    "Milestone6/test6.go": ("5", ""),
+    "Milestone6/test8.go": ("5", "12346"),
+    "Milestone6/test10.go": ("5", "34"),
+    "final_tests/test1.go": ("5", "125\n"),
+    "final_tests/test2.go": ("5", "1\n2\n3\n4\n5\n6\n7\n8\n"),
+    "final_tests/test4.go": ("5", "8\n"),
+    "final_tests/test5.go": ("5", "6\n36\n216\n"),
+    "final_tests/test8.go": ("5", "4\n0\n1\n2\n3\n4\n"),
+    "Milestone6/regress/address_leaf.go": ("7", "12\n"),
+    "Milestone6/regress/live_across_call.go": ("", "457\n"),
+    "Milestone6/regress/saved_regs.go": ("", "567990\n"),
+    "Milestone6/regress/goto_over_block.go": ("", "2\n"),
+}
+
+# Program -> text of the error it must stop with
+errors = {
+    "Milestone6/errors/goto_over_decl.go": "9: Invalid placement of Goto at 6",
+    "Milestone6/errors/goto_into_block.go": "9: Invalid placement of Goto at 7",
+}
+
+# Program -> text its 3AC must have
+tacTests = {
+    "Milestone6/regress/temp_literal.go": '"temp_0 x"',
+}
+
+optLevels = (1, 2)
+
+def testPath(name):
+    return os.path.join(basepath, "tests", name)
+
+def compile(path, emit='asm', pkgCache=None, **options):
+    # Output of the stage emit of the program at path
+    from batch import compileStage
+    from context import CompilationContext
+
+    with contextlib.redirect_stderr(open(os.devnull, "w")):
+        return compileStage(CompilationContext(pkgCache=pkgCache, **options), path, emit)
+
+def run(path, optLevel=1, stdin="", pkgCache=None):
+    # Output of the program at path compiled at optLevel and run on stdin,
+    # or the error that stopped it
+    from mipsim import simulate
+
+    try:
+        return simulate("\n".join(compile(path, pkgCache=pkgCache, optLevel=optLevel)), stdin)[0]
+    except (Exception, SystemExit) as e:
+        return f"<{type(e).__name__}: {e}>"
+
+def tacText(path):
+    # Text of the 3AC of the program at path, or the error that stopped it
+    try:
+        return "\n".join(map(str, compile(path, '3ac')))
+    except (Exception, SystemExit) as e:
+        return f"<{type(e).__name__}: {e}>"
+
+###################################################################################
+## Scenarios: each takes a scratch folder and returns its steps, as what it
+## did, what came out and what was expected
+
+def write(folder, name, text):
+    path = os.path.join(folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+def scenarioNewImport(folder):
+    # A package added to the program's folder after a compile that didn't
+    # find it, and then moved, is found by the next compiles
+    main = write(folder, "main.go", 'package main\n\nimport "fmt"\nimport "late"\n\nfunc main() {\n\tlate.Show()\n}\n')
+    steps = [("before late.go", run(main), "<NameError: Invalid import: late.go>")]
+    late = write(folder, "sub/late.go", 'package late\n\nimport "fmt"\n\nfunc Show() {\n\tfmt.Print_int(42)\n}\n')
+    steps.append(("late.go added", run(main), "42\n"))
+    os.renames(late, os.path.join(folder, "other", "late.go"))
+    steps.append(("late.go moved", run(main), "42\n"))
+    return steps
+
+def scenarioImportCycle(folder):
+    # Packages importing each other are rejected with the cycle
+    main = write(folder, "main.go", 'package main\n\nimport "fmt"\nimport "cyca"\n\nfunc main() {\n\tcyca.Show()\n}\n')
+    write(folder, "cyca.go", 'package cyca\n\nimport "fmt"\nimport "cycb"\n\nfunc Show() {\n\tfmt.Print_int(1)\n}\n')
+    write(folder, "cycb.go", 'package cycb\n\nimport "fmt"\nimport "cyca"\n\nfunc Show() {\n\tfmt.Print_int(2)\n}\n')
+    return [("a imports b imports a", run(main), "<NameError: 4: Import cycle not allowed: cyca.go imports cycb.go imports cyca.go>")]
+
+def scenarioEditedImport(folder):
+    # A cached package is compiled again once a package it imports changes:
+    # after base.go is edited both base and mid miss the cache.  Functions of
+    # packages aren't renamed in the assembly, so the two packages' have
+    # different names
+    from pkgcache import PackageCache
+
+    cache = PackageCache(os.path.join(folder, "cache"))
+    main = write(folder, "main.go", 'package main\n\nimport "fmt"\nimport "base"\nimport "mid"\n\nfunc main() {\n\tmid.Run()\n}\n')
+    write(folder, "mid.go", 'package mid\n\nimport "fmt"\nimport "base"\n\nfunc Run() {\n\tbase.Show()\n\tfmt.Print_int(0)\n}\n')
+    write(folder, "base.go", 'package base\n\nimport "fmt"\n\nfunc Show() {\n\tfmt.Print_int(1)\n}\n')
+    steps = [("first compile", run(main, pkgCache=cache), "1\n0\n")]
+    steps.append(("compiled from the cache", (run(main, pkgCache=cache), cache.hits > 0), ("1\n0\n", True)))
+    write(folder, "base.go", 'package base\n\nimport "fmt"\n\nfunc Show() {\n\tfmt.Print_int(23)\n}\n')
+    misses = cache.misses
+    steps.append(("base.go edited", (run(main, pkgCache=cache), cache.misses - misses), ("23\n0\n", 2)))
+    return steps
+
+scenarios = {
+    "new import": scenarioNewImport,
+    "import cycle": scenarioImportCycle,
+    "edited import": scenarioEditedImport,
+}
+
+def main():
+    argparser = argparse.ArgumentParser(description="Expected-output tests of the Milestone6 compiler")
+    argparser.add_argument("names", nargs="*", help="programs to test, relative to tests/, or scenarios (default: all)")
+    args = argparser.parse_args()
+    names = args.names or [*tests, *errors, *tacTests, *scenarios]
+
+    import parser as goparser
+    goparser.getParser()
+    os.chdir(srcpath)
+    failed = 0
+    for name in names:
+        if name in tests:
+            stdin, expected = tests[name]
+            for optLevel in optLevels:
+                output = run(testPath(name), optLevel, stdin)
+                if output == expected:
+                    print(f"File {name} -O {optLevel} passed")
+                else:
+                    failed += 1
+                    print(f"File {name} -O {optLevel} failed: expected {expected!r}, got {output!r}")
+        if name in errors:
+            output = run(testPath(name))
+            if errors[name] in output:
+                print(f"File {name} error passed")
+            else:
+                failed += 1
+                print(f"File {name} error failed: expected {errors[name]!r}, got {output!r}")
+        if name in tacTests:
+            text = tacText(testPath(name))
+            if tacTests[name] in text:
+                print(f"File {name} 3AC passed")
+            else:
+                failed += 1
+                print(f"File {name} 3AC failed: no {tacTests[name]!r} in {text[-300:]!r}")
+        if name in scenarios:
+            folder = tempfile.mkdtemp()
+            try:
+                steps = scenarios[name](folder)
+            finally:
+                shutil.rmtree(folder)
+            wrong = [f"{step}: expected {expected!r}, got {output!r}" for step, output, expected in steps if output != expected]
+            if wrong:
+                failed += 1
+                print(f"Scenario {name} failed: {'; '.join(wrong)}")
+            else:
+                print(f"Scenario {name} passed")
+    print(f"{failed} failed" if failed else "All passed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import os, sys, pickle
+
+## 3AC record tests
+##
+## The backend reads the operands of an instruction from its fields: the
+## kind, name, * and field of each Operand, and the parameters and return
+## values recorded on CALL and RETURN.  These tests pin how the operands the
+## parser writes are taken apart, that the text form of every opcode is
+## unchanged, and that instructions come back whole from the package cache
+## (pickle).
+
+basepath = os.environ.get("ROOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+srcpath = os.path.join(basepath, "src", "Milestone6")
+sys.path.insert(0, srcpath)
+import tac
+
+# Operand text -> (kind, name, deref, field, func, index)
+operands = {
+    'temp_3':          (tac.TEMP, 'temp_3', False, None, None, None),
+    '* temp_3':        (tac.TEMP, 'temp_3', True, None, None, None),
+    '*temp_3':         (tac.TEMP, 'temp_3', True, None, None, None),
+    'temp_3.addr':     (tac.TEMP, 'temp_3', False, 'addr', None, None),
+    'var_temp_2.length': (tac.VAR_TEMP, 'var_temp_2', False, 'length', None, None),
+    '1_x':             (tac.VAR, '1_x', False, None, None, None),
+    '* 1_p':           (tac.VAR, '1_p', True, None, None, None),
+    '1_s.capacity':    (tac.VAR, '1_s', False, 'capacity', None, None),
+    'arg_[add_-8]':    (tac.ARG, 'arg_[add_-8]', False, None, 'add', -8),
+    'arg_[my_f_-4].addr': (tac.ARG, 'arg_[my_f_-4]', False, 'addr', 'my_f', -4),
+    'retval_my_f_1':   (tac.RETVAL, 'retval_my_f_1', False, None, 'my_f', 1),
+    '__syscall':       (tac.SYSCALL, '__syscall', False, None, None, None),
+    '5':               (tac.INT, '5', False, None, None, None),
+    '-5':              (tac.INT, '-5', False, None, None, None),
+    '2.5':             (tac.FLOAT, '2.5', False, None, None, None),
+    '"temp_0 x"':      (tac.STRING, '"temp_0 x"', False, None, None, None),
+    '`a.b`':           (tac.STRING, '`a.b`', False, None, None, None),
+    "'a'":             (tac.RUNE, "'a'", False, None, None, None),
+    'true':            (tac.NAME, 'true', False, None, None, None),
+}
+
+# One instruction of every form, with its text form
+samples = [
+    (tac.assign('temp_0', '5'), 'temp_0 = 5'),
+    (tac.assign('* temp_1', 'temp_2'), '* temp_1 = temp_2'),
+    (tac.assign('temp_3', '* 1_p'), 'temp_3 = * 1_p'),
+    (tac.assign('1_s.len', '1_t.cap'), '1_s.len = 1_t.cap'),
+    (tac.unOp('temp_5', '&', '1_x'), 'temp_5 = & 1_x'),
+    (tac.unOp('temp_7', '-', 'temp_0', 'float'), 'temp_7 = -(float) temp_0'),
+    (tac.binOp('temp_8', 'temp_0', '+', '1_x'), 'temp_8 = temp_0 + 1_x'),
+    (tac.binOp('temp_10', '* 1_p', '<', '* 1_q', 'int'), 'temp_10 = * 1_p <(int) * 1_q'),
+    (tac.new('temp_11', '12'), 'new temp_11 12'),
+    (tac.params('temp_8'), 'params temp_8'),
+    (tac.call('f', ['temp_8', '* 1_p']), 'call f'),
+    (tac.call('#syscall_1'), 'call #syscall_1'),
+    (tac.retParams('temp_9'), 'retparams temp_9'),
+    (tac.ret(['temp_9']), 'return'),
+    (tac.label('else_6'), 'else_6:'),
+    (tac.goto('end_6'), 'goto end_6'),
+    (tac.ifNot('temp_10', 'else_6'), 'if not temp_10 then goto else_6'),
+    (tac.func('main'), '\nFunc main'),
+    (tac.funcEnd(), 'Func END\n'),
+    (tac.package('main'), 'package main'),
+    (tac.importPath('"fmt"'), 'import "fmt"'),
+]
+
+def checkOperand(text, expected):
+    x = tac.operand(text)
+    got = (x.kind, x.name, x.deref, x.field, x.func, x.index)
+    if got != expected:
+        return f"{text!r}: {got!r}, expected {expected!r}"
+    if str(x) != text:
+        return f"{text!r}: text form {str(x)!r}"
+
+def checkInstr(instr, text):
+    if str(instr) != text:
+        return f"{instr!r}: text form {str(instr)!r}, expected {text!r}"
+    copy = pickle.loads(pickle.dumps(instr))
+    fields = ('op', 'dest', 'args', 'operator', 'type', 'name', 'values')
+    if any(getattr(copy, f) != getattr(instr, f) for f in fields):
+        return f"{instr!r}: changed by pickling"
+
+def main():
+    failed = []
+    failed.extend(filter(None, (checkOperand(text, expected) for text, expected in operands.items())))
+    if tac.operand('* temp_3').pointer() != tac.operand('temp_3'):
+        failed.append("'* temp_3' doesn't point through temp_3")
+    print(f"{len(operands)} operands checked")
+
+    missing = set(range(len(tac.opNames))) - {instr.op for instr, _ in samples}
+    if missing:
+        failed.append(f"no sample of {', '.join(tac.opNames[op] for op in sorted(missing))}")
+    failed.extend(filter(None, (checkInstr(instr, text) for instr, text in samples)))
+    call = next(instr for instr, _ in samples if instr.op == tac.CALL)
+    ret = next(instr for instr, _ in samples if instr.op == tac.RETURN)
+    if [str(x) for x in call.values] != ['temp_8', '* 1_p'] or call.values[1].kind != tac.VAR:
+        failed.append(f"{call!r}: parameters {call.values!r}")
+    if [str(x) for x in ret.values] != ['temp_9']:
+        failed.append(f"{ret!r}: values {ret.values!r}")
+    print(f"{len(samples)} constructed instructions checked")
+
+    for message in failed:
+        print(f"Failed: {message}")
+    print(f"{len(failed)} failed" if failed else "All passed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())